@@ -5,7 +5,8 @@
 """
 
 from fastapi import APIRouter
-from app.utils.cache import get_cache_stats
+from fastapi.responses import PlainTextResponse
+from app.utils.cache import get_cache_stats, get_cache_metrics_text
 
 router = APIRouter()
 
@@ -18,3 +19,14 @@ def get_cache_statistics():
         缓存统计信息
     """
     return get_cache_stats()
+
+@router.get("/cache/metrics", response_class=PlainTextResponse)
+def get_cache_metrics():
+    """
+    以Prometheus文本格式获取缓存指标，包括按键族划分的命中、未命中、
+    淘汰、过期、失效次数和加载耗时直方图
+
+    Returns:
+        Prometheus文本格式的缓存指标
+    """
+    return PlainTextResponse(get_cache_metrics_text(), media_type="text/plain; version=0.0.4")
@@ -1,11 +1,12 @@
 
 
 
-from fastapi import APIRouter, HTTPException, Depends, Query, Header
+from fastapi import APIRouter, HTTPException, Depends, Query, Header, Request
 from typing import Optional
 import json
 import time
 from app.services.chat_service import ChatService
+from app.api.storage import session_purger
 from app.models.chat import ChatRequest, ChatResponse, HealthResponse
 from fastapi.responses import StreamingResponse
 
@@ -48,12 +49,13 @@ async def chat(request: ChatRequest, user_id: str = Depends(get_user_id)):
     return result
 
 @router.post("/api/chat/stream")
-async def chat_stream(request: ChatRequest, user_id: str = Depends(get_user_id)):
+async def chat_stream(request: ChatRequest, http_request: Request, user_id: str = Depends(get_user_id)):
     """
     处理用户聊天请求并返回流式响应
 
     Args:
         request: 包含用户消息、会话ID和用户ID的请求
+        http_request: 原始HTTP请求，用于检测客户端是否断开
         user_id: 从请求头中获取的用户ID
 
     Returns:
@@ -75,11 +77,18 @@ async def chat_stream(request: ChatRequest, user_id: str = Depends(get_user_id))
 
             # 调用chat_service处理消息并获取流式响应
             chunk_count = 0
-            async for chunk in chat_service.process_message_stream(request):
-                chunk_count += 1
-                print(f"[DEBUG] 发送第 {chunk_count} 个数据块: {chunk['content'][:20]}...")
-                # 将每个数据块包装为SSE格式
-                yield f"data: {json.dumps({'content': chunk['content'], 'type': 'content'})}\n\n"
+            stream = chat_service.process_message_stream(request)
+            try:
+                async for chunk in stream:
+                    # 客户端断开后停止生成，关闭流会取消上游AI请求
+                    if await http_request.is_disconnected():
+                        print(f"[DEBUG] 客户端已断开，停止流式响应，已发送 {chunk_count} 个数据块")
+                        return
+                    chunk_count += 1
+                    # 将每个数据块包装为SSE格式
+                    yield f"data: {json.dumps({'content': chunk['content'], 'type': 'content'})}\n\n"
+            finally:
+                await stream.aclose()
 
             elapsed_time = time.time() - start_time
             print(f"[DEBUG] 流式响应发送完成，共 {chunk_count} 个数据块，耗时: {elapsed_time:.2f}秒")
@@ -120,6 +129,58 @@ def get_chat_history(
     """
     return {"messages": chat_service.get_chat_history(session_id, user_id, limit)}
 
+@router.get("/api/chat/history/page")
+def get_chat_history_page(
+    session_id: str,
+    user_id: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = None,
+    after: Optional[str] = None
+):
+    """
+    按游标分页获取聊天历史记录，结果从新到旧排列
+
+    不传游标时返回最新的一页；使用before获取更早的消息，使用after获取更新的消息
+
+    Args:
+        session_id: 会话ID
+        user_id: 可选的用户ID
+        limit: 每页消息数量，默认50，最大200
+        before: 上一页返回的next_cursor，获取更早的消息
+        after: 获取此游标之后的新消息
+
+    Returns:
+        消息列表、下一页游标和是否还有更多消息
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="before和after不能同时指定")
+    try:
+        return chat_service.get_chat_history_page(session_id, user_id, limit, before, after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/api/chat/sync")
+def sync_chat_history(
+    user_id: str,
+    session_id: Optional[str] = None,
+    since: Optional[str] = None
+):
+    """
+    增量同步聊天记录，只返回上次同步之后的新消息和会话变更（包括删除）
+
+    Args:
+        user_id: 用户ID
+        session_id: 可选的会话ID，只同步该会话
+        since: 上次同步返回的sync_token，为空时返回全量快照
+
+    Returns:
+        新消息、变更的会话、新的同步令牌、是否还有更多变更以及是否需要全量刷新
+    """
+    try:
+        return chat_service.sync_changes(user_id, session_id, since)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/api/chat/sessions")
 def get_user_sessions_endpoint(
     user_id: str,
@@ -140,7 +201,7 @@ def get_user_sessions_endpoint(
 @router.delete("/api/chat/history")
 def delete_chat_history(session_id: str, user_id: Optional[str] = None):
     """
-    删除指定会话的聊天记录
+    删除指定会话的聊天记录，消息立即隐藏，由后台分批删除
 
     Args:
         session_id: 会话ID
@@ -149,13 +210,18 @@ def delete_chat_history(session_id: str, user_id: Optional[str] = None):
     Returns:
         删除的消息数量
     """
-    return {"deleted_count": chat_service.delete_chat_history(session_id, user_id)}
+    deleted_count = chat_service.delete_chat_history(session_id, user_id)
+    session_purger.notify()
+    return {"deleted_count": deleted_count}
 
 @router.delete("/api/chat/sessions/{session_id}")
 def delete_session(session_id: str, user_id: Optional[str] = None):
     """
     删除指定会话及其所有聊天记录
 
+    会话立即标记为已删除并从读取结果中隐藏，消息、上传的文件和存储对象由后台分批删除，
+    进度通过GET /api/chat/sessions/{session_id}/purge查询
+
     Args:
         session_id: 会话ID
         user_id: 可选的用户ID
@@ -163,4 +229,23 @@ def delete_session(session_id: str, user_id: Optional[str] = None):
     Returns:
         删除的消息数量
     """
-    return {"deleted_count": chat_service.delete_chat_history(session_id, user_id)}
+    deleted_count = chat_service.delete_chat_history(session_id, user_id)
+    session_purger.notify()
+    return {"deleted_count": deleted_count}
+
+@router.get("/api/chat/sessions/{session_id}/purge")
+async def get_session_purge(session_id: str, user_id: Optional[str] = None):
+    """
+    获取已删除会话的后台清理进度
+
+    Args:
+        session_id: 会话ID
+        user_id: 可选的用户ID
+
+    Returns:
+        每个用户的清理状态（pending/purging/done）、已删除的消息数和文件数
+    """
+    purges = await session_purger.get_status(session_id, user_id)
+    if not purges:
+        raise HTTPException(status_code=404, detail="会话没有被删除")
+    return {"session_id": session_id, "purges": purges}
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, HTTPException, Request
+from app.services.storage_backends import LocalStorageBackend
+from app.utils.static_files import file_response
+from app.core.config import settings
+
+router = APIRouter()
+
+# 本地存储，与文件服务使用同一目录，存储名解析为分目录后的实际路径
+local_storage = LocalStorageBackend(settings.STORAGE_LOCAL_DIR)
+# 上传过程中的临时文件不对外提供
+_TEMPORARY_SUFFIXES = (".part", ".tmp")
+
+@router.api_route("/uploads/{file_name}", methods=["GET", "HEAD"], include_in_schema=False)
+async def serve_upload(file_name: str, request: Request):
+    """
+    提供本地存储的上传文件
+
+    支持Range、ETag和If-None-Match，存储名唯一，响应允许长期缓存
+
+    Args:
+        file_name: 存储文件名
+        request: 原始HTTP请求
+
+    Returns:
+        文件响应
+    """
+    if (file_name.startswith(".") or "/" in file_name or "\\" in file_name
+            or ".extract" in file_name or file_name.endswith(_TEMPORARY_SUFFIXES)):
+        raise HTTPException(status_code=404, detail="文件不存在")
+    path = local_storage.local_path(file_name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="文件不存在")
+    try:
+        return file_response(path, request.method, request.headers)
+    except (FileNotFoundError, NotADirectoryError):
+        raise HTTPException(status_code=404, detail="文件不存在")
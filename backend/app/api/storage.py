@@ -0,0 +1,48 @@
+"""
+存储管理API模块
+提供孤儿文件回收的触发和进度查询接口，以及已删除会话后台清理的指标
+"""
+
+from fastapi import APIRouter, HTTPException
+from app.api.upload import file_service
+from app.services.gc_service import OrphanFileCollector
+from app.services.purge_service import SessionPurger
+
+router = APIRouter()
+orphan_collector = OrphanFileCollector(file_service)
+session_purger = SessionPurger(orphan_collector)
+
+@router.get("/api/storage/gc")
+def get_gc_status():
+    """
+    获取孤儿文件回收进度和指标
+
+    Returns:
+        进行中的回收进度、最近一次回收结果和累计指标
+    """
+    return orphan_collector.get_metrics()
+
+@router.post("/api/storage/gc", status_code=202)
+async def start_gc(dry_run: bool = False):
+    """
+    在后台开始一轮孤儿文件回收
+
+    Args:
+        dry_run: 只统计孤儿文件，不删除
+
+    Returns:
+        回收进度和指标，通过GET /api/storage/gc查询后续进度
+    """
+    if not orphan_collector.start_run(dry_run):
+        raise HTTPException(status_code=409, detail="孤儿文件回收正在进行")
+    return orphan_collector.get_metrics()
+
+@router.get("/api/storage/purge")
+def get_purge_status():
+    """
+    获取已删除会话的后台清理指标
+
+    Returns:
+        正在清理的会话进度和累计指标
+    """
+    return session_purger.get_metrics()
@@ -6,15 +6,23 @@
 
 import os
 import uuid
+import json
+import asyncio
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Request, Header
-from typing import Optional, List
+from fastapi.responses import StreamingResponse
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 from bson import ObjectId
-from app.services.file_service import FileService
+from app.core.config import settings
+from app.services.file_service import FileService, FileTooLargeError
+from app.utils.text_extraction import is_paged
 
 router = APIRouter()
 file_service = FileService()
 
+# 允许上传的文件扩展名
+ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.pdf', '.doc', '.docx', '.txt'}
+
 async def get_user_id(request: Request, x_user_id: str = Header(None), form_user_id: str = Form(None)) -> str:
     """
     从请求中获取用户ID，如果不存在则使用默认值
@@ -72,54 +80,166 @@ async def upload_files(
     if not files:
         raise HTTPException(status_code=400, detail="没有上传文件")
 
+    # 在开始任何I/O之前校验全部文件，任一文件不合法时整个请求直接拒绝
+    max_size = settings.UPLOAD_MAX_SIZE
+    for i, file in enumerate(files):
+        print(f"[DEBUG] 文件 {i+1}: {file.filename} 类型 {file.content_type}")
+        # 检查文件大小（客户端声明的大小可能缺失，读取时还会按实际字节数再次检查）
+        if file.size is not None and file.size > max_size:
+            raise HTTPException(
+                status_code=413, 
+                detail=f"文件 {file.filename} 超过大小限制 ({max_size // (1024 * 1024)}MB)"
+            )
+
+        # 检查文件类型
+        file_ext = os.path.splitext(file.filename)[1].lower()
+        if file_ext not in ALLOWED_EXTENSIONS:
+            raise HTTPException(
+                status_code=415,
+                detail=f"文件 {file.filename} 类型不支持"
+            )
+
+    print(f"[DEBUG] 开始处理 {len(files)} 个文件，并发上限 {settings.UPLOAD_CONCURRENCY}")
+    semaphore = asyncio.Semaphore(settings.UPLOAD_CONCURRENCY)
+
+    async def save_one(index: int, file: UploadFile) -> Dict[str, Any]:
+        """保存单个文件，失败时返回错误信息而不是抛出异常"""
+        async with semaphore:
+            try:
+                print(f"[DEBUG] 正在保存文件 {index+1}: {file.filename}")
+                file_info = await file_service.save_file(file, session_id, user_id)
+                print(f"[DEBUG] 文件 {index+1} 保存成功: {file_info}")
+                return {"file": file_info}
+            except FileTooLargeError as e:
+                return {"error": {"index": index, "filename": file.filename, "status_code": 413, "detail": str(e)}}
+            except Exception as e:
+                print(f"[ERROR] 文件 {index+1} 上传失败: {str(e)}")
+                return {"error": {"index": index, "filename": file.filename, "status_code": 500, "detail": f"文件上传失败: {str(e)}"}}
+
+    results = await asyncio.gather(*(save_one(i, file) for i, file in enumerate(files)))
+
+    # 确保返回的数据可以序列化为JSON，结果顺序与上传顺序一致
+    json_safe_files = []
+    errors = []
+    for result in results:
+        if "error" in result:
+            errors.append(result["error"])
+            continue
+        json_safe_file = {}
+        for key, value in result["file"].items():
+            if isinstance(value, ObjectId):
+                json_safe_file[key] = str(value)
+            else:
+                json_safe_file[key] = value
+        json_safe_files.append(json_safe_file)
+
+    if not json_safe_files:
+        # 全部失败：单个文件时保留其状态码，多个文件时返回500并附带每个文件的错误
+        status_code = errors[0]["status_code"] if len(errors) == 1 else 500
+        raise HTTPException(status_code=status_code, detail=errors[0]["detail"] if len(errors) == 1 else errors)
+
+    print(f"成功接收 {len(json_safe_files)} 个文件，失败 {len(errors)} 个，文件已保存到数据库")
+    return {
+        "status": "partial" if errors else "success",
+        "message": f"成功上传 {len(json_safe_files)} 个文件" + (f"，{len(errors)} 个文件失败" if errors else ""),
+        "files": json_safe_files,
+        "errors": errors
+    }
+
+@router.get("/api/sessions/{session_id}/files")
+async def get_session_files(session_id: str):
+    """
+    获取会话中所有文件的访问地址
+
+    存储在OSS上的文件一次性批量签名，渲染带附件的历史记录时只需调用一次
+
+    Args:
+        session_id: 会话ID
+
+    Returns:
+        文件列表，地址已签名
+    """
     try:
-        print(f"[DEBUG] 开始处理 {len(files)} 个文件")
-        uploaded_files = []
-        for i, file in enumerate(files):
-            # 检查文件大小 (限制为10MB)
-            max_size = 10 * 1024 * 1024  # 10MB
-            if file.size > max_size:
-                raise HTTPException(
-                    status_code=413, 
-                    detail=f"文件 {file.filename} 超过大小限制 (10MB)"
-                )
-
-            # 检查文件类型
-            print(f"[DEBUG] 文件 {i+1}: {file.filename} 类型 {file.content_type}")
-            allowed_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.pdf', '.doc', '.docx', '.txt'}
-            file_ext = os.path.splitext(file.filename)[1].lower()
-            if file_ext not in allowed_extensions:
-                raise HTTPException(
-                    status_code=415,
-                    detail=f"文件 {file.filename} 类型不支持"
-                )
-
-            # 保存文件并获取信息
-            print(f"[DEBUG] 正在保存文件 {i+1}: {file.filename}")
-            file_info = await file_service.save_file(file, session_id, user_id)
-            print(f"[DEBUG] 文件 {i+1} 保存成功: {file_info}")
-            uploaded_files.append(file_info)
-
-        print(f"成功接收 {len(uploaded_files)} 个文件，文件已保存到数据库")
-        # 确保返回的数据可以序列化为JSON
-        json_safe_files = []
-        for file in uploaded_files:
-            json_safe_file = {}
-            for key, value in file.items():
-                if isinstance(value, ObjectId):
-                    json_safe_file[key] = str(value)
-                else:
-                    json_safe_file[key] = value
-            json_safe_files.append(json_safe_file)
-
-        return {
-            "status": "success",
-            "message": f"成功上传 {len(uploaded_files)} 个文件",
-            "files": json_safe_files
-        }
+        return {"session_id": session_id, "files": await file_service.get_session_file_urls(session_id)}
     except Exception as e:
-        print(f"[ERROR] 文件上传失败: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"文件上传失败: {str(e)}")
+        print(f"[ERROR] 获取会话文件失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"获取会话文件失败: {str(e)}")
+
+@router.get("/api/files/{file_id}/extraction")
+async def get_extraction_status(file_id: str):
+    """
+    获取文件的文本提取状态
+
+    Args:
+        file_id: 文件ID
+
+    Returns:
+        提取状态（pending/processing/ready/failed/unsupported）、文本长度和错误信息
+    """
+    status = await file_service.extraction_service.get_status(file_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="文件不存在")
+    return status
+
+@router.get("/api/files/{file_id}/renditions")
+async def get_renditions(file_id: str):
+    """
+    获取文件的缩略图和预览图
+
+    Args:
+        file_id: 文件ID
+
+    Returns:
+        预览图状态（pending/ready/failed，不生成预览图的文件为null）和各尺寸预览图的地址
+    """
+    status = await file_service.rendition_service.get_status(file_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="文件不存在")
+    return status
+
+@router.get("/api/files/{file_id}/pages")
+async def stream_file_pages(file_id: str, http_request: Request, lang: Optional[str] = None):
+    """
+    按页流式返回PDF或图片的文本，每页完成时立即发送
+
+    有文本层的页面和已缓存的页面立即返回，扫描页并行OCR识别，返回顺序为完成顺序
+
+    Args:
+        file_id: 文件ID
+        http_request: 原始HTTP请求，用于检测客户端是否断开
+        lang: OCR语言，为空时使用配置；只能使用OCR_ALLOWED_LANGS中的语言，可以用+组合
+
+    Returns:
+        StreamingResponse: SSE流，每个page事件包含page、total、text和source
+    """
+    # 语言会传给tesseract并作为OCR缓存键的一部分，只接受配置允许的语言
+    if lang and not all(part in settings.OCR_ALLOWED_LANGS for part in lang.split("+")):
+        raise HTTPException(status_code=400, detail=f"不支持的OCR语言: {lang}")
+    file_info = await file_service.get_file_info_async(file_id)
+    if not file_info:
+        raise HTTPException(status_code=404, detail="文件不存在")
+    if not is_paged(file_info["original_name"]):
+        raise HTTPException(status_code=415, detail="只支持PDF和图片文件")
+
+    async def event_generator():
+        pages = file_service.extraction_service.iter_pages(file_info, lang)
+        try:
+            async for page in pages:
+                if await http_request.is_disconnected():
+                    return
+                yield f"data: {json.dumps({'type': 'page', **page}, ensure_ascii=False)}\n\n"
+            yield f"data: {json.dumps({'type': 'done'})}\n\n"
+        except Exception as e:
+            print(f"[ERROR] 按页提取文件文本失败: {str(e)}")
+            yield f"data: {json.dumps({'type': 'error', 'message': str(e)}, ensure_ascii=False)}\n\n"
+        finally:
+            await pages.aclose()
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "Connection": "keep-alive"}
+    )
 
 @router.delete("/api/files/{file_id}")
 async def delete_file(file_id: str, user_id: Optional[str] = None):
@@ -135,7 +255,7 @@ async def delete_file(file_id: str, user_id: Optional[str] = None):
     """
     try:
         # 获取文件信息
-        file_info = file_service.get_file_info(file_id)
+        file_info = await file_service.get_file_info_async(file_id)
         if not file_info:
             raise HTTPException(status_code=404, detail="文件不存在")
         
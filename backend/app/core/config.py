@@ -31,6 +31,77 @@ class Settings:
         self.AI_MODEL = self.env_config.get("AI_MODEL", "glm-4")
         self.AI_API_KEY = self.env_config.get("AI_API_KEY", "")
         self.SYSTEM_PROMPT = self.env_config.get("SYSTEM_PROMPT", "你是一个专业的法律助手")
+        # 每个进程允许同时进行的上游AI调用数量
+        self.AI_MAX_CONCURRENT_STREAMS = int(self.env_config.get("AI_MAX_CONCURRENT_STREAMS", 32))
+        # 流式响应桥接队列长度，队列满时暂停读取上游（背压）
+        self.AI_STREAM_QUEUE_SIZE = int(self.env_config.get("AI_STREAM_QUEUE_SIZE", 64))
+        
+        # 缓存过期配置（秒）：超过软过期时间返回旧值并后台刷新，超过硬过期时间后淘汰
+        self.HISTORY_CACHE_SOFT_TTL = float(self.env_config.get("HISTORY_CACHE_SOFT_TTL", 5))
+        self.HISTORY_CACHE_HARD_TTL = float(self.env_config.get("HISTORY_CACHE_HARD_TTL", 60))
+        self.SESSIONS_CACHE_SOFT_TTL = float(self.env_config.get("SESSIONS_CACHE_SOFT_TTL", 5))
+        self.SESSIONS_CACHE_HARD_TTL = float(self.env_config.get("SESSIONS_CACHE_HARD_TTL", 60))
+        # 后台刷新缓存的线程数量
+        self.CACHE_REFRESH_WORKERS = int(self.env_config.get("CACHE_REFRESH_WORKERS", 4))
+        
+        # 共享缓存配置
+        # 共享L2缓存后端：redis/memory，为空时只使用进程内缓存
+        self.CACHE_BACKEND = self.env_config.get("CACHE_BACKEND", "")
+        self.REDIS_URL = self.env_config.get("REDIS_URL", "redis://localhost:6379/0")
+        
+        # 增量同步配置
+        # 每次同步最多返回的消息数量，超过时分批返回
+        self.SYNC_MAX_MESSAGES = int(self.env_config.get("SYNC_MAX_MESSAGES", 500))
+        # 同步时间窗口回退秒数，容忍多个服务实例之间的时钟偏差，客户端按_id去重
+        self.SYNC_OVERLAP_SECONDS = int(self.env_config.get("SYNC_OVERLAP_SECONDS", 5))
+        # 已删除会话墓碑的保留天数，同步令牌超过该时间需要全量刷新
+        self.SYNC_TOMBSTONE_RETENTION_DAYS = int(self.env_config.get("SYNC_TOMBSTONE_RETENTION_DAYS", 30))
+        
+        # 文件上传配置
+        # 单个文件的大小上限（字节）
+        self.UPLOAD_MAX_SIZE = int(self.env_config.get("UPLOAD_MAX_SIZE", 10 * 1024 * 1024))
+        # 流式上传缓冲区大小（字节），同时作为OSS分片大小，OSS要求不小于100KB
+        self.UPLOAD_BUFFER_SIZE = max(int(self.env_config.get("UPLOAD_BUFFER_SIZE", 1024 * 1024)), 100 * 1024)
+        # 单个请求内同时处理的文件数上限
+        self.UPLOAD_CONCURRENCY = max(int(self.env_config.get("UPLOAD_CONCURRENCY", 4)), 1)
+        
+        # 文本提取配置
+        # 提取进程数，PDF解析和OCR是CPU密集型操作
+        self.EXTRACTION_MAX_WORKERS = max(int(self.env_config.get("EXTRACTION_MAX_WORKERS", 2)), 1)
+        # 每个文件保存的提取文本最大字符数
+        self.EXTRACTION_MAX_CHARS = int(self.env_config.get("EXTRACTION_MAX_CHARS", 200000))
+        # 提取任务的租约时长（秒），工作进程退出后租约过期，未完成的文件由其他工作进程重新提取
+        self.EXTRACTION_LEASE_SECONDS = max(int(self.env_config.get("EXTRACTION_LEASE_SECONDS", 600)), 30)
+        # 每次对话附带给模型的文件段落总字符数上限
+        self.EXTRACTION_CONTEXT_MAX_CHARS = int(self.env_config.get("EXTRACTION_CONTEXT_MAX_CHARS", 8000))
+        # 每次对话检索的文件段落数、分段长度和相邻段落重叠字符数
+        self.RETRIEVAL_TOP_K = int(self.env_config.get("RETRIEVAL_TOP_K", 5))
+        self.RETRIEVAL_CHUNK_SIZE = int(self.env_config.get("RETRIEVAL_CHUNK_SIZE", 400))
+        self.RETRIEVAL_CHUNK_OVERLAP = int(self.env_config.get("RETRIEVAL_CHUNK_OVERLAP", 80))
+        # 在内存中保留段落索引的会话数
+        self.RETRIEVAL_MAX_SESSIONS = int(self.env_config.get("RETRIEVAL_MAX_SESSIONS", 256))
+        # 缩略图和预览图的最长边像素数，PDF的预览图由首页生成
+        self.RENDITION_THUMBNAIL_SIZE = int(self.env_config.get("RENDITION_THUMBNAIL_SIZE", 256))
+        self.RENDITION_PREVIEW_SIZE = int(self.env_config.get("RENDITION_PREVIEW_SIZE", 1024))
+        # 缩略图和预览图的WebP/JPEG压缩质量
+        self.RENDITION_QUALITY = int(self.env_config.get("RENDITION_QUALITY", 80))
+        # 预览图任务的租约时长（秒），工作进程退出后租约过期，未完成的文件由其他工作进程重新生成
+        self.RENDITION_LEASE_SECONDS = max(int(self.env_config.get("RENDITION_LEASE_SECONDS", 300)), 30)
+        # 法条索引文件路径（由app.scripts.build_statute_index生成），文件不存在时不附带法条
+        self.STATUTE_INDEX_PATH = self.env_config.get("STATUTE_INDEX_PATH", "data/statutes.idx")
+        # 每次对话按关键词检索附带的法条数
+        self.STATUTE_TOP_K = int(self.env_config.get("STATUTE_TOP_K", 3))
+        # 图片OCR使用的tesseract语言
+        self.OCR_LANG = self.env_config.get("OCR_LANG", "chi_sim+eng")
+        # 接口允许客户端指定的OCR语言（逗号分隔），客户端可以用+组合多个语言，如chi_sim+eng
+        self.OCR_ALLOWED_LANGS = [
+            lang.strip() for lang in self.env_config.get("OCR_ALLOWED_LANGS", "chi_sim,chi_tra,eng").split(",")
+            if lang.strip()
+        ]
+        # PDF页面OCR前的栅格化分辨率
+        self.OCR_DPI = int(self.env_config.get("OCR_DPI", 200))
+        # PDF页面文本层少于该字符数时视为扫描页，需要OCR
+        self.OCR_MIN_TEXT_CHARS = int(self.env_config.get("OCR_MIN_TEXT_CHARS", 20))
         
         # 阿里云OSS配置
         self.OSS_ACCESS_KEY_ID = self.env_config.get("OSS_ACCESS_KEY_ID", "")
@@ -38,6 +109,44 @@ class Settings:
         self.OSS_ENDPOINT = self.env_config.get("OSS_ENDPOINT", "")
         self.OSS_BUCKET_NAME = self.env_config.get("OSS_BUCKET_NAME", "")
         self.OSS_BASE_URL = self.env_config.get("OSS_BASE_URL", "")
+        # OSS调用线程池大小和HTTP连接池大小
+        self.OSS_MAX_WORKERS = int(self.env_config.get("OSS_MAX_WORKERS", 16))
+        self.OSS_CONNECTION_POOL_SIZE = int(self.env_config.get("OSS_CONNECTION_POOL_SIZE", 16))
+        # 超过该大小（字节）的文件使用分片上传，以及单个文件同时上传的分片数
+        self.OSS_MULTIPART_THRESHOLD = int(self.env_config.get("OSS_MULTIPART_THRESHOLD", 5 * 1024 * 1024))
+        self.OSS_MULTIPART_PARALLELISM = max(int(self.env_config.get("OSS_MULTIPART_PARALLELISM", 4)), 1)
+        # 上传文件的存储后端：local/oss/memory，为空时配置了OSS则使用OSS，否则使用本地存储
+        self.STORAGE_BACKEND = self.env_config.get("STORAGE_BACKEND", "")
+        # 本地存储目录，文件按存储名的哈希分两级子目录存放
+        self.STORAGE_LOCAL_DIR = self.env_config.get("STORAGE_LOCAL_DIR", "uploads")
+        # OSS对象的本地磁盘缓存目录和容量上限（字节），同一主机的工作进程共享；目录为空时不缓存
+        self.OSS_CACHE_DIR = self.env_config.get("OSS_CACHE_DIR", "cache/oss")
+        self.OSS_CACHE_MAX_BYTES = int(self.env_config.get("OSS_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+        # 批量删除OSS文件时每次请求的文件数，OSS限制最多1000个
+        self.OSS_BATCH_DELETE_SIZE = int(self.env_config.get("OSS_BATCH_DELETE_SIZE", 1000))
+        # 签名URL的有效期（秒），以及签名的复用时长：同一对象在复用时长内返回同一个URL，
+        # 返回给客户端的URL剩余有效期始终不少于OSS_SIGNED_URL_EXPIRES
+        self.OSS_SIGNED_URL_EXPIRES = int(self.env_config.get("OSS_SIGNED_URL_EXPIRES", 3600))
+        self.OSS_SIGNED_URL_REFRESH = max(int(self.env_config.get("OSS_SIGNED_URL_REFRESH", 600)), 1)
+        # 缓存的签名URL数量上限
+        self.OSS_SIGNED_URL_CACHE_SIZE = int(self.env_config.get("OSS_SIGNED_URL_CACHE_SIZE", 10000))
+        
+        # 孤儿文件回收配置
+        # 上传后的宽限期（小时）、每批扫描的文件数、每秒最多删除的文件数、定期回收间隔（秒，0为不定期回收）
+        self.GC_GRACE_PERIOD_HOURS = float(self.env_config.get("GC_GRACE_PERIOD_HOURS", 24))
+        self.GC_BATCH_SIZE = max(int(self.env_config.get("GC_BATCH_SIZE", 500)), 1)
+        self.GC_MAX_DELETES_PER_SECOND = float(self.env_config.get("GC_MAX_DELETES_PER_SECOND", 200))
+        self.GC_INTERVAL_SECONDS = int(self.env_config.get("GC_INTERVAL_SECONDS", 6 * 3600))
+        # 认领的过期时间（秒），回收或清理中途退出时，认领的文件记录在过期后可以被重新认领
+        self.GC_CLAIM_TIMEOUT_SECONDS = max(int(self.env_config.get("GC_CLAIM_TIMEOUT_SECONDS", 3600)), 60)
+        
+        # 已删除会话的后台清理配置
+        # 每批删除的消息数或文件数、每秒最多删除的消息和文件数
+        self.PURGE_BATCH_SIZE = max(int(self.env_config.get("PURGE_BATCH_SIZE", 500)), 1)
+        self.PURGE_MAX_DELETES_PER_SECOND = float(self.env_config.get("PURGE_MAX_DELETES_PER_SECOND", 1000))
+        # 没有删除通知时检查等待清理会话的间隔（秒），以及清理租约时长（秒），进程退出后租约过期的会话由其他进程继续清理
+        self.PURGE_POLL_SECONDS = float(self.env_config.get("PURGE_POLL_SECONDS", 60))
+        self.PURGE_LEASE_SECONDS = int(self.env_config.get("PURGE_LEASE_SECONDS", 300))
     
     def _get_allowed_origins(self) -> list:
         """获取允许的CORS源列表"""
@@ -0,0 +1,173 @@
+"""
+文件内容数据访问模块
+负责按内容哈希（SHA-256）存储的文件对象及其引用计数
+"""
+
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+from pymongo import ReturnDocument, UpdateOne
+from app.db.db_config import db_config
+from app.crud.file_repository import gc_unclaimed_filter
+
+class AsyncBlobRepository:
+    """
+    文件内容数据访问类（异步版本）
+
+    每个不同内容的文件对应blobs集合中的一条记录，_id为内容的SHA-256，
+    ref_count记录引用该内容的文件记录数
+    """
+
+    @property
+    def blobs_collection(self):
+        """获取motor集合，延迟到首次使用时创建，确保客户端绑定到运行中的事件循环"""
+        return db_config.async_blobs_collection
+
+    async def get_blob(self, sha256: str) -> Optional[Dict[str, Any]]:
+        """
+        获取文件内容记录
+
+        Args:
+            sha256: 内容哈希
+
+        Returns:
+            文件内容记录，不存在时返回None
+        """
+        return await self.blobs_collection.find_one({"_id": sha256})
+
+    async def acquire(self, sha256: str) -> Optional[Dict[str, Any]]:
+        """
+        引用已存在的文件内容，引用计数加一
+
+        只匹配引用计数大于0的记录，正在被删除的内容不会被复用
+
+        Args:
+            sha256: 内容哈希
+
+        Returns:
+            更新后的文件内容记录，不存在时返回None
+        """
+        return await self.blobs_collection.find_one_and_update(
+            {"_id": sha256, "ref_count": {"$gt": 0}},
+            {"$inc": {"ref_count": 1}, "$set": {"updated_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def add_reference(self, sha256: str, location: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        记录新存储的文件内容并引用一次
+
+        并发上传相同内容时只有第一次写入的存储位置会被记录，
+        调用方应以返回记录中的位置为准
+
+        Args:
+            sha256: 内容哈希
+            location: 存储位置信息，包括stored_name、is_oss、file_path、file_url和size
+
+        Returns:
+            更新后的文件内容记录
+        """
+        now = datetime.utcnow()
+        return await self.blobs_collection.find_one_and_update(
+            {"_id": sha256},
+            {
+                "$inc": {"ref_count": 1},
+                "$set": {"updated_at": now},
+                "$setOnInsert": {**location, "created_at": now}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def release(self, sha256: str) -> Optional[Dict[str, Any]]:
+        """
+        释放一次引用，引用计数归零时删除记录
+
+        Args:
+            sha256: 内容哈希
+
+        Returns:
+            引用计数归零并被删除的记录，调用方需要删除对应的存储对象；其他情况返回None
+        """
+        blob = await self.blobs_collection.find_one_and_update(
+            {"_id": sha256},
+            {"$inc": {"ref_count": -1}, "$set": {"updated_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER
+        )
+        if blob is None or blob["ref_count"] > 0:
+            return None
+        # 只有引用计数仍为0时才删除，期间被重新引用的内容保留
+        result = await self.blobs_collection.delete_one({"_id": sha256, "ref_count": {"$lte": 0}})
+        return blob if result.deleted_count else None
+
+    async def set_renditions(self, sha256: str, renditions: List[Dict[str, Any]], version: int) -> bool:
+        """
+        记录文件内容的预览图
+
+        Args:
+            sha256: 内容哈希
+            renditions: 预览图的存储位置信息列表
+            version: 预览图版本
+
+        Returns:
+            文件内容记录是否仍然存在；不存在时调用方需要删除刚生成的预览图
+        """
+        result = await self.blobs_collection.update_one(
+            {"_id": sha256, "ref_count": {"$gt": 0}},
+            {"$set": {"renditions": renditions, "renditions_version": version, "updated_at": datetime.utcnow()}}
+        )
+        return result.matched_count > 0
+
+    async def release_many(self, counts: Dict[str, int]):
+        """
+        批量释放引用
+
+        Args:
+            counts: 内容哈希到释放次数的映射
+        """
+        if not counts:
+            return
+        now = datetime.utcnow()
+        await self.blobs_collection.bulk_write([
+            UpdateOne({"_id": sha256}, {"$inc": {"ref_count": -count}, "$set": {"updated_at": now}})
+            for sha256, count in counts.items()
+        ], ordered=False)
+
+    async def claim_unreferenced(self, sha256_list: List[str], token: str) -> List[Dict[str, Any]]:
+        """
+        认领引用计数已归零的文件内容，认领过期的记录可以被重新认领
+
+        Args:
+            sha256_list: 内容哈希列表
+            token: 本次回收的标记
+
+        Returns:
+            本次认领的文件内容记录
+        """
+        await self.blobs_collection.update_many(
+            {"_id": {"$in": sha256_list}, "ref_count": {"$lte": 0}, **gc_unclaimed_filter()},
+            {"$set": {"gc_token": token, "gc_claimed_at": datetime.utcnow()}}
+        )
+        return await self.blobs_collection.find({"gc_token": token}).to_list(length=None)
+
+    async def delete_claimed(self, token: str, sha256_list: List[str]) -> List[str]:
+        """
+        删除认领的文件内容记录
+
+        只删除引用计数仍为0的记录；认领后又被重新引用的记录保留并取消标记，
+        调用方不能删除它们的存储对象
+
+        Args:
+            token: 本次回收的标记
+            sha256_list: 认领的内容哈希列表
+
+        Returns:
+            实际删除的内容哈希列表
+        """
+        await self.blobs_collection.delete_many({"gc_token": token, "ref_count": {"$lte": 0}})
+        survivors = set(await self.blobs_collection.distinct("_id", {"_id": {"$in": sha256_list}}))
+        if survivors:
+            await self.blobs_collection.update_many(
+                {"_id": {"$in": list(survivors)}, "gc_token": token},
+                {"$unset": {"gc_token": "", "gc_claimed_at": ""}}
+            )
+        return [sha256 for sha256 in sha256_list if sha256 not in survivors]
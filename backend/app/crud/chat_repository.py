@@ -4,11 +4,283 @@
 负责与聊天消息相关的数据库操作
 """
 
-from datetime import datetime
-from typing import Optional, List, Dict, Any
+import base64
+import json
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, Set, Tuple
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
 from app.db.db_config import db_config
 
+# 会话列表中最后一条消息预览的最大长度
+SESSION_PREVIEW_LENGTH = 200
+
+# 已删除会话的后台清理状态
+PURGE_PENDING = "pending"
+PURGE_RUNNING = "purging"
+PURGE_DONE = "done"
+
+def _build_message(
+    session_id: str,
+    user_id: str,
+    role: str,
+    content: str,
+    message_type: str = "text",
+    additional_data: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """构建待插入的消息文档"""
+    return {
+        "session_id": session_id,
+        "user_id": user_id,
+        "role": role,
+        "content": content,
+        "message_type": message_type,
+        "timestamp": datetime.utcnow(),
+        "additional_data": additional_data or {}
+    }
+
+def _build_session_update(message: Dict[str, Any]) -> Dict[str, Any]:
+    """构建新消息对应的会话汇总更新（upsert）"""
+    return {
+        "$set": {
+            "last_message": message["content"][:SESSION_PREVIEW_LENGTH],
+            "last_role": message["role"],
+            # 已删除的会话收到新消息时恢复为正常会话，不再过期删除
+            "deleted_at": None,
+            "expire_at": None
+        },
+        "$max": {"updated_at": message["timestamp"]},
+        "$inc": {"message_count": 1},
+        "$setOnInsert": {"created_at": message["timestamp"]}
+    }
+
+def _build_session_tombstone() -> Dict[str, Any]:
+    """
+    构建会话删除时的墓碑更新
+
+    会话汇总文档保留为墓碑，供增量同步通知客户端删除；
+    cleared_at记录清空时间，读取时立即隐藏该时间之前的消息，
+    消息和文件由后台清理按purge_status分批删除；
+    清理完成后才设置expire_at，墓碑在保留期后由TTL索引删除
+    """
+    now = datetime.utcnow()
+    return {
+        "$set": {
+            "deleted_at": now,
+            "cleared_at": now,
+            "updated_at": now,
+            "last_message": "",
+            "last_role": None,
+            "message_count": 0,
+            "purge_status": PURGE_PENDING,
+            "purge_lease_until": None,
+            "purged_messages": 0,
+            "purged_files": 0,
+            "purged_at": None,
+            "expire_at": None
+        }
+    }
+
+def _purge_status_to_dict(session: Dict[str, Any]) -> Dict[str, Any]:
+    """将会话汇总文档转换为清理进度返回格式"""
+    return {
+        "session_id": session["session_id"],
+        "user_id": session.get("user_id"),
+        "deleted_at": session.get("deleted_at"),
+        "cleared_at": session.get("cleared_at"),
+        "purge_status": session.get("purge_status"),
+        "purged_messages": session.get("purged_messages", 0),
+        "purged_files": session.get("purged_files", 0),
+        "purged_at": session.get("purged_at")
+    }
+
+def _session_to_dict(session: Dict[str, Any]) -> Dict[str, Any]:
+    """将会话汇总文档转换为接口返回格式"""
+    return {
+        "session_id": session["session_id"],
+        "last_message": session.get("last_message", ""),
+        "timestamp": session["updated_at"],
+        "message_count": session.get("message_count", 0)
+    }
+
+def _build_query(session_id: str, user_id: Optional[str] = None) -> Dict[str, Any]:
+    """构建会话消息查询条件"""
+    query = {"session_id": session_id}
+    if user_id:
+        query["user_id"] = user_id
+    return query
+
+def _build_cleared_query(session_id: str, user_id: Optional[str] = None) -> Dict[str, Any]:
+    """构建查询会话清空时间的条件"""
+    query = _build_query(session_id, user_id)
+    query["cleared_at"] = {"$type": "date"}
+    return query
+
+def _hide_cleared(query: Dict[str, Any], session: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """隐藏会话清空时间之前、尚未被后台清理删除的消息"""
+    if session is not None:
+        query["timestamp"] = {"$gt": session["cleared_at"]}
+    return query
+
+def _build_changes_query(
+    user_id: str,
+    since: datetime,
+    session_id: Optional[str] = None,
+    after: Optional[str] = None,
+    changed_sessions: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """
+    构建增量同步的消息查询条件，after为同一轮同步中上一批的续传游标
+
+    changed_sessions为since之后变更的会话汇总文档，其中清空时间晚于since的会话，
+    隐藏清空时间之前、尚未被后台清理删除的消息；清空时间不晚于since的消息已被since条件排除
+    """
+    query: Dict[str, Any] = {"user_id": user_id, "timestamp": {"$gt": since}}
+    cleared = [
+        {"session_id": session["session_id"], "timestamp": {"$lte": session["cleared_at"]}}
+        for session in changed_sessions or []
+        if isinstance(session.get("cleared_at"), datetime) and session["cleared_at"] > since
+    ]
+    if cleared:
+        query["$nor"] = cleared
+    if session_id:
+        query["session_id"] = session_id
+    if after:
+        timestamp, message_id = decode_cursor(after)
+        query["$or"] = [
+            {"timestamp": {"$gt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$gt": message_id}}
+        ]
+    return query
+
+def _build_changed_sessions_query(
+    user_id: str,
+    since: datetime,
+    session_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """构建增量同步的会话查询条件（包括墓碑）"""
+    query = {"user_id": user_id, "updated_at": {"$gt": since}}
+    if session_id:
+        query["session_id"] = session_id
+    return query
+
+def _changed_session_to_dict(session: Dict[str, Any]) -> Dict[str, Any]:
+    """将会话汇总文档转换为增量同步返回格式"""
+    result = _session_to_dict(session)
+    result["deleted_at"] = session.get("deleted_at")
+    result["cleared_at"] = session.get("cleared_at")
+    return result
+
+def encode_token(payload: Dict[str, Any]) -> str:
+    """
+    将字典编码为不透明的URL安全令牌，分页游标和增量同步令牌共用
+
+    Args:
+        payload: 可JSON序列化的字典
+
+    Returns:
+        去掉填充的base64url字符串
+    """
+    data = json.dumps(payload)
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_token(token: str) -> Any:
+    """
+    解析encode_token生成的令牌
+
+    Raises:
+        ValueError: 令牌不是有效的base64url编码的JSON
+    """
+    padded = token + "=" * (-len(token) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+
+def encode_cursor(message: Dict[str, Any]) -> str:
+    """
+    将消息的(timestamp, _id)编码为不透明的分页游标
+
+    Args:
+        message: 消息文档
+
+    Returns:
+        分页游标字符串
+    """
+    return encode_token({"t": message["timestamp"].isoformat(), "i": str(message["_id"])})
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """
+    解析分页游标
+
+    Args:
+        cursor: encode_cursor生成的游标字符串
+
+    Returns:
+        (timestamp, _id)元组
+
+    Raises:
+        ValueError: 游标格式无效
+    """
+    try:
+        payload = decode_token(cursor)
+        return datetime.fromisoformat(payload["t"]), ObjectId(payload["i"])
+    except (ValueError, KeyError, TypeError, InvalidId) as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
+
+def _build_page_query(
+    session_id: str,
+    user_id: Optional[str],
+    before: Optional[str],
+    after: Optional[str]
+) -> Tuple[Dict[str, Any], int]:
+    """
+    构建游标分页的查询条件和排序方向
+
+    Returns:
+        (查询条件, 排序方向)，未指定after时按从新到旧排序
+    """
+    query = _build_query(session_id, user_id)
+    if after:
+        timestamp, message_id = decode_cursor(after)
+        query["$or"] = [
+            {"timestamp": {"$gt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$gt": message_id}}
+        ]
+        return query, 1
+    if before:
+        timestamp, message_id = decode_cursor(before)
+        query["$or"] = [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": message_id}}
+        ]
+    return query, -1
+
+def _build_page(
+    messages: List[Dict[str, Any]],
+    limit: int,
+    direction: int,
+    after: Optional[str]
+) -> Dict[str, Any]:
+    """
+    根据多取一条的查询结果组装分页响应
+
+    Returns:
+        包含messages（从新到旧）、next_cursor和has_more的字典
+    """
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+
+    if direction == 1:
+        # 向新消息方向翻页：游标指向最新一条，没有新消息时沿用原游标便于轮询
+        next_cursor = encode_cursor(messages[-1]) if messages else after
+        messages.reverse()
+    else:
+        # 向旧消息方向翻页：游标指向最旧一条，已到最早消息时为None
+        next_cursor = encode_cursor(messages[-1]) if has_more else None
+
+    for message in messages:
+        message["_id"] = str(message["_id"])
+    return {"messages": messages, "next_cursor": next_cursor, "has_more": has_more}
+
 class ChatRepository:
     """聊天数据访问类"""
 
@@ -16,6 +288,14 @@ class ChatRepository:
         """初始化聊天数据访问类"""
         # 使用db_config的collection属性获取集合
         self.chat_collection = db_config.collection
+        # 会话汇总集合，随消息写入和删除同步维护
+        self.sessions_collection = db_config.sessions_collection
+
+    def _get_cleared(self, session_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """获取会话最近一次清空的汇总文档，没有清空过时返回None"""
+        return self.sessions_collection.find_one(
+            _build_cleared_query(session_id, user_id), {"cleared_at": 1}, sort=[("cleared_at", -1)]
+        )
 
     def add_chat_message(
         self,
@@ -38,24 +318,21 @@ class ChatRepository:
             additional_data: 额外数据
 
         Returns:
-            插入的文档ID
+            插入的文档ID和插入的消息
         """
         try:
-            message = {
-                "session_id": session_id,
-                "user_id": user_id,
-                "role": role,
-                "content": content,
-                "message_type": message_type,
-                "timestamp": datetime.utcnow(),
-                "additional_data": additional_data or {}
-            }
+            message = _build_message(session_id, user_id, role, content, message_type, additional_data)
 
             result = self.chat_collection.insert_one(message)
+            self.sessions_collection.update_one(
+                {"session_id": session_id, "user_id": user_id},
+                _build_session_update(message),
+                upsert=True
+            )
             print(f"成功添加消息: {str(result.inserted_id)}")
             # 确保返回的数据可以序列化为JSON
             message_id = str(result.inserted_id)
-            return {"id": message_id}
+            return {"id": message_id, "message": {**message, "_id": message_id}}
         except Exception as e:
             print(f"添加消息失败: {str(e)}")
             raise
@@ -80,9 +357,7 @@ class ChatRepository:
             消息列表
         """
         try:
-            query = {"session_id": session_id}
-            if user_id:
-                query["user_id"] = user_id
+            query = _hide_cleared(_build_query(session_id, user_id), self._get_cleared(session_id, user_id))
 
             messages = self.chat_collection.find(query).sort("timestamp", 1).skip(skip).limit(limit)
             # 将ObjectId转换为字符串，确保能被JSON序列化
@@ -96,6 +371,79 @@ class ChatRepository:
             print(f"获取消息失败: {str(e)}")
             raise
 
+    def get_chat_messages_page(
+        self,
+        session_id: str,
+        user_id: Optional[str] = None,
+        limit: int = 50,
+        before: Optional[str] = None,
+        after: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        按(timestamp, _id)游标分页获取会话消息，结果从新到旧排列
+
+        Args:
+            session_id: 会话ID
+            user_id: 可选的用户ID
+            limit: 每页消息数量
+            before: 获取此游标之前（更旧）的消息
+            after: 获取此游标之后（更新）的消息
+
+        Returns:
+            包含messages、next_cursor和has_more的字典
+        """
+        try:
+            query, direction = _build_page_query(session_id, user_id, before, after)
+            _hide_cleared(query, self._get_cleared(session_id, user_id))
+            cursor = self.chat_collection.find(query).sort(
+                [("timestamp", direction), ("_id", direction)]
+            ).limit(limit + 1)
+            page = _build_page(list(cursor), limit, direction, after)
+            print(f"成功分页获取消息: {len(page['messages'])}条")
+            return page
+        except Exception as e:
+            print(f"分页获取消息失败: {str(e)}")
+            raise
+
+    def get_changes_since(
+        self,
+        user_id: str,
+        since: datetime,
+        session_id: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: int = 500
+    ) -> Dict[str, Any]:
+        """
+        获取某个时间点之后的新消息和会话变更（包括已删除会话的墓碑）
+
+        Args:
+            user_id: 用户ID
+            since: 起始时间，只返回之后的变更
+            session_id: 可选的会话ID，只同步该会话
+            after: 同一轮同步中上一批返回的续传游标
+            limit: 本批最多返回的消息数量
+
+        Returns:
+            包含messages（从旧到新）、sessions、next_cursor和has_more的字典
+        """
+        try:
+            # 先读取会话变更，用其中的清空时间隐藏已删除或清空的会话中的消息
+            sessions = list(self.sessions_collection.find(
+                _build_changed_sessions_query(user_id, since, session_id)
+            ).sort("updated_at", 1))
+            query = _build_changes_query(user_id, since, session_id, after, sessions)
+            cursor = self.chat_collection.find(query).sort(
+                [("timestamp", 1), ("_id", 1)]
+            ).limit(limit + 1)
+            page = _build_page(list(cursor), limit, 1, after)
+            page["messages"].reverse()
+            page["sessions"] = [_changed_session_to_dict(session) for session in sessions]
+            print(f"成功获取增量变更: 消息{len(page['messages'])}条, 会话{len(page['sessions'])}个")
+            return page
+        except Exception as e:
+            print(f"获取增量变更失败: {str(e)}")
+            raise
+
     def get_user_sessions(self, user_id: str, limit: int = 20) -> List[Dict[str, Any]]:
         """
         获取用户的所有会话
@@ -108,53 +456,24 @@ class ChatRepository:
             会话列表
         """
         try:
-            # 使用更简单的方法获取用户会话
-            # 先获取所有属于该用户的会话ID
-            session_ids = set()
-            cursor = self.chat_collection.find({"user_id": user_id}, {"session_id": 1})
-            for message in cursor:
-                session_ids.add(message["session_id"])
-
-            # 为每个会话获取最后一条消息
-            sessions = []
-            for session_id in session_ids:
-                last_message_cursor = self.chat_collection.find({
-                    "session_id": session_id,
-                    "user_id": user_id
-                }).sort("timestamp", -1).limit(1)
-
-                for msg in last_message_cursor:
-                    # 确保所有字段都能被序列化
-                    msg = {k: str(v) if isinstance(v, ObjectId) else v for k, v in msg.items()}
-                    sessions.append({
-                        "session_id": session_id,
-                        "last_message": msg["content"],
-                        "timestamp": msg["timestamp"]
-                    })
-                    break
-
-            # 按时间排序并限制数量
-            sessions = sorted(sessions, key=lambda x: x["timestamp"], reverse=True)[:limit]
+            # 直接查询会话汇总集合，由(user_id, updated_at)索引完成排序和限制
+            cursor = self.sessions_collection.find(
+                {"user_id": user_id, "deleted_at": None}
+            ).sort("updated_at", -1).limit(limit)
+            sessions = [_session_to_dict(session) for session in cursor]
             print(f"成功获取用户会话: {len(sessions)}条")
             return sessions
         except Exception as e:
             print(f"获取用户会话失败: {str(e)}")
             raise
-        # 将ObjectId转换为字符串，确保能被JSON序列化
-        sessions_list = []
-        for session in sessions:
-            session_list_item = {
-                "session_id": session["_id"],
-                "last_message": session["last_message"],
-                "timestamp": session["timestamp"]
-            }
-            sessions_list.append(session_list_item)
-        return sessions_list
 
     def delete_chat_messages(self, session_id: str, user_id: Optional[str] = None) -> int:
         """
         删除会话中的聊天消息
 
+        会话汇总标记为墓碑后立即返回，消息从读取结果中隐藏，由后台清理分批删除；
+        没有会话汇总的旧数据（未回填）直接删除消息
+
         Args:
             session_id: 会话ID
             user_id: 可选的用户ID
@@ -163,13 +482,355 @@ class ChatRepository:
             删除的消息数量
         """
         try:
-            query = {"session_id": session_id}
-            if user_id:
-                query["user_id"] = user_id
+            query = _build_query(session_id, user_id)
+
+            sessions = list(self.sessions_collection.find(query, {"message_count": 1}))
+            if not sessions:
+                result = self.chat_collection.delete_many(query)
+                print(f"成功删除消息: {result.deleted_count}条")
+                return result.deleted_count
 
-            result = self.chat_collection.delete_many(query)
-            print(f"成功删除消息: {result.deleted_count}条")
-            return result.deleted_count
+            self.sessions_collection.update_many(query, _build_session_tombstone())
+            deleted_count = sum(session.get("message_count", 0) for session in sessions)
+            print(f"成功标记删除会话: {session_id}，{deleted_count}条消息等待后台清理")
+            return deleted_count
         except Exception as e:
             print(f"删除消息失败: {str(e)}")
             raise
+
+class AsyncChatRepository:
+    """聊天数据访问类（异步版本），方法与ChatRepository一一对应，孤儿文件回收和会话清理使用的方法只有异步版本"""
+
+    @property
+    def chat_collection(self):
+        """获取motor集合，延迟到首次使用时创建，确保客户端绑定到运行中的事件循环"""
+        return db_config.async_collection
+
+    @property
+    def sessions_collection(self):
+        """获取会话汇总motor集合"""
+        return db_config.async_sessions_collection
+
+    async def _get_cleared(self, session_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """获取会话最近一次清空的汇总文档，没有清空过时返回None"""
+        return await self.sessions_collection.find_one(
+            _build_cleared_query(session_id, user_id), {"cleared_at": 1}, sort=[("cleared_at", -1)]
+        )
+
+    async def add_chat_message(
+        self,
+        session_id: str,
+        user_id: str,
+        role: str,
+        content: str,
+        message_type: str = "text",
+        additional_data: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        添加聊天消息到数据库
+
+        Args:
+            session_id: 会话ID
+            user_id: 用户ID
+            role: 角色 (user/assistant)
+            content: 消息内容
+            message_type: 消息类型 (text/image等)
+            additional_data: 额外数据
+
+        Returns:
+            插入的文档ID和插入的消息
+        """
+        try:
+            message = _build_message(session_id, user_id, role, content, message_type, additional_data)
+
+            result = await self.chat_collection.insert_one(message)
+            await self.sessions_collection.update_one(
+                {"session_id": session_id, "user_id": user_id},
+                _build_session_update(message),
+                upsert=True
+            )
+            print(f"成功添加消息: {str(result.inserted_id)}")
+            message_id = str(result.inserted_id)
+            return {"id": message_id, "message": {**message, "_id": message_id}}
+        except Exception as e:
+            print(f"添加消息失败: {str(e)}")
+            raise
+
+    async def get_chat_messages(
+        self,
+        session_id: str,
+        user_id: Optional[str] = None,
+        limit: int = 50,
+        skip: int = 0
+    ) -> List[Dict[str, Any]]:
+        """
+        获取会话中的聊天消息
+
+        Args:
+            session_id: 会话ID
+            user_id: 可选的用户ID
+            limit: 返回消息数量限制
+            skip: 跳过的消息数量
+
+        Returns:
+            消息列表
+        """
+        try:
+            query = _hide_cleared(_build_query(session_id, user_id), await self._get_cleared(session_id, user_id))
+
+            cursor = self.chat_collection.find(query).sort("timestamp", 1).skip(skip).limit(limit)
+            messages_list = []
+            async for message in cursor:
+                message['_id'] = str(message['_id'])
+                messages_list.append(message)
+            print(f"成功获取消息: {len(messages_list)}条")
+            return messages_list
+        except Exception as e:
+            print(f"获取消息失败: {str(e)}")
+            raise
+
+    async def get_chat_messages_page(
+        self,
+        session_id: str,
+        user_id: Optional[str] = None,
+        limit: int = 50,
+        before: Optional[str] = None,
+        after: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        按(timestamp, _id)游标分页获取会话消息，结果从新到旧排列
+
+        Args:
+            session_id: 会话ID
+            user_id: 可选的用户ID
+            limit: 每页消息数量
+            before: 获取此游标之前（更旧）的消息
+            after: 获取此游标之后（更新）的消息
+
+        Returns:
+            包含messages、next_cursor和has_more的字典
+        """
+        try:
+            query, direction = _build_page_query(session_id, user_id, before, after)
+            _hide_cleared(query, await self._get_cleared(session_id, user_id))
+            cursor = self.chat_collection.find(query).sort(
+                [("timestamp", direction), ("_id", direction)]
+            ).limit(limit + 1)
+            page = _build_page(await cursor.to_list(length=limit + 1), limit, direction, after)
+            print(f"成功分页获取消息: {len(page['messages'])}条")
+            return page
+        except Exception as e:
+            print(f"分页获取消息失败: {str(e)}")
+            raise
+
+    async def get_changes_since(
+        self,
+        user_id: str,
+        since: datetime,
+        session_id: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: int = 500
+    ) -> Dict[str, Any]:
+        """
+        获取某个时间点之后的新消息和会话变更（包括已删除会话的墓碑）
+
+        Args:
+            user_id: 用户ID
+            since: 起始时间，只返回之后的变更
+            session_id: 可选的会话ID，只同步该会话
+            after: 同一轮同步中上一批返回的续传游标
+            limit: 本批最多返回的消息数量
+
+        Returns:
+            包含messages（从旧到新）、sessions、next_cursor和has_more的字典
+        """
+        try:
+            # 先读取会话变更，用其中的清空时间隐藏已删除或清空的会话中的消息
+            sessions = await self.sessions_collection.find(
+                _build_changed_sessions_query(user_id, since, session_id)
+            ).sort("updated_at", 1).to_list(length=None)
+            query = _build_changes_query(user_id, since, session_id, after, sessions)
+            cursor = self.chat_collection.find(query).sort(
+                [("timestamp", 1), ("_id", 1)]
+            ).limit(limit + 1)
+            page = _build_page(await cursor.to_list(length=limit + 1), limit, 1, after)
+            page["messages"].reverse()
+            page["sessions"] = [_changed_session_to_dict(session) for session in sessions]
+            print(f"成功获取增量变更: 消息{len(page['messages'])}条, 会话{len(page['sessions'])}个")
+            return page
+        except Exception as e:
+            print(f"获取增量变更失败: {str(e)}")
+            raise
+
+    async def get_user_sessions(self, user_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        获取用户的所有会话
+
+        Args:
+            user_id: 用户ID
+            limit: 返回会话数量限制
+
+        Returns:
+            会话列表
+        """
+        try:
+            cursor = self.sessions_collection.find(
+                {"user_id": user_id, "deleted_at": None}
+            ).sort("updated_at", -1).limit(limit)
+            sessions = [_session_to_dict(session) async for session in cursor]
+            print(f"成功获取用户会话: {len(sessions)}条")
+            return sessions
+        except Exception as e:
+            print(f"获取用户会话失败: {str(e)}")
+            raise
+
+    async def delete_chat_messages(self, session_id: str, user_id: Optional[str] = None) -> int:
+        """
+        删除会话中的聊天消息
+
+        会话汇总标记为墓碑后立即返回，消息从读取结果中隐藏，由后台清理分批删除；
+        没有会话汇总的旧数据（未回填）直接删除消息
+
+        Args:
+            session_id: 会话ID
+            user_id: 可选的用户ID
+
+        Returns:
+            删除的消息数量
+        """
+        try:
+            query = _build_query(session_id, user_id)
+
+            sessions = await self.sessions_collection.find(query, {"message_count": 1}).to_list(length=None)
+            if not sessions:
+                result = await self.chat_collection.delete_many(query)
+                print(f"成功删除消息: {result.deleted_count}条")
+                return result.deleted_count
+
+            await self.sessions_collection.update_many(query, _build_session_tombstone())
+            deleted_count = sum(session.get("message_count", 0) for session in sessions)
+            print(f"成功标记删除会话: {session_id}，{deleted_count}条消息等待后台清理")
+            return deleted_count
+        except Exception as e:
+            print(f"删除消息失败: {str(e)}")
+            raise
+
+    async def get_live_session_ids(self, session_ids: List[str]) -> Set[str]:
+        """
+        获取仍然存在的会话
+
+        会话汇总中未删除的会话，以及没有会话汇总但仍有消息的会话（兼容未回填会话汇总的旧数据）；
+        已删除会话中等待后台清理的消息不使会话视为存在
+
+        Args:
+            session_ids: 会话ID列表
+
+        Returns:
+            仍然存在的会话ID集合
+        """
+        try:
+            live = set(await self.sessions_collection.distinct(
+                "session_id", {"session_id": {"$in": session_ids}, "deleted_at": None}
+            ))
+            known = set(await self.sessions_collection.distinct("session_id", {"session_id": {"$in": session_ids}}))
+            remaining = [session_id for session_id in session_ids if session_id not in known]
+            if remaining:
+                live.update(await self.chat_collection.distinct("session_id", {"session_id": {"$in": remaining}}))
+            return live
+        except Exception as e:
+            print(f"获取会话状态失败: {str(e)}")
+            raise
+
+    async def claim_session_purge(self, lease: timedelta) -> Optional[Dict[str, Any]]:
+        """
+        认领一个等待后台清理的已删除会话
+
+        清理中的会话带有租约，进程退出后租约过期，会话可以被重新认领
+
+        Args:
+            lease: 租约时长
+
+        Returns:
+            认领的会话汇总文档，没有等待清理的会话时返回None
+        """
+        now = datetime.utcnow()
+        return await self.sessions_collection.find_one_and_update(
+            {"$or": [
+                {"purge_status": PURGE_PENDING},
+                {"purge_status": PURGE_RUNNING, "purge_lease_until": {"$lt": now}}
+            ]},
+            {"$set": {"purge_status": PURGE_RUNNING, "purge_lease_until": now + lease}},
+            sort=[("cleared_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def delete_cleared_messages(self, session: Dict[str, Any], limit: int) -> int:
+        """
+        删除一批会话清空时间之前的消息
+
+        Args:
+            session: 会话汇总文档
+            limit: 本批最多删除的消息数
+
+        Returns:
+            删除的消息数量
+        """
+        query = {
+            "session_id": session["session_id"],
+            "user_id": session["user_id"],
+            "timestamp": {"$lte": session["cleared_at"]}
+        }
+        ids = [message["_id"] async for message in self.chat_collection.find(query, {"_id": 1}).limit(limit)]
+        if not ids:
+            return 0
+        result = await self.chat_collection.delete_many({"_id": {"$in": ids}})
+        return result.deleted_count
+
+    async def update_session_purge(self, session: Dict[str, Any], lease: timedelta,
+                                   messages: int = 0, files: int = 0, done: bool = False) -> bool:
+        """
+        记录会话清理进度并续租
+
+        Args:
+            session: 认领的会话汇总文档
+            lease: 租约时长
+            messages: 本批删除的消息数
+            files: 本批删除的文件数
+            done: 是否已清理完成
+
+        Returns:
+            会话是否仍由本次清理负责；清理期间会话再次被删除（清空时间改变）时返回False
+        """
+        now = datetime.utcnow()
+        update: Dict[str, Any] = {"$inc": {"purged_messages": messages, "purged_files": files}}
+        if done:
+            update["$set"] = {"purge_status": PURGE_DONE, "purge_lease_until": None, "purged_at": now}
+        else:
+            update["$set"] = {"purge_lease_until": now + lease}
+        query = {"_id": session["_id"], "cleared_at": session["cleared_at"], "purge_status": PURGE_RUNNING}
+        result = await self.sessions_collection.update_one(query, update)
+        if done and result.matched_count:
+            # 清理完成后墓碑才开始过期；清理期间会话收到新消息恢复时不设置
+            await self.sessions_collection.update_one(
+                {"_id": session["_id"], "cleared_at": session["cleared_at"], "deleted_at": {"$type": "date"}},
+                {"$set": {"expire_at": now}}
+            )
+        return result.matched_count > 0
+
+    async def get_session_purge_status(self, session_id: str, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        获取会话的后台清理进度
+
+        Args:
+            session_id: 会话ID
+            user_id: 可选的用户ID
+
+        Returns:
+            每个用户的会话清理进度，会话没有被删除过时为空列表
+        """
+        try:
+            cursor = self.sessions_collection.find(_build_cleared_query(session_id, user_id))
+            return [_purge_status_to_dict(session) async for session in cursor]
+        except Exception as e:
+            print(f"获取会话清理进度失败: {str(e)}")
+            raise
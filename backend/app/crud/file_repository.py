@@ -4,10 +4,25 @@
 负责与文件相关的数据库操作
 """
 
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
 from bson import ObjectId
+from pymongo import ReturnDocument
 from app.db.db_config import db_config
+from app.core.config import settings
+
+def _to_json_safe(file: Dict[str, Any]) -> Dict[str, Any]:
+    """将ObjectId转换为字符串，并确保所有字段都可以序列化"""
+    return {k: str(v) if isinstance(v, ObjectId) else v for k, v in file.items()}
+
+def gc_unclaimed_filter() -> Dict[str, Any]:
+    """
+    未被回收认领的记录的查询条件
+
+    认领时记录gc_claimed_at，超过GC_CLAIM_TIMEOUT_SECONDS的认领视为回收中途退出遗留，记录可以被重新认领和删除
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=settings.GC_CLAIM_TIMEOUT_SECONDS)
+    return {"$or": [{"gc_claimed_at": {"$exists": False}}, {"gc_claimed_at": {"$lt": stale_before}}]}
 
 class FileRepository:
     """文件数据访问类"""
@@ -53,9 +68,7 @@ class FileRepository:
         try:
             file = self.files_collection.find_one({"id": file_id})
             if file:
-                # 将ObjectId转换为字符串，并确保所有字段都可以序列化
-                file = {k: str(v) if isinstance(v, ObjectId) else v for k, v in file.items()}
-                return file
+                return _to_json_safe(file)
             return None
         except Exception as e:
             print(f"获取文件信息失败: {str(e)}")
@@ -75,15 +88,49 @@ class FileRepository:
             files = self.files_collection.find({"session_id": session_id}).sort("created_at", 1)
             files_list = []
             for file in files:
-                # 将ObjectId转换为字符串，并确保所有字段都可以序列化
-                file = {k: str(v) if isinstance(v, ObjectId) else v for k, v in file.items()}
-                files_list.append(file)
+                files_list.append(_to_json_safe(file))
             print(f"成功获取会话文件: {len(files_list)}个")
             return files_list
         except Exception as e:
             print(f"获取会话文件失败: {str(e)}")
             raise
 
+    def update_file_info(self, file_id: str, fields: Dict[str, Any]) -> bool:
+        """
+        更新文件信息的部分字段
+
+        Args:
+            file_id: 文件ID
+            fields: 需要更新的字段
+
+        Returns:
+            是否找到并更新了文件
+        """
+        try:
+            result = self.files_collection.update_one({"id": file_id}, {"$set": fields})
+            return result.matched_count > 0
+        except Exception as e:
+            print(f"更新文件信息失败: {str(e)}")
+            raise
+
+    def find_files_by_extraction_status(self, statuses: List[str], limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        按文本提取状态查找文件
+
+        Args:
+            statuses: 提取状态列表
+            limit: 返回的最大文件数
+
+        Returns:
+            文件列表
+        """
+        try:
+            cursor = self.files_collection.find({"extraction_status": {"$in": statuses}}).limit(limit)
+            return [_to_json_safe(file) for file in cursor]
+        except Exception as e:
+            print(f"查找文件失败: {str(e)}")
+            raise
+
     def delete_file_info(self, file_id: str) -> bool:
         """
         删除文件信息
@@ -92,10 +139,11 @@ class FileRepository:
             file_id: 文件ID
 
         Returns:
-            是否删除成功
+            是否删除成功；文件不存在或已被回收认领时返回False
         """
         try:
-            result = self.files_collection.delete_one({"id": file_id})
+            # 已被回收认领的文件由回收负责删除和释放引用，避免重复释放
+            result = self.files_collection.delete_one({"id": file_id, **gc_unclaimed_filter()})
             if result.deleted_count > 0:
                 print(f"成功删除文件信息: {file_id}")
                 return True
@@ -103,3 +151,248 @@ class FileRepository:
         except Exception as e:
             print(f"删除文件信息失败: {str(e)}")
             raise
+
+class AsyncFileRepository:
+    """文件数据访问类（异步版本），方法与FileRepository一一对应，孤儿文件回收和会话清理使用的方法只有异步版本"""
+
+    @property
+    def files_collection(self):
+        """获取motor集合，延迟到首次使用时创建，确保客户端绑定到运行中的事件循环"""
+        return db_config.async_files_collection
+
+    async def add_file_info(self, file_info: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        添加文件信息到数据库
+
+        Args:
+            file_info: 文件信息字典
+
+        Returns:
+            插入的文档ID
+        """
+        try:
+            file_info["created_at"] = datetime.utcnow()
+            result = await self.files_collection.insert_one(file_info)
+            print(f"[DEBUG] 文件仓库: 成功添加文件信息: {str(result.inserted_id)}")
+            return {"id": str(result.inserted_id)}
+        except Exception as e:
+            print(f"[ERROR] 文件仓库: 添加文件信息失败: {str(e)}")
+            print(f"[ERROR] 文件仓库: 文件信息: {file_info}")
+            raise
+
+    async def get_file_info(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取文件信息
+
+        Args:
+            file_id: 文件ID
+
+        Returns:
+            文件信息字典，如果不存在则返回None
+        """
+        try:
+            file = await self.files_collection.find_one({"id": file_id})
+            if file:
+                return _to_json_safe(file)
+            return None
+        except Exception as e:
+            print(f"获取文件信息失败: {str(e)}")
+            raise
+
+    async def get_session_files(self, session_id: str, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        获取会话中的所有文件
+
+        Args:
+            session_id: 会话ID
+            user_id: 可选的用户ID，指定时只返回该用户上传的文件
+
+        Returns:
+            文件列表
+        """
+        try:
+            query = {"session_id": session_id}
+            if user_id:
+                query["user_id"] = user_id
+            cursor = self.files_collection.find(query).sort("created_at", 1)
+            files_list = [_to_json_safe(file) async for file in cursor]
+            print(f"成功获取会话文件: {len(files_list)}个")
+            return files_list
+        except Exception as e:
+            print(f"获取会话文件失败: {str(e)}")
+            raise
+
+    async def update_file_info(self, file_id: str, fields: Dict[str, Any]) -> bool:
+        """
+        更新文件信息的部分字段
+
+        Args:
+            file_id: 文件ID
+            fields: 需要更新的字段
+
+        Returns:
+            是否找到并更新了文件
+        """
+        try:
+            result = await self.files_collection.update_one({"id": file_id}, {"$set": fields})
+            return result.matched_count > 0
+        except Exception as e:
+            print(f"更新文件信息失败: {str(e)}")
+            raise
+
+    async def find_files_by_extraction_status(self, statuses: List[str], limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        按文本提取状态查找文件
+
+        Args:
+            statuses: 提取状态列表
+            limit: 返回的最大文件数
+
+        Returns:
+            文件列表
+        """
+        try:
+            cursor = self.files_collection.find({"extraction_status": {"$in": statuses}}).limit(limit)
+            return [_to_json_safe(file) async for file in cursor]
+        except Exception as e:
+            print(f"查找文件失败: {str(e)}")
+            raise
+
+    async def claim_processing(self, kind: str, statuses: List[str], running_status: str, lease: timedelta,
+                               file_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        认领一个等待后台处理的文件（原子操作）
+
+        {kind}_status在statuses中、且没有租约或租约已过期的文件才能被认领，
+        认领后状态改为running_status并记录{kind}_lease_until，多个工作进程不会同时处理同一个文件
+
+        Args:
+            kind: 处理类型，如extraction、rendition
+            statuses: 可以认领的状态列表
+            running_status: 认领后的状态
+            lease: 租约时长
+            file_id: 只认领指定的文件，为None时认领任意一个
+
+        Returns:
+            认领的文件信息，没有可认领的文件时返回None
+        """
+        now = datetime.utcnow()
+        lease_field = f"{kind}_lease_until"
+        query: Dict[str, Any] = {
+            f"{kind}_status": {"$in": statuses},
+            "$or": [{lease_field: {"$exists": False}}, {lease_field: None}, {lease_field: {"$lt": now}}]
+        }
+        if file_id is not None:
+            query["id"] = file_id
+        file = await self.files_collection.find_one_and_update(
+            query,
+            {"$set": {f"{kind}_status": running_status, lease_field: now + lease}},
+            return_document=ReturnDocument.AFTER
+        )
+        return _to_json_safe(file) if file else None
+
+    async def delete_file_info(self, file_id: str) -> bool:
+        """
+        删除文件信息
+
+        Args:
+            file_id: 文件ID
+
+        Returns:
+            是否删除成功；文件不存在或已被回收认领时返回False
+        """
+        try:
+            # 已被回收认领的文件由回收负责删除和释放引用，避免重复释放
+            result = await self.files_collection.delete_one({"id": file_id, **gc_unclaimed_filter()})
+            if result.deleted_count > 0:
+                print(f"成功删除文件信息: {file_id}")
+                return True
+            return False
+        except Exception as e:
+            print(f"删除文件信息失败: {str(e)}")
+            raise
+
+    async def find_files_uploaded_before(self, cutoff: datetime, after: Optional[str] = None,
+                                         limit: int = 500) -> List[Dict[str, Any]]:
+        """
+        按_id顺序分批查找早于指定时间上传、属于某个会话的文件
+
+        Args:
+            cutoff: 上传时间上限
+            after: 上一批最后一个文件的_id，为None时从头开始
+            limit: 每批的最大文件数
+
+        Returns:
+            文件列表
+        """
+        query: Dict[str, Any] = {"session_id": {"$ne": None}, "upload_time": {"$lt": cutoff}}
+        if after:
+            query["_id"] = {"$gt": ObjectId(after)}
+        cursor = self.files_collection.find(query).sort("_id", 1).limit(limit)
+        return [_to_json_safe(file) async for file in cursor]
+
+    async def find_session_files_before(self, session_id: str, user_id: str, cutoff: datetime,
+                                        limit: int = 500) -> List[Dict[str, Any]]:
+        """
+        查找用户在会话中不晚于指定时间上传、尚未被认领删除的文件
+
+        会话汇总按用户区分，只清理删除会话的用户上传的文件
+
+        Args:
+            session_id: 会话ID
+            user_id: 用户ID
+            cutoff: 上传时间上限
+            limit: 最大文件数
+
+        Returns:
+            文件列表
+        """
+        query = {
+            "session_id": session_id,
+            "user_id": user_id,
+            "upload_time": {"$lte": cutoff},
+            **gc_unclaimed_filter()
+        }
+        cursor = self.files_collection.find(query).limit(limit)
+        return [_to_json_safe(file) async for file in cursor]
+
+    async def claim_files(self, file_ids: List[str], token: str) -> List[Dict[str, Any]]:
+        """
+        认领待删除的文件
+
+        每个文件只能被一次回收认领，多个进程同时回收时不会重复释放文件内容的引用；
+        认领过期的文件（回收中途退出遗留）可以被重新认领
+
+        Args:
+            file_ids: 文件ID列表
+            token: 本次回收的标记
+
+        Returns:
+            本次认领成功的文件
+        """
+        await self.files_collection.update_many(
+            {"id": {"$in": file_ids}, **gc_unclaimed_filter()},
+            {"$set": {"gc_token": token, "gc_claimed_at": datetime.utcnow()}}
+        )
+        return [_to_json_safe(file) async for file in self.files_collection.find({"gc_token": token})]
+
+    async def delete_claimed_files(self, token: str) -> List[Dict[str, Any]]:
+        """
+        删除认领的文件记录
+
+        Args:
+            token: 本次回收的标记
+
+        Returns:
+            本次实际删除的文件记录，调用方只为这些记录释放文件内容引用；
+            删除前认领过期并被其他回收重新认领、或已被其他路径删除的记录不包括在内
+        """
+        # 逐条find_one_and_delete，只返回本次删除确认删掉的记录；
+        # 先查询再批量删除时，无法区分未删除的记录和期间被其他路径删除的记录
+        ids = await self.files_collection.distinct("id", {"gc_token": token})
+        deleted = []
+        for file_id in ids:
+            file = await self.files_collection.find_one_and_delete({"id": file_id, "gc_token": token})
+            if file is not None:
+                deleted.append(_to_json_safe(file))
+        return deleted
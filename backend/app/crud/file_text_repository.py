@@ -0,0 +1,71 @@
+"""
+文件文本数据访问模块
+负责按内容哈希缓存的文件提取文本
+"""
+
+from datetime import datetime
+from typing import Optional, List, Dict, Any
+from app.db.db_config import db_config
+
+class AsyncFileTextRepository:
+    """
+    文件文本数据访问类（异步版本）
+
+    file_texts集合中每个不同内容的文件对应一条记录，_id为内容的SHA-256，
+    内容相同的文件只提取一次
+    """
+
+    @property
+    def file_texts_collection(self):
+        """获取motor集合，延迟到首次使用时创建，确保客户端绑定到运行中的事件循环"""
+        return db_config.async_file_texts_collection
+
+    async def get_text(self, sha256: str, extractor_version: int) -> Optional[Dict[str, Any]]:
+        """
+        获取缓存的提取文本
+
+        Args:
+            sha256: 内容哈希
+            extractor_version: 提取器版本，旧版本的结果视为不存在
+
+        Returns:
+            文本记录，不存在时返回None
+        """
+        return await self.file_texts_collection.find_one(
+            {"_id": sha256, "extractor_version": {"$gte": extractor_version}}
+        )
+
+    async def get_texts(self, sha256_list: List[str]) -> Dict[str, str]:
+        """
+        批量获取提取文本
+
+        Args:
+            sha256_list: 内容哈希列表
+
+        Returns:
+            内容哈希到文本的映射
+        """
+        if not sha256_list:
+            return {}
+        cursor = self.file_texts_collection.find({"_id": {"$in": sha256_list}}, {"text": 1})
+        return {doc["_id"]: doc["text"] async for doc in cursor}
+
+    async def save_text(self, sha256: str, text: str, extractor_version: int):
+        """
+        保存提取文本
+
+        Args:
+            sha256: 内容哈希
+            text: 提取的文本
+            extractor_version: 提取器版本
+        """
+        await self.file_texts_collection.update_one(
+            {"_id": sha256},
+            {"$set": {
+                "text": text,
+                "length": len(text),
+                "extractor_version": extractor_version,
+                "updated_at": datetime.utcnow()
+            }},
+            upsert=True
+        )
@@ -0,0 +1,72 @@
+"""
+OCR页面数据访问模块
+负责按（内容哈希、页码、语言）缓存的页面OCR结果
+"""
+
+from datetime import datetime
+from typing import List, Dict
+from app.db.db_config import db_config
+
+def _page_key(sha256: str, page: int, lang: str) -> str:
+    return f"{sha256}:{page}:{lang}"
+
+class AsyncOCRPageRepository:
+    """
+    OCR页面数据访问类（异步版本）
+
+    ocr_pages集合中每个（内容哈希、页码、语言）对应一条记录，
+    相同内容的文件重复上传或重新提取时不再重复OCR
+    """
+
+    @property
+    def ocr_pages_collection(self):
+        """获取motor集合，延迟到首次使用时创建，确保客户端绑定到运行中的事件循环"""
+        return db_config.async_ocr_pages_collection
+
+    async def get_pages(self, sha256: str, pages: List[int], lang: str, extractor_version: int) -> Dict[int, str]:
+        """
+        批量获取缓存的页面OCR结果
+
+        Args:
+            sha256: 内容哈希
+            pages: 页码列表
+            lang: OCR语言
+            extractor_version: 提取器版本，旧版本的结果视为不存在
+
+        Returns:
+            页码到文本的映射，只包含已缓存的页面
+        """
+        if not pages:
+            return {}
+        cursor = self.ocr_pages_collection.find(
+            {
+                "_id": {"$in": [_page_key(sha256, page, lang) for page in pages]},
+                "extractor_version": {"$gte": extractor_version}
+            },
+            {"page": 1, "text": 1}
+        )
+        return {doc["page"]: doc["text"] async for doc in cursor}
+
+    async def save_page(self, sha256: str, page: int, lang: str, text: str, extractor_version: int):
+        """
+        保存页面OCR结果
+
+        Args:
+            sha256: 内容哈希
+            page: 页码
+            lang: OCR语言
+            text: 识别的文本
+            extractor_version: 提取器版本
+        """
+        await self.ocr_pages_collection.update_one(
+            {"_id": _page_key(sha256, page, lang)},
+            {"$set": {
+                "sha256": sha256,
+                "page": page,
+                "lang": lang,
+                "text": text,
+                "extractor_version": extractor_version,
+                "updated_at": datetime.utcnow()
+            }},
+            upsert=True
+        )
@@ -5,9 +5,11 @@
 """
 
 import os
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, DESCENDING
 from pymongo.server_api import ServerApi
+from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import dotenv_values
+from app.core.config import settings
 
 # 直接从.env文件读取配置
 env_config = dotenv_values()
@@ -23,6 +25,10 @@ class DatabaseConfig:
         self.db = None
         self.chat_collection = None
         self._files_collection = None
+        self._sessions_collection = None
+        # 异步客户端（motor），供异步请求路径使用
+        self.async_client = None
+        self.async_db = None
 
     def connect(self):
         """连接到MongoDB数据库"""
@@ -36,6 +42,7 @@ class DatabaseConfig:
                 self.db = self.client[self.db_name]
                 self.chat_collection = self.db["chat_messages"]
                 self._files_collection = self.db["files"]
+                self._sessions_collection = self.db["sessions"]
                 self._ensure_indexes()
             except Exception as e:
                 print(f"连接MongoDB失败: {str(e)}")
@@ -56,6 +63,68 @@ class DatabaseConfig:
             self.connect()
         return self._files_collection
 
+    @property
+    def sessions_collection(self):
+        """获取会话汇总集合的属性访问器"""
+        if self._sessions_collection is None:
+            self.connect()
+        return self._sessions_collection
+
+    def connect_async(self):
+        """
+        创建异步MongoDB客户端
+
+        motor客户端在首次使用时才建立连接，并绑定到当前事件循环，
+        因此应在事件循环内（如应用启动事件中）调用
+        """
+        if self.async_client is None:
+            self.async_client = AsyncIOMotorClient(self.mongodb_uri, server_api=ServerApi('1'))
+            self.async_db = self.async_client[self.db_name]
+            print("已创建MongoDB异步客户端")
+        return self.async_client
+
+    @property
+    def async_collection(self):
+        """获取异步聊天集合的属性访问器"""
+        if self.async_db is None:
+            self.connect_async()
+        return self.async_db["chat_messages"]
+
+    @property
+    def async_files_collection(self):
+        """获取异步文件集合的属性访问器"""
+        if self.async_db is None:
+            self.connect_async()
+        return self.async_db["files"]
+
+    @property
+    def async_sessions_collection(self):
+        """获取异步会话汇总集合的属性访问器"""
+        if self.async_db is None:
+            self.connect_async()
+        return self.async_db["sessions"]
+
+    @property
+    def async_blobs_collection(self):
+        """获取异步文件内容集合的属性访问器"""
+        if self.async_db is None:
+            self.connect_async()
+        return self.async_db["blobs"]
+
+    @property
+    def async_file_texts_collection(self):
+        """获取异步文件文本集合的属性访问器"""
+        if self.async_db is None:
+            self.connect_async()
+        return self.async_db["file_texts"]
+
+    @property
+    def async_ocr_pages_collection(self):
+        """获取异步OCR页面集合的属性访问器"""
+        if self.async_db is None:
+            self.connect_async()
+        return self.async_db["ocr_pages"]
+
     def _ensure_indexes(self):
         """确保数据库索引存在"""
         try:
@@ -63,12 +132,46 @@ class DatabaseConfig:
             self.chat_collection.create_index("session_id")
             self.chat_collection.create_index("user_id")
             self.chat_collection.create_index("timestamp")
+            # 增量同步索引：按用户和时间查询新消息
+            self.chat_collection.create_index([("user_id", ASCENDING), ("timestamp", ASCENDING)])
+            # 游标分页索引：按会话和用户过滤后按(timestamp, _id)有序遍历
+            self.chat_collection.create_index([
+                ("session_id", ASCENDING),
+                ("user_id", ASCENDING),
+                ("timestamp", DESCENDING),
+                ("_id", DESCENDING)
+            ])
             
             # 为文件集合创建索引
             self.files_collection.create_index("session_id")
             self.files_collection.create_index("user_id")
             self.files_collection.create_index("upload_time")
-            
+            # 按内容哈希查找引用同一文件内容的文件记录
+            self.files_collection.create_index("blob_id")
+            # 服务重启后查找未完成文本提取的文件
+            self.files_collection.create_index("extraction_status")
+            # 孤儿文件回收时标记本轮认领的文件和文件内容
+            self.files_collection.create_index("gc_token", sparse=True)
+            self.db["blobs"].create_index("gc_token", sparse=True)
+
+            # 为会话汇总集合创建索引：每个用户的每个会话一条记录，按更新时间列出
+            self.sessions_collection.create_index(
+                [("session_id", ASCENDING), ("user_id", ASCENDING)], unique=True
+            )
+            self.sessions_collection.create_index([("user_id", ASCENDING), ("updated_at", DESCENDING)])
+            # 已删除会话的墓碑在后台清理完成（设置expire_at）后保留期满时自动删除；
+            # 早期版本按deleted_at过期的索引会删除仍在等待清理的墓碑，需要移除
+            if "deleted_at_1" in self.sessions_collection.index_information():
+                self.sessions_collection.drop_index("deleted_at_1")
+            self.sessions_collection.create_index(
+                "expire_at",
+                expireAfterSeconds=settings.SYNC_TOMBSTONE_RETENTION_DAYS * 24 * 3600,
+                partialFilterExpression={"expire_at": {"$type": "date"}}
+            )
+
+            # 后台清理查找等待清理的已删除会话
+            self.sessions_collection.create_index("purge_status", sparse=True)
+
             print("数据库索引已创建")
         except Exception as e:
             print(f"创建数据库索引失败: {str(e)}")
@@ -82,7 +185,13 @@ class DatabaseConfig:
             self.db = None
             self.chat_collection = None
             self._files_collection = None
+            self._sessions_collection = None
             print("已断开数据库连接")
+        if self.async_client:
+            self.async_client.close()
+            self.async_client = None
+            self.async_db = None
+            print("已断开数据库异步连接")
 
 # 创建全局数据库配置实例
 db_config = DatabaseConfig()
@@ -0,0 +1,81 @@
+"""
+会话汇总回填脚本
+根据chat_messages集合中的已有消息重建sessions集合
+
+用法（在backend目录下执行）:
+    python -m app.scripts.backfill_sessions [--user-id USER_ID] [--batch-size 500]
+"""
+
+import argparse
+from pymongo import UpdateOne
+from app.db.db_config import db_config
+from app.crud.chat_repository import SESSION_PREVIEW_LENGTH
+
+def backfill_sessions(user_id: str = None, batch_size: int = 500) -> int:
+    """
+    按(session_id, user_id)聚合消息并写入会话汇总集合
+
+    Args:
+        user_id: 可选的用户ID，只回填该用户的会话
+        batch_size: 每批写入的会话数量
+
+    Returns:
+        写入的会话数量
+    """
+    db_config.connect()
+    chat_collection = db_config.collection
+    sessions_collection = db_config.sessions_collection
+
+    pipeline = []
+    if user_id:
+        pipeline.append({"$match": {"user_id": user_id}})
+    pipeline.extend([
+        {"$sort": {"timestamp": 1}},
+        {"$group": {
+            "_id": {"session_id": "$session_id", "user_id": "$user_id"},
+            "last_message": {"$last": "$content"},
+            "last_role": {"$last": "$role"},
+            "message_count": {"$sum": 1},
+            "created_at": {"$first": "$timestamp"},
+            "updated_at": {"$last": "$timestamp"}
+        }}
+    ])
+
+    total = 0
+    operations = []
+    for group in chat_collection.aggregate(pipeline, allowDiskUse=True):
+        key = group["_id"]
+        operations.append(UpdateOne(
+            {"session_id": key["session_id"], "user_id": key["user_id"]},
+            {"$set": {
+                "last_message": (group["last_message"] or "")[:SESSION_PREVIEW_LENGTH],
+                "last_role": group["last_role"],
+                "message_count": group["message_count"],
+                "created_at": group["created_at"],
+                "updated_at": group["updated_at"]
+            }},
+            upsert=True
+        ))
+        if len(operations) >= batch_size:
+            sessions_collection.bulk_write(operations, ordered=False)
+            total += len(operations)
+            print(f"[INFO] 已回填 {total} 个会话")
+            operations = []
+
+    if operations:
+        sessions_collection.bulk_write(operations, ordered=False)
+        total += len(operations)
+
+    print(f"[INFO] 会话汇总回填完成，共 {total} 个会话")
+    return total
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="根据已有聊天消息回填sessions集合")
+    parser.add_argument("--user-id", default=None, help="只回填指定用户的会话")
+    parser.add_argument("--batch-size", type=int, default=500, help="每批写入的会话数量")
+    args = parser.parse_args()
+
+    try:
+        backfill_sessions(args.user_id, args.batch_size)
+    finally:
+        db_config.disconnect()
@@ -0,0 +1,83 @@
+"""
+段落检索基准测试脚本
+生成数百页的合成法律文书，测量BM25索引的建立时间、内存规模和查询延迟
+
+用法（在backend目录下执行）:
+    python -m app.scripts.benchmark_retrieval [--pages 300] [--chars-per-page 1500] [--documents 3] [--queries 200]
+"""
+
+import argparse
+import random
+import statistics
+import time
+from typing import List
+from app.utils.retrieval import BM25Index
+from app.core.config import settings
+
+# 合成文本使用的法律词汇
+_TERMS = [
+    "合同", "当事人", "违约责任", "损害赔偿", "解除", "履行期限", "不可抗力", "定金", "违约金",
+    "债权人", "债务人", "担保", "抵押", "质押", "诉讼时效", "管辖", "仲裁", "判决", "上诉",
+    "原告", "被告", "第三人", "证据", "举证责任", "侵权", "过错", "赔偿金额", "利息", "本金",
+    "租赁", "买卖", "借款", "劳动合同", "工资", "经济补偿", "社会保险", "知识产权", "商标", "专利"
+]
+_CONNECTORS = ["应当", "可以", "不得", "依照", "根据", "由", "向", "对于", "按照", "经"]
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(_TERMS) if i % 2 == 0 else rng.choice(_CONNECTORS) for i in range(rng.randint(6, 14))]
+    return "".join(words) + rng.choice(["。", "；", "。\n"])
+
+def generate_document(pages: int, chars_per_page: int, seed: int) -> str:
+    """生成指定页数的合成文书"""
+    rng = random.Random(seed)
+    parts: List[str] = []
+    for page in range(pages):
+        text = f"第{page + 1}页\n"
+        while len(text) < chars_per_page:
+            text += _sentence(rng)
+        parts.append(text)
+    return "\n".join(parts)
+
+def _percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent))]
+
+def run_benchmark(pages: int, chars_per_page: int, documents: int, queries: int, top_k: int):
+    """运行基准测试并打印结果"""
+    texts = [generate_document(pages, chars_per_page, seed) for seed in range(documents)]
+    total_chars = sum(len(text) for text in texts)
+    print(f"文档: {documents} 个 x {pages} 页，共 {total_chars} 字符")
+
+    index = BM25Index(chunk_size=settings.RETRIEVAL_CHUNK_SIZE, overlap=settings.RETRIEVAL_CHUNK_OVERLAP)
+    build_times = []
+    for i, text in enumerate(texts):
+        start = time.perf_counter()
+        index.add_document(f"doc{i}", f"文书{i + 1}", text)
+        build_times.append(time.perf_counter() - start)
+    print(f"建立索引: 总计 {sum(build_times):.3f}秒，每个文档 {statistics.mean(build_times):.3f}秒，"
+          f"{index.passage_count} 个段落，{len(index._postings)} 个词项")
+
+    rng = random.Random(42)
+    latencies = []
+    for _ in range(queries):
+        query = "".join(rng.sample(_TERMS, 3)) + "怎么处理"
+        start = time.perf_counter()
+        index.search(query, top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    print(f"查询 {queries} 次: 平均 {statistics.mean(latencies):.2f}毫秒，"
+          f"p50 {_percentile(latencies, 0.5):.2f}毫秒，p95 {_percentile(latencies, 0.95):.2f}毫秒，"
+          f"最大 {max(latencies):.2f}毫秒")
+
+    start = time.perf_counter()
+    index.remove_document("doc0")
+    print(f"删除一个文档: {time.perf_counter() - start:.3f}秒")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BM25段落检索基准测试")
+    parser.add_argument("--pages", type=int, default=300, help="每个文档的页数")
+    parser.add_argument("--chars-per-page", type=int, default=1500, help="每页字符数")
+    parser.add_argument("--documents", type=int, default=3, help="文档数")
+    parser.add_argument("--queries", type=int, default=200, help="查询次数")
+    parser.add_argument("--top-k", type=int, default=settings.RETRIEVAL_TOP_K, help="每次查询返回的段落数")
+    args = parser.parse_args()
+    run_benchmark(args.pages, args.chars_per_page, args.documents, args.queries, args.top_k)
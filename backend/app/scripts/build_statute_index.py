@@ -0,0 +1,70 @@
+"""
+法条索引构建脚本
+把法律法规文本编译为可mmap的法条索引文件
+
+输入可以是目录或单个文件:
+    *.txt    一部法规的全文，文件名为法规名，条文以“第X条”开头
+    *.jsonl  每行一条条文: {"law": "民法典", "number": 577, "label": "第五百七十七条", "text": "..."}
+             number也可以是中文条号，label可省略
+
+用法（在backend目录下执行）:
+    python -m app.scripts.build_statute_index --input data/statutes [--output data/statutes.idx]
+"""
+
+import argparse
+import json
+import os
+import time
+from typing import Any, Dict, Iterator
+from app.utils.statute_index import build_index, chinese_to_int, parse_statute_text
+from app.core.config import settings
+
+def _read_text(path: str) -> str:
+    with open(path, "rb") as f:
+        data = f.read()
+    for encoding in ("utf-8-sig", "gb18030"):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    raise ValueError(f"无法识别文件编码: {path}")
+
+def load_articles(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    读取条文
+
+    Args:
+        path: 法规文本目录或文件
+
+    Yields:
+        条文，包含law、number、label和text
+    """
+    paths = [path]
+    if os.path.isdir(path):
+        paths = sorted(os.path.join(path, name) for name in os.listdir(path))
+    for file_path in paths:
+        stem, ext = os.path.splitext(os.path.basename(file_path))
+        if ext.lower() == ".txt":
+            yield from parse_statute_text(stem, _read_text(file_path))
+        elif ext.lower() == ".jsonl":
+            for line in _read_text(file_path).splitlines():
+                if not line.strip():
+                    continue
+                article = json.loads(line)
+                if isinstance(article["number"], str):
+                    article["number"] = chinese_to_int(article["number"].strip().lstrip("第").rstrip("条"))
+                yield article
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="构建法条索引")
+    parser.add_argument("--input", required=True, help="法规文本目录或文件（.txt/.jsonl）")
+    parser.add_argument("--output", default=settings.STATUTE_INDEX_PATH, help="索引文件路径")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    output_dir = os.path.dirname(args.output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    meta = build_index(load_articles(args.input), args.output)
+    print(f"法条索引已写入 {args.output}: {meta['articles']} 条条文，{meta['terms']} 个词项，"
+          f"{os.path.getsize(args.output)} 字节，耗时 {time.time() - start_time:.2f}秒")
@@ -0,0 +1,38 @@
+"""
+孤儿文件回收脚本
+删除所属会话已不存在的文件，释放文件内容引用并批量删除存储对象
+
+服务运行时会按GC_INTERVAL_SECONDS定期回收，也可以用本脚本手动回收；
+多个回收进程同时运行时，每个文件只会被其中一个进程认领和删除
+
+用法（在backend目录下执行）:
+    python -m app.scripts.gc_orphan_files [--dry-run] [--grace-hours 24] [--batch-size 500] [--rate 200]
+"""
+
+import argparse
+import asyncio
+from datetime import timedelta
+from app.db.db_config import db_config
+from app.services.file_service import FileService
+from app.services.gc_service import OrphanFileCollector
+from app.core.config import settings
+
+async def main(args: argparse.Namespace) -> dict:
+    db_config.connect_async()
+    collector = OrphanFileCollector(FileService())
+    collector.grace_period = timedelta(hours=args.grace_hours)
+    collector.batch_size = max(args.batch_size, 1)
+    collector.max_deletes_per_second = args.rate
+    try:
+        return await collector.run(args.dry_run)
+    finally:
+        db_config.disconnect()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="回收所属会话已不存在的上传文件")
+    parser.add_argument("--dry-run", action="store_true", help="只统计孤儿文件，不删除")
+    parser.add_argument("--grace-hours", type=float, default=settings.GC_GRACE_PERIOD_HOURS, help="上传后不回收的宽限期（小时）")
+    parser.add_argument("--batch-size", type=int, default=settings.GC_BATCH_SIZE, help="每批扫描的文件数")
+    parser.add_argument("--rate", type=float, default=settings.GC_MAX_DELETES_PER_SECOND, help="每秒最多删除的文件数，0为不限速")
+    result = asyncio.run(main(parser.parse_args()))
+    print(f"回收完成: {result}")
@@ -0,0 +1,115 @@
+"""
+本地存储迁移脚本
+把平铺在本地存储根目录中的文件移动到按哈希分目录的布局，并更新files和blobs集合中的file_path
+
+迁移期间服务可以继续运行：本地存储后端同时查找分目录路径和平铺路径，
+每个文件通过同一文件系统内的重命名原子地移动
+
+用法（在backend目录下执行）:
+    python -m app.scripts.migrate_local_storage [--root uploads] [--dry-run] [--batch-size 500]
+"""
+
+import argparse
+import os
+import time
+from typing import Dict, List
+from pymongo import UpdateMany
+from app.db.db_config import db_config
+from app.services.storage_backends import LocalStorageBackend
+from app.core.config import settings
+
+# 上传和处理过程中的临时文件不迁移
+_TEMPORARY_SUFFIXES = (".part", ".tmp")
+
+def _flat_files(root: str) -> List[str]:
+    """根目录中需要迁移的文件名"""
+    names = []
+    for entry in os.scandir(root):
+        if not entry.is_file() or entry.name.startswith("."):
+            continue
+        if ".extract" in entry.name or entry.name.endswith(_TEMPORARY_SUFFIXES):
+            continue
+        names.append(entry.name)
+    return names
+
+# 本地存储的记录：storage为local，或早期没有storage字段且不在OSS上
+_LOCAL_FILTER = {"storage": {"$in": ["local", None]}, "is_oss": {"$ne": True}}
+
+def _path_updates(name: str, new_path: str) -> Dict[str, List[UpdateMany]]:
+    """
+    文件移动后对应的数据库更新，包括文件内容记录中的预览图路径
+
+    按存储名匹配而不是按旧路径匹配，--root的写法（如./uploads或绝对路径）与记录中的路径不同时也能更新
+    """
+    return {
+        "files": [UpdateMany({"stored_name": name, **_LOCAL_FILTER}, {"$set": {"file_path": new_path}})],
+        "blobs": [
+            UpdateMany({"stored_name": name, **_LOCAL_FILTER}, {"$set": {"file_path": new_path}}),
+            # 每个预览图的存储名唯一，一个文件内容记录中最多匹配一项
+            UpdateMany({"renditions": {"$elemMatch": {"stored_name": name, **_LOCAL_FILTER}}},
+                       {"$set": {"renditions.$.file_path": new_path}})
+        ]
+    }
+
+def migrate_local_storage(root: str, dry_run: bool = False, batch_size: int = 500) -> Dict[str, int]:
+    """
+    迁移本地存储的文件
+
+    Args:
+        root: 本地存储根目录
+        dry_run: 只统计需要迁移的文件，不移动文件也不修改数据库
+        batch_size: 每批写入数据库的更新数
+
+    Returns:
+        迁移统计：moved、skipped和failed
+    """
+    storage = LocalStorageBackend(root)
+    names = _flat_files(root)
+    stats = {"found": len(names), "moved": 0, "skipped": 0, "failed": 0}
+    print(f"[INFO] 本地存储迁移: {root} 中有 {len(names)} 个文件需要迁移")
+    if dry_run or not names:
+        return stats
+
+    db_config.connect()
+    collections = {"files": db_config.files_collection, "blobs": db_config.db["blobs"]}
+    pending: Dict[str, list] = {"files": [], "blobs": []}
+
+    def flush():
+        for name, operations in pending.items():
+            if operations:
+                collections[name].bulk_write(operations, ordered=False)
+                operations.clear()
+
+    for name in names:
+        old_path = storage.legacy_path(name)
+        new_path = storage.path_for(name)
+        try:
+            if os.path.exists(new_path):
+                # 分目录中已有同名文件（存储名唯一，内容相同），只删除平铺的副本
+                os.remove(old_path)
+                stats["skipped"] += 1
+            else:
+                os.makedirs(os.path.dirname(new_path), exist_ok=True)
+                os.rename(old_path, new_path)
+                stats["moved"] += 1
+        except OSError as e:
+            print(f"[ERROR] 本地存储迁移: 移动文件 {name} 失败: {str(e)}")
+            stats["failed"] += 1
+            continue
+        for collection_name, operations in _path_updates(name, new_path).items():
+            pending[collection_name].extend(operations)
+        if sum(len(operations) for operations in pending.values()) >= batch_size:
+            flush()
+    flush()
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把平铺的本地存储文件迁移到分目录布局")
+    parser.add_argument("--root", default=settings.STORAGE_LOCAL_DIR, help="本地存储根目录")
+    parser.add_argument("--dry-run", action="store_true", help="只统计，不移动文件")
+    parser.add_argument("--batch-size", type=int, default=500, help="每批写入数据库的更新数")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    result = migrate_local_storage(args.root, args.dry_run, args.batch_size)
+    print(f"迁移完成: {result}，耗时 {time.time() - start_time:.2f}秒")
@@ -4,11 +4,14 @@ AI服务模块
 """
 
 from typing import Dict, Any, AsyncGenerator
+import asyncio
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from zhipuai import ZhipuAI
 from app.core.config import settings
+from app.utils.async_bridge import iterate_in_thread
 
 # 获取API密钥
 zhipuai_api_key = settings.AI_API_KEY
@@ -23,6 +26,21 @@ if zhipuai_api_key:
         print(f"[ERROR] 智谱AI客户端初始化失败: {str(e)}")
         client = None
 
+# 上游AI调用专用线程池，避免阻塞事件循环，也不占用默认线程池
+ai_executor = ThreadPoolExecutor(
+    max_workers=settings.AI_MAX_CONCURRENT_STREAMS,
+    thread_name_prefix="ai-stream"
+)
+
+def _close_stream(response: Any):
+    """关闭上游流式响应，中断正在进行的生成"""
+    close = getattr(response, "close", None)
+    if close is None:
+        close = getattr(getattr(response, "response", None), "close", None)
+    if close is not None:
+        close()
+        print("[DEBUG] 客户端已断开，上游流式请求已取消")
+
 class AIService:
     """AI服务类"""
 
@@ -39,6 +57,35 @@ class AIService:
         else:
             print("警告: 未找到AI_API_KEY环境变量，AI服务将无法正常工作")
 
+    def _build_messages(self, message: str, context: Dict[str, Any] = None) -> list:
+        """
+        构建发送给模型的消息列表
+
+        Args:
+            message: 用户消息
+            context: 上下文信息，passages为用户上传文件中与问题相关的段落，statutes为相关的法条
+
+        Returns:
+            消息列表
+        """
+        messages = [{"role": "system", "content": self.system_prompt}]
+        statutes = (context or {}).get("statutes")
+        if statutes:
+            parts = [f"【{statute['law']} {statute['label']}】{statute['text']}" for statute in statutes]
+            messages.append({
+                "role": "system",
+                "content": "以下是可能相关的法律条文，引用时请注明法规名和条号：\n\n" + "\n\n".join(parts)
+            })
+        passages = (context or {}).get("passages")
+        if passages:
+            parts = [f"【{passage['name']} 第{passage['position'] + 1}段】\n{passage['text']}" for passage in passages]
+            messages.append({
+                "role": "system",
+                "content": "以下是用户上传的文件中与问题相关的内容，回答时可以参考：\n\n" + "\n\n".join(parts)
+            })
+        messages.append({"role": "user", "content": message})
+        return messages
+
     async def generate_response(self, message: str, context: Dict[str, Any] = None) -> str:
         """
         生成AI响应（非流式版本）
@@ -55,12 +102,15 @@ class AIService:
             # 使用从环境变量中读取的配置
             print(f"[DEBUG] 使用模型 {self.ai_model} 生成回答，系统提示: {self.system_prompt}")
 
-            response = client.chat.completions.create(
-                model=self.ai_model,
-                messages=[
-                    {"role":"system","content":self.system_prompt},
-                    {"role":"user","content": message},
-                ]
+            # 在专用线程池中调用阻塞的SDK，避免阻塞事件循环
+            messages = self._build_messages(message, context)
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(
+                ai_executor,
+                lambda: client.chat.completions.create(
+                    model=self.ai_model,
+                    messages=messages
+                )
             )
 
             # 模拟AI响应
@@ -90,29 +140,35 @@ class AIService:
 
             try:
                 # 使用智谱AI的流式响应功能
+                # 上游请求和逐块读取都在线程中完成，通过有界队列交给协程（背压）
                 print("[DEBUG] 调用智谱AI流式API...")
-                response = client.chat.completions.create(
-                    model=self.ai_model,
-                    messages=[
-                        {"role":"system","content":self.system_prompt},
-                        {"role":"user","content": message},
-                    ],
-                    stream=True  # 启用流式响应
-                )
+                messages = self._build_messages(message, context)
+                def create_stream():
+                    return client.chat.completions.create(
+                        model=self.ai_model,
+                        messages=messages,
+                        stream=True  # 启用流式响应
+                    )
 
-                print("[DEBUG] 流式API调用成功，开始处理响应...")
                 # 流式返回响应内容
                 content_count = 0
                 start_time = time.time()
 
-                for chunk in response:
-                    print(f"[DEBUG] 收到数据块，choices: {len(chunk.choices) if chunk.choices else 0}")
-
-                    if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
-                        content = chunk.choices[0].delta.content
-                        content_count += 1
-                        print(f"[DEBUG] 处理第 {content_count} 个数据块，内容: {content[:20]}...")
-                        yield content
+                chunks = iterate_in_thread(
+                    create_stream,
+                    maxsize=settings.AI_STREAM_QUEUE_SIZE,
+                    executor=ai_executor,
+                    on_cancel=_close_stream
+                )
+                try:
+                    async for chunk in chunks:
+                        if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                            content = chunk.choices[0].delta.content
+                            content_count += 1
+                            yield content
+                finally:
+                    # 消费者提前退出（如客户端断开）时立即关闭桥接，取消上游请求
+                    await chunks.aclose()
 
                 elapsed_time = time.time() - start_time
                 print(f"[DEBUG] 流式响应处理完成，共 {content_count} 个数据块，耗时: {elapsed_time:.2f}秒")
@@ -4,30 +4,97 @@
 """
 
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any, AsyncGenerator
 import json
 import time
 from bson import ObjectId
 
-from app.crud.chat_repository import ChatRepository
+from app.crud.chat_repository import ChatRepository, AsyncChatRepository, encode_token, decode_token
 from app.services.ai_service import AIService
+from app.services.retrieval_service import RetrievalService
+from app.services.statute_service import StatuteService
 from app.models.chat import ChatRequest, ChatResponse
-from app.utils.cache import history_cache, sessions_cache, clear_history_cache, clear_sessions_cache
-from cachetools import cached
+from app.utils.cache import (
+    history_cache, sessions_cache, history_cache_key, sessions_cache_key,
+    clear_history_cache, clear_sessions_cache, append_history_cache, cached_swr, HistoryWindow
+)
 from app.core.config import settings
 
 # 配置日志
 import logging
 logging.basicConfig(level=logging.INFO)
 
+def encode_sync_token(since: datetime, after: Optional[str] = None) -> str:
+    """
+    编码增量同步令牌
+
+    Args:
+        since: 同步的起始时间
+        after: 同一轮同步未返回完时的续传游标
+
+    Returns:
+        不透明的同步令牌
+    """
+    return encode_token({"t": since.isoformat(), "c": after})
+
+def decode_sync_token(token: str) -> Dict[str, Any]:
+    """
+    解析增量同步令牌
+
+    Raises:
+        ValueError: 令牌格式无效
+    """
+    try:
+        payload = decode_token(token)
+        return {"since": datetime.fromisoformat(payload["t"]), "after": payload.get("c")}
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"无效的同步令牌: {token}") from e
+
 class ChatService:
     """聊天服务类"""
 
     def __init__(self):
         """初始化聊天服务"""
         self.chat_repository = ChatRepository()
+        # 异步请求路径使用异步仓库，避免数据库I/O阻塞事件循环
+        self.async_chat_repository = AsyncChatRepository()
         self.ai_service = AIService()
+        # 会话文件的段落索引，只读取已完成的提取结果
+        self.retrieval_service = RetrievalService()
+        # 本地法条索引，为回答提供法律依据
+        self.statute_service = StatuteService()
+
+    async def _build_context(self, session_id: str, user_id: Optional[str], message: str) -> Dict[str, Any]:
+        """
+        构建AI回复的上下文：会话文件中与问题最相关的段落，以及问题引用或相关的法条
+
+        尚未提取完成的文件不等待，构建失败时不影响对话
+
+        Args:
+            session_id: 会话ID
+            user_id: 用户ID
+            message: 用户消息
+
+        Returns:
+            上下文信息
+        """
+        context = {}
+        try:
+            passages = await self.retrieval_service.get_passages(session_id, user_id, message)
+            if passages:
+                print(f"[DEBUG] 上下文包含 {len(passages)} 个文件段落")
+            context["passages"] = passages
+        except Exception as e:
+            print(f"[ERROR] 检索文件段落失败: {str(e)}")
+        try:
+            statutes = await self.statute_service.get_articles(message)
+            if statutes:
+                print(f"[DEBUG] 上下文包含 {len(statutes)} 条法条")
+            context["statutes"] = statutes
+        except Exception as e:
+            print(f"[ERROR] 检索法条失败: {str(e)}")
+        return context
 
     async def process_message(self, request: ChatRequest) -> ChatResponse:
         """
@@ -78,35 +145,38 @@ class ChatService:
                 request.files = processed_files
                 
             # 保存用户消息，如果有文件，消息中会包含文件信息
-        user_message_id = self.chat_repository.add_chat_message(
+        user_message = await self.async_chat_repository.add_chat_message(
             session_id=session_id,
             user_id=user_id,
             role="user",
             content=request.message,
             message_type="text" if not (request.files and len(request.files) > 0) else "file",
             additional_data=additional_data
-        )["id"]
+        )
+        user_message_id = user_message["id"]
         print(f"[DEBUG] 用户消息已保存，ID: {user_message_id}")
 
         # 生成AI回复
         start_time = time.time()
-        ai_response = await self.ai_service.generate_response(request.message)
+        context = await self._build_context(session_id, user_id, request.message)
+        ai_response = await self.ai_service.generate_response(request.message, context)
         elapsed_time = time.time() - start_time
         print(f"[DEBUG] AI回复生成完成，耗时: {elapsed_time:.2f}秒，内容长度: {len(ai_response) if ai_response else 0}")
 
         # 存储AI回复
-        ai_message_id = self.chat_repository.add_chat_message(
+        ai_message = await self.async_chat_repository.add_chat_message(
             session_id=session_id,
             user_id=user_id,
             role="assistant",
             content=ai_response,
             message_type="text",
             additional_data={"timestamp": datetime.utcnow()}
-        )["id"]
+        )
+        ai_message_id = ai_message["id"]
         print(f"[DEBUG] AI回复已保存，ID: {ai_message_id}")
 
-        # 清除相关缓存
-        clear_history_cache(session_id, user_id)
+        # 新消息写穿到历史记录缓存，会话列表缓存失效
+        append_history_cache(session_id, user_id, [user_message["message"], ai_message["message"]])
         clear_sessions_cache(user_id)
 
         return ChatResponse(
@@ -173,14 +243,15 @@ class ChatService:
                         safe_files.append(safe_file)
                     additional_data["files"] = safe_files
 
-            user_message_id = self.chat_repository.add_chat_message(
+            user_message = await self.async_chat_repository.add_chat_message(
                 session_id=session_id,
                 user_id=user_id,
                 role="user",
                 content=request.message,
                 message_type="text" if not (request.files and len(request.files) > 0) else "file",
                 additional_data=additional_data
-            )["id"]
+            )
+            user_message_id = user_message["id"]
             print(f"[DEBUG] 用户消息已保存，ID: {user_message_id}")
 
             # 获取AI回复（流式）
@@ -189,28 +260,34 @@ class ChatService:
             chunk_count = 0
             start_time = time.time()
 
-            async for chunk in self.ai_service.generate_response_stream(request.message):
-                chunk_count += 1
-                full_content += chunk
-                print(f"[DEBUG] 处理第 {chunk_count} 个数据块，当前内容长度: {len(full_content)}")
-                yield {"content": chunk}
+            context = await self._build_context(session_id, user_id, request.message)
+            ai_stream = self.ai_service.generate_response_stream(request.message, context)
+            try:
+                async for chunk in ai_stream:
+                    chunk_count += 1
+                    full_content += chunk
+                    yield {"content": chunk}
+            finally:
+                # 调用方提前关闭时同步关闭AI流，确保上游请求被取消
+                await ai_stream.aclose()
 
             elapsed_time = time.time() - start_time
             print(f"[DEBUG] AI流式回复获取完成，共 {chunk_count} 个数据块，总内容长度: {len(full_content)}，耗时: {elapsed_time:.2f}秒")
 
             # 存储完整AI回复到数据库
-            ai_message_id = self.chat_repository.add_chat_message(
+            ai_message = await self.async_chat_repository.add_chat_message(
                 session_id=session_id,
                 user_id=user_id,
                 role="assistant",
                 content=full_content,
                 message_type="text",
                 additional_data={"timestamp": datetime.utcnow()}
-            )["id"]
+            )
+            ai_message_id = ai_message["id"]
             print(f"[DEBUG] 完整AI回复已保存，ID: {ai_message_id}")
 
-            # 清除相关缓存
-            clear_history_cache(session_id, user_id)
+            # 新消息写穿到历史记录缓存，会话列表缓存失效
+            append_history_cache(session_id, user_id, [user_message["message"], ai_message["message"]])
             clear_sessions_cache(user_id)
 
         except Exception as e:
@@ -220,7 +297,6 @@ class ChatService:
             print(f"[ERROR] 错误堆栈: {traceback.format_exc()}")
             raise
 
-    @cached(history_cache, key=lambda self, session_id, user_id, limit: f"history:{session_id}:{user_id or 'all'}:{limit}")
     def get_chat_history(self, session_id: str, user_id: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
         """
         获取指定会话的聊天历史记录(带缓存)
@@ -233,10 +309,124 @@ class ChatService:
         Returns:
             聊天历史记录列表
         """
+        return self._get_history_window(session_id, user_id, limit).slice(limit)
+
+    @cached_swr(
+        history_cache,
+        key=lambda self, session_id, user_id=None, limit=50: history_cache_key(session_id, user_id),
+        soft_ttl=settings.HISTORY_CACHE_SOFT_TTL,
+        covers=lambda window, self, session_id, user_id=None, limit=50: window.covers(limit),
+        family="history_window"
+    )
+    def _get_history_window(self, session_id: str, user_id: Optional[str], limit: int) -> HistoryWindow:
+        """
+        加载会话的历史记录缓存窗口
+
+        每个会话和用户只缓存一个窗口，大小为最近请求过的最大limit，
+        较小的limit由get_chat_history切片返回
+
+        Args:
+            session_id: 会话ID
+            user_id: 可选的用户ID
+            limit: 本次请求的消息数量限制
+
+        Returns:
+            历史记录窗口
+        """
+        # 后台刷新时保持当前窗口大小，避免被较小的请求缩小
+        current = history_cache.peek(history_cache_key(session_id, user_id))
+        if current is not None:
+            limit = max(limit, current.value.limit)
         print(f"[DEBUG] 从数据库获取历史记录: session_id={session_id}, user_id={user_id}, limit={limit}")
-        return self.chat_repository.get_chat_messages(session_id, user_id, limit)
+        return HistoryWindow(limit, self.chat_repository.get_chat_messages(session_id, user_id, limit))
+
+    def get_chat_history_page(
+        self,
+        session_id: str,
+        user_id: Optional[str] = None,
+        limit: int = 50,
+        before: Optional[str] = None,
+        after: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        按游标分页获取聊天历史记录，结果从新到旧排列
+
+        Args:
+            session_id: 会话ID
+            user_id: 可选的用户ID
+            limit: 每页消息数量
+            before: 获取此游标之前（更旧）的消息
+            after: 获取此游标之后（更新）的消息
 
-    @cached(sessions_cache, key=lambda self, user_id, limit: f"sessions:{user_id}:{limit}")
+        Returns:
+            包含messages、next_cursor和has_more的字典
+        """
+        return self.chat_repository.get_chat_messages_page(session_id, user_id, limit, before, after)
+
+    def sync_changes(self, user_id: str, session_id: Optional[str] = None, token: Optional[str] = None) -> Dict[str, Any]:
+        """
+        增量同步聊天记录，只返回同步令牌之后的新消息和会话变更
+
+        没有令牌或令牌已超过墓碑保留期时返回reset=True和一份快照：
+        指定会话时为最新一页消息，同时返回当前的会话列表。客户端应丢弃本地缓存，
+        用快照重建，并保存返回的sync_token用于下次同步。
+        由于存在时间窗口回退，增量结果可能与已缓存消息重复，客户端需按_id去重；
+        会话的cleared_at之前的本地消息应删除，deleted_at非空表示会话已删除。
+
+        Args:
+            user_id: 用户ID
+            session_id: 可选的会话ID，只同步该会话
+            token: 上次同步返回的sync_token
+
+        Returns:
+            包含messages、sessions、sync_token、has_more和reset的字典
+        """
+        # 在查询前记录时间，作为下一次同步的起点
+        now = datetime.utcnow()
+        retention = timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+        state = decode_sync_token(token) if token else None
+
+        if state is None or now - state["since"] > retention:
+            print(f"[DEBUG] 增量同步需要全量刷新: user_id={user_id}, session_id={session_id}")
+            messages = []
+            has_more = False
+            if session_id:
+                page = self.chat_repository.get_chat_messages_page(session_id, user_id, settings.SYNC_MAX_MESSAGES)
+                messages = list(reversed(page["messages"]))
+                has_more = page["has_more"]
+            return {
+                "messages": messages,
+                "sessions": self.chat_repository.get_user_sessions(user_id, settings.SYNC_MAX_MESSAGES),
+                "sync_token": encode_sync_token(now),
+                "has_more": has_more,
+                "reset": True
+            }
+
+        since = state["since"] - timedelta(seconds=settings.SYNC_OVERLAP_SECONDS)
+        changes = self.chat_repository.get_changes_since(
+            user_id, since, session_id, state["after"], settings.SYNC_MAX_MESSAGES
+        )
+        if changes["has_more"]:
+            # 本轮未返回完，下次从续传游标继续，起始时间保持不变
+            sync_token = encode_sync_token(state["since"], changes["next_cursor"])
+        else:
+            sync_token = encode_sync_token(now)
+
+        print(f"[DEBUG] 增量同步完成: user_id={user_id}, 消息{len(changes['messages'])}条, 会话{len(changes['sessions'])}个")
+        return {
+            "messages": changes["messages"],
+            "sessions": changes["sessions"],
+            "sync_token": sync_token,
+            "has_more": changes["has_more"],
+            "reset": False
+        }
+
+    @cached_swr(
+        sessions_cache,
+        key=lambda self, user_id, limit=20: sessions_cache_key(user_id, limit),
+        soft_ttl=settings.SESSIONS_CACHE_SOFT_TTL,
+        family="user_sessions"
+    )
     def get_user_sessions(self, user_id: str, limit: int = 20) -> List[Dict[str, Any]]:
         """
         获取用户的所有会话(带缓存)
@@ -0,0 +1,276 @@
+"""
+文本提取服务模块
+负责在后台进程池中提取上传文件的文本，并按内容哈希缓存提取结果
+"""
+
+import os
+import uuid
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Any, AsyncGenerator, AsyncIterator, List, Optional
+from app.crud.file_repository import AsyncFileRepository
+from app.crud.file_text_repository import AsyncFileTextRepository
+from app.services.ocr_service import OCRService
+from app.services.storage_backends import StorageBackend, backend_name
+from app.utils.process_pool import get_process_pool
+from app.utils.temp_files import release_temp_file, track_temp_file
+from app.utils.text_extraction import EXTRACTOR_VERSION, extract_text, is_paged, is_supported
+from app.core.config import settings
+
+# 文本提取状态
+EXTRACTION_PENDING = "pending"
+EXTRACTION_PROCESSING = "processing"
+EXTRACTION_READY = "ready"
+EXTRACTION_FAILED = "failed"
+EXTRACTION_UNSUPPORTED = "unsupported"
+
+def initial_extraction_status(file_name: str) -> str:
+    """根据文件类型得到新文件的提取状态"""
+    return EXTRACTION_PENDING if is_supported(file_name) else EXTRACTION_UNSUPPORTED
+
+@asynccontextmanager
+async def local_file_copy(file_info: Dict[str, Any], storage_backends: Dict[str, StorageBackend],
+                          temp_dir: str) -> AsyncIterator[str]:
+    """
+    获取文件的本地路径，本地存储的文件直接使用，其他存储的文件先读取到本地临时文件，
+    使用完且没有后台任务（如仍在识别的OCR页面）引用时删除
+
+    Args:
+        file_info: 文件信息
+        storage_backends: 后端名称到存储后端的映射
+        temp_dir: 临时文件目录
+
+    Yields:
+        本地文件路径
+    """
+    storage = storage_backends.get(backend_name(file_info))
+    if storage is None:
+        raise Exception(f"未配置{backend_name(file_info)}存储，无法读取文件")
+    local_path = storage.local_path(file_info["stored_name"])
+    if local_path:
+        yield local_path
+        return
+    file_ext = os.path.splitext(file_info["stored_name"])[1]
+    temp_path = os.path.join(temp_dir, f"{uuid.uuid4()}.extract{file_ext}")
+    track_temp_file(temp_path)
+    try:
+        await storage.get_to_file(file_info["stored_name"], temp_path)
+        yield temp_path
+    finally:
+        release_temp_file(temp_path)
+
+class ExtractionService:
+    """文本提取服务类"""
+
+    def __init__(self, storage_backends: Optional[Dict[str, StorageBackend]] = None):
+        """
+        初始化文本提取服务
+
+        Args:
+            storage_backends: 后端名称到存储后端的映射，提取文件时用于读取文件；只读取提取结果时可以为None
+        """
+        self.storage_backends = storage_backends or {}
+        self.async_file_repository = AsyncFileRepository()
+        self.async_file_text_repository = AsyncFileTextRepository()
+        self.ocr_service = OCRService()
+        self.upload_dir = settings.STORAGE_LOCAL_DIR
+        self.lease = timedelta(seconds=settings.EXTRACTION_LEASE_SECONDS)
+        # 持有后台任务的引用，避免任务在完成前被回收
+        self._tasks = set()
+
+    def schedule(self, file_info: Dict[str, Any], claimed: bool = False):
+        """
+        在后台提取文件文本，立即返回
+
+        Args:
+            file_info: 已保存到数据库的文件信息
+            claimed: 文件是否已由claim_processing认领
+        """
+        task = asyncio.create_task(self.extract(file_info, claimed))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _set_status(self, file_id: str, status: str, **fields):
+        await self.async_file_repository.update_file_info(file_id, {
+            "extraction_status": status,
+            "extraction_updated_at": datetime.utcnow(),
+            **fields
+        })
+
+    def _local_file(self, file_info: Dict[str, Any]):
+        """获取文件的本地路径，见local_file_copy"""
+        return local_file_copy(file_info, self.storage_backends, self.upload_dir)
+
+    async def iter_pages(self, file_info: Dict[str, Any], lang: Optional[str] = None) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        按页提取PDF或图片的文本，每页完成时立即返回
+
+        Args:
+            file_info: 文件信息
+            lang: OCR语言，为None时使用配置
+
+        Yields:
+            页面结果，格式见OCRService.iter_pages
+        """
+        async with self._local_file(file_info) as file_path:
+            pages = self.ocr_service.iter_pages(file_path, file_info["original_name"], file_info.get("sha256"), lang)
+            try:
+                async for result in pages:
+                    yield result
+            finally:
+                await pages.aclose()
+
+    async def _extract_paged(self, file_info: Dict[str, Any]) -> str:
+        """按页提取文本，并在文件记录中更新已完成的页数"""
+        pages = {}
+        last_reported = 0.0
+        async for result in self.iter_pages(file_info):
+            pages[result["page"]] = result["text"]
+            now = time.monotonic()
+            if now - last_reported >= 1 or len(pages) == result["total"]:
+                last_reported = now
+                # 更新进度时续租，长时间OCR的文件不会被其他工作进程重复认领
+                await self.async_file_repository.update_file_info(file_info["id"], {
+                    "extraction_progress": {"pages_done": len(pages), "pages_total": result["total"]},
+                    "extraction_lease_until": datetime.utcnow() + self.lease
+                })
+        text = "\n".join(pages[page] for page in sorted(pages)).strip()
+        return text[:settings.EXTRACTION_MAX_CHARS] if settings.EXTRACTION_MAX_CHARS else text
+
+    async def _run_extraction(self, file_info: Dict[str, Any]) -> str:
+        """在进程池中提取文本，PDF和图片按页并行提取"""
+        if is_paged(file_info["original_name"]):
+            return await self._extract_paged(file_info)
+
+        async with self._local_file(file_info) as file_path:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                get_process_pool(),
+                extract_text,
+                file_path,
+                file_info["original_name"],
+                settings.OCR_LANG,
+                settings.EXTRACTION_MAX_CHARS
+            )
+
+    async def _claim(self, file_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """认领等待提取或租约过期的文件，见AsyncFileRepository.claim_processing"""
+        return await self.async_file_repository.claim_processing(
+            "extraction", [EXTRACTION_PENDING, EXTRACTION_PROCESSING], EXTRACTION_PROCESSING, self.lease, file_id
+        )
+
+    async def extract(self, file_info: Dict[str, Any], claimed: bool = False) -> Optional[str]:
+        """
+        提取文件文本并更新提取状态
+
+        先认领文件，已被其他工作进程认领的文件跳过；内容相同的文件直接使用缓存的提取结果
+
+        Args:
+            file_info: 文件信息
+            claimed: 文件是否已由claim_processing认领
+
+        Returns:
+            提取的文本，失败、不支持或已被其他工作进程认领时返回None
+        """
+        file_id = file_info["id"]
+        if not is_supported(file_info["original_name"]):
+            await self._set_status(file_id, EXTRACTION_UNSUPPORTED)
+            return None
+        if not claimed and await self._claim(file_id) is None:
+            print(f"[DEBUG] 提取服务: 文件 {file_info['original_name']} 已由其他工作进程提取，跳过")
+            return None
+
+        try:
+            sha256 = file_info.get("sha256")
+            cached = sha256 and await self.async_file_text_repository.get_text(sha256, EXTRACTOR_VERSION)
+            if cached:
+                print(f"[DEBUG] 提取服务: 文件 {file_info['original_name']} 使用缓存的提取结果")
+                text = cached["text"]
+            else:
+                print(f"[DEBUG] 提取服务: 开始提取文件 {file_info['original_name']} 的文本")
+                text = await self._run_extraction(file_info)
+                if sha256:
+                    await self.async_file_text_repository.save_text(sha256, text, EXTRACTOR_VERSION)
+            await self._set_status(file_id, EXTRACTION_READY, text_length=len(text), extraction_error=None)
+            print(f"[DEBUG] 提取服务: 文件 {file_info['original_name']} 提取完成，文本长度: {len(text)}")
+            return text
+        except Exception as e:
+            print(f"[ERROR] 提取服务: 提取文件 {file_info.get('original_name')} 的文本失败: {str(e)}")
+            try:
+                await self._set_status(file_id, EXTRACTION_FAILED, extraction_error=str(e))
+            except Exception as status_error:
+                print(f"[ERROR] 提取服务: 更新提取状态失败: {str(status_error)}")
+            return None
+
+    async def resume_pending(self, limit: int = 100) -> int:
+        """
+        重新提取服务重启前未完成的文件
+
+        每个工作进程启动时都会调用，逐个认领文件后再提交，同一个文件只会被一个工作进程重新提取
+
+        Args:
+            limit: 本次重新提取的最大文件数
+
+        Returns:
+            重新提交的文件数
+        """
+        count = 0
+        while count < limit:
+            file_info = await self._claim()
+            if file_info is None:
+                break
+            self.schedule(file_info, claimed=True)
+            count += 1
+        if count:
+            print(f"[INFO] 提取服务: 重新提取 {count} 个未完成的文件")
+        return count
+
+    async def get_status(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取文件的提取状态
+
+        Args:
+            file_id: 文件ID
+
+        Returns:
+            提取状态信息，文件不存在时返回None
+        """
+        file_info = await self.async_file_repository.get_file_info(file_id)
+        if not file_info:
+            return None
+        return {
+            "file_id": file_id,
+            "status": file_info.get("extraction_status", EXTRACTION_UNSUPPORTED),
+            "text_length": file_info.get("text_length"),
+            "error": file_info.get("extraction_error"),
+            "progress": file_info.get("extraction_progress"),
+            "updated_at": file_info.get("extraction_updated_at")
+        }
+
+    async def get_ready_files(self, session_id: str, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        获取会话中已提取完成的文件，不等待尚未完成的提取
+
+        Args:
+            session_id: 会话ID
+            user_id: 可选的用户ID，指定时只返回该用户上传的文件
+
+        Returns:
+            文件信息列表，按上传时间排列
+        """
+        files = await self.async_file_repository.get_session_files(session_id, user_id)
+        return [f for f in files if f.get("extraction_status") == EXTRACTION_READY and f.get("sha256")]
+
+    async def get_texts(self, sha256_list: List[str]) -> Dict[str, str]:
+        """
+        批量获取提取文本
+
+        Args:
+            sha256_list: 内容哈希列表
+
+        Returns:
+            内容哈希到文本的映射
+        """
+        return await self.async_file_text_repository.get_texts(sha256_list)
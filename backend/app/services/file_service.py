@@ -7,24 +7,71 @@
 import os
 import uuid
 import shutil
+import asyncio
+import hashlib
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 from fastapi import UploadFile
 from bson import ObjectId
-from app.crud.file_repository import FileRepository
+from app.crud.file_repository import FileRepository, AsyncFileRepository
+from app.crud.blob_repository import AsyncBlobRepository
 from app.db.db_config import db_config
 from app.services.oss_service import OSSService
+from app.services.storage_backends import (
+    StorageBackend, LocalStorageBackend, OSSStorageBackend, backend_name, create_storage_backend
+)
+from app.services.extraction_service import ExtractionService, initial_extraction_status, EXTRACTION_PENDING
+from app.services.rendition_service import (
+    RenditionService, initial_rendition_status, rendition_fields, RENDITION_PENDING
+)
 from app.core.config import settings
 
+class FileTooLargeError(Exception):
+    """上传文件超过大小限制"""
+
+class UploadStream:
+    """
+    按块读取上传文件的异步迭代器
+
+    读取过程中累计文件大小并计算SHA-256，超过大小限制时立即中止，
+    任意时刻只在内存中保留一个数据块
+    """
+
+    def __init__(self, file: UploadFile, chunk_size: int, max_size: int):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> bytes:
+        chunk = await self.file.read(self.chunk_size)
+        if not chunk:
+            raise StopAsyncIteration
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise FileTooLargeError(f"文件 {self.file.filename} 超过大小限制 ({self.max_size // (1024 * 1024)}MB)")
+        self.sha256.update(chunk)
+        return chunk
+
 class FileService:
     """文件服务类"""
 
     def __init__(self):
         """初始化文件服务"""
         self.file_repository = FileRepository()
-        # 确保上传目录存在（作为备用存储）
-        self.upload_dir = "uploads"
+        # 异步请求路径使用异步仓库，避免数据库I/O阻塞事件循环
+        self.async_file_repository = AsyncFileRepository()
+        self.async_blob_repository = AsyncBlobRepository()
+        # 本地存储目录，同时存放上传过程中的临时文件
+        self.upload_dir = settings.STORAGE_LOCAL_DIR
         os.makedirs(self.upload_dir, exist_ok=True)
+        # 流式上传的缓冲区大小，同时作为OSS分片大小，决定每个上传的内存占用上限
+        self.buffer_size = settings.UPLOAD_BUFFER_SIZE
+        self.max_size = settings.UPLOAD_MAX_SIZE
         
         # 初始化阿里云OSS服务
         self.oss_service = None
@@ -45,10 +92,106 @@ class FileService:
         except Exception as e:
             print(f"[ERROR] 阿里云OSS服务初始化失败: {str(e)}，将使用本地存储")
 
+        # 存储后端由STORAGE_BACKEND配置决定，未配置时有OSS则使用OSS；
+        # 本地存储始终可用，作为OSS上传失败时的备用存储，也用于读取早期的本地文件
+        self.storage: StorageBackend = create_storage_backend(settings.STORAGE_BACKEND, self.oss_service, self.upload_dir)
+        self.local_storage = self.storage if isinstance(self.storage, LocalStorageBackend) else LocalStorageBackend(self.upload_dir)
+        self.storage_backends: Dict[str, StorageBackend] = {
+            self.local_storage.name: self.local_storage,
+            self.storage.name: self.storage
+        }
+        if self.oss_service and "oss" not in self.storage_backends:
+            self.storage_backends["oss"] = OSSStorageBackend(self.oss_service)
+        print(f"[INFO] 文件服务: 使用{self.storage.name}存储后端")
+
+        # 文本提取服务，文件保存后在后台提取文本
+        self.extraction_service = ExtractionService(self.storage_backends)
+        # 预览图服务，图片和PDF保存后在后台生成缩略图，与原文件使用相同的存储
+        self.rendition_service = RenditionService(self.storage_backends, self._store_object, self._remove_object)
+
+    async def _spool_upload(self, file: UploadFile) -> Dict[str, Any]:
+        """
+        以流的方式把上传文件写入本地临时文件，同时计算SHA-256
+
+        Args:
+            file: 上传的文件
+
+        Returns:
+            包含temp_path、sha256和size的字典
+        """
+        stream = UploadStream(file, self.buffer_size, self.max_size)
+        temp_path = os.path.join(self.upload_dir, f"{uuid.uuid4()}.part")
+        try:
+            with open(temp_path, "wb") as buffer:
+                async for chunk in stream:
+                    await asyncio.to_thread(buffer.write, chunk)
+        except BaseException as e:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            if isinstance(e, FileTooLargeError):
+                raise
+            print(f"[ERROR] 文件服务: 保存文件失败: {str(e)}")
+            raise Exception(f"保存文件失败: {str(e)}")
+        return {"temp_path": temp_path, "sha256": stream.sha256.hexdigest(), "size": stream.size}
+
+    async def _store_object(self, temp_path: str, stored_name: str, original_name: str) -> Dict[str, Any]:
+        """
+        把临时文件存入存储后端，远程存储失败时存入本地存储
+
+        Returns:
+            存储位置信息
+        """
+        try:
+            print(f"[DEBUG] 文件服务: 保存文件 {original_name} 到{self.storage.name}存储，存储文件名: {stored_name}")
+            return await self.storage.put_file(temp_path, stored_name)
+        except Exception as e:
+            if self.storage is self.local_storage:
+                raise
+            print(f"[ERROR] 文件服务: 保存到{self.storage.name}存储失败: {str(e)}，改为保存到本地")
+        return await self.local_storage.put_file(temp_path, stored_name)
+
+    async def _remove_object(self, location: Dict[str, Any]):
+        """从存储位置所属的后端删除存储对象"""
+        storage = self.storage_backends.get(backend_name(location))
+        if storage is None:
+            print(f"[ERROR] 文件服务: 未配置{backend_name(location)}存储，无法删除文件 {location['stored_name']}")
+            return
+        print(f"[DEBUG] 文件服务: 从{storage.name}存储删除文件 {location['stored_name']}")
+        try:
+            if not await storage.delete(location["stored_name"]):
+                print(f"[ERROR] 文件服务: 删除文件 {location['stored_name']} 失败")
+        except Exception as e:
+            print(f"[ERROR] 文件服务: 删除文件出错: {str(e)}")
+
+    async def _acquire_blob(self, spooled: Dict[str, Any], file_ext: str, original_name: str) -> Dict[str, Any]:
+        """
+        按内容哈希获取存储对象：内容已存在时直接引用，否则存储后登记
+
+        Returns:
+            文件内容记录
+        """
+        sha256 = spooled["sha256"]
+        blob = await self.async_blob_repository.acquire(sha256)
+        if blob:
+            print(f"[DEBUG] 文件服务: 文件 {original_name} 内容已存在，复用 {blob['stored_name']}")
+            return blob
+
+        # 存储名在内容哈希后加随机后缀，每次登记的文件内容使用不同的存储对象：
+        # 旧记录引用归零删除存储对象时，不会删除之后重新上传的相同内容
+        stored_name = f"{sha256}-{uuid.uuid4().hex}{file_ext.lower()}"
+        location = await self._store_object(spooled["temp_path"], stored_name, original_name)
+        blob = await self.async_blob_repository.add_reference(sha256, {**location, "size": spooled["size"]})
+        if (blob["stored_name"], backend_name(blob)) != (location["stored_name"], backend_name(location)):
+            # 并发上传相同内容且存储位置不同时，以先登记的记录为准，清理本次多余的副本
+            await self._remove_object(location)
+        return blob
+
     async def save_file(self, file: UploadFile, session_id: Optional[str], user_id: Optional[str]) -> Dict[str, Any]:
         """
         保存上传的文件
 
+        文件按内容去重：内容相同的文件共用一个存储对象，只新增文件记录
+
         Args:
             file: 上传的文件
             session_id: 会话ID
@@ -57,78 +200,55 @@ class FileService:
         Returns:
             文件信息字典
         """
-        # 读取文件内容
-        file_content = await file.read()
-        
-        # 生成唯一文件名
         file_ext = os.path.splitext(file.filename)[1]
-        unique_filename = f"{uuid.uuid4()}{file_ext}"
-        
-        # 尝试上传到阿里云OSS
-        oss_uploaded = False
-        oss_file_info = None
-        
-        if self.oss_service:
-            try:
-                print(f"[DEBUG] 文件服务: 尝试上传文件 {file.filename} 到阿里云OSS")
-                oss_file_info = await self.oss_service.upload_file(file_content, file.filename)
-                oss_uploaded = True
-                print(f"[DEBUG] 文件服务: 文件成功上传到阿里云OSS")
-            except Exception as e:
-                print(f"[ERROR] 文件服务: 上传到阿里云OSS失败: {str(e)}")
-                oss_uploaded = False
-        
-        # 如果OSS上传失败，保存到本地
-        file_path = None
-        if not oss_uploaded:
-            file_path = os.path.join(self.upload_dir, unique_filename)
-            print(f"[DEBUG] 文件服务: 准备保存文件 {file.filename} 到本地 {file_path}")
-            
-            try:
-                with open(file_path, "wb") as buffer:
-                    buffer.write(file_content)
-                print(f"[DEBUG] 文件服务: 文件保存成功")
-            except Exception as e:
-                print(f"[ERROR] 文件服务: 保存文件失败: {str(e)}")
-                raise Exception(f"保存文件失败: {str(e)}")
-        
+        spooled = await self._spool_upload(file)
+        try:
+            blob = await self._acquire_blob(spooled, file_ext, file.filename)
+        finally:
+            if os.path.exists(spooled["temp_path"]):
+                os.remove(spooled["temp_path"])
+
         # 准备文件信息
         print(f"[DEBUG] 文件服务: 准备文件信息")
+        file_url = blob["file_url"]
         file_info = {
             "id": str(uuid.uuid4()),
             "original_name": file.filename,
-            "stored_name": unique_filename,
+            "stored_name": blob["stored_name"],
             "file_type": file.content_type,
-            "file_size": file.size,
+            "file_size": spooled["size"],
+            "sha256": spooled["sha256"],
+            "blob_id": blob["_id"],
             "upload_time": datetime.utcnow(),
             "session_id": session_id,
             "user_id": user_id,
-            "is_oss": oss_uploaded
+            "storage": backend_name(blob),
+            "is_oss": blob["is_oss"],
+            "file_path": blob["file_path"],
+            "preview_url": file.content_type.startswith("image/") and file_url or None,
+            "file_url": file_url,
+            "download_url": file_url,
+            "extraction_status": initial_extraction_status(file.filename),
+            "rendition_status": initial_rendition_status(file.filename)
         }
-        
-        # 根据存储方式设置文件路径和预览URL
-        if oss_uploaded and oss_file_info:
-            file_info.update({
-                "file_path": oss_file_info["file_url"],
-                "preview_url": file.content_type.startswith("image/") and oss_file_info["file_url"] or None,
-                "oss_file_info": oss_file_info,
-                "file_url": oss_file_info["file_url"],
-                "download_url": oss_file_info["file_url"]
-            })
-        else:
-            file_info.update({
-                "file_path": file_path,
-                "preview_url": file.content_type.startswith("image/") and f"/uploads/{unique_filename}" or None,
-                "file_url": f"/uploads/{unique_filename}",
-                "download_url": f"/uploads/{unique_filename}"
-            })
+        # 相同内容已生成过预览图时直接使用，否则在后台生成
+        if file_info["rendition_status"]:
+            renditions = await self.rendition_service.get_cached(spooled["sha256"])
+            if renditions:
+                file_info.update(rendition_fields(renditions))
 
         # 保存文件信息到数据库
         try:
             print(f"[DEBUG] 文件服务: 保存文件信息到数据库, 文件名: {file.filename}")
-            result = self.file_repository.add_file_info(file_info)
+            result = await self.async_file_repository.add_file_info(file_info)
             print(f"[DEBUG] 文件服务: 文件信息已保存到数据库: {result.get('id')}")
 
+            # 在后台提取文本，不阻塞上传请求
+            if file_info["extraction_status"] == EXTRACTION_PENDING:
+                self.extraction_service.schedule(dict(file_info))
+            if file_info["rendition_status"] == RENDITION_PENDING:
+                self.rendition_service.schedule(dict(file_info))
+
             # 确保返回的数据可以序列化为JSON
             # 创建一个深拷贝并确保所有ObjectId都被转换为字符串
             json_safe_file_info = {}
@@ -145,15 +265,22 @@ class FileService:
                 "db_id": str(result.get('id'))  # 确保db_id也是字符串
             }
         except Exception as e:
-            # 如果数据库保存失败，删除已上传的文件
+            # 如果数据库保存失败，释放对文件内容的引用
             print(f"[ERROR] 文件服务: 保存文件信息到数据库失败: {str(e)}")
-            try:
-                print(f"[DEBUG] 文件服务: 删除已上传的文件 {file_path}")
-                os.remove(file_path)
-            except:
-                pass
+            await self._release_blob(blob["_id"])
             raise Exception(f"保存文件信息到数据库失败: {str(e)}")
 
+    async def _release_blob(self, sha256: str):
+        """释放对文件内容的引用，最后一个引用释放时删除存储对象"""
+        try:
+            blob = await self.async_blob_repository.release(sha256)
+            if blob:
+                print(f"[DEBUG] 文件服务: 文件内容 {sha256} 已无引用，删除存储对象")
+                await self._remove_object(blob)
+                await self.rendition_service.remove_all(blob.get("renditions") or [])
+        except Exception as e:
+            print(f"[ERROR] 文件服务: 释放文件内容引用失败: {str(e)}")
+
     def get_file_info(self, file_id: str) -> Dict[str, Any]:
         """
         获取文件信息
@@ -166,6 +293,18 @@ class FileService:
         """
         return self.file_repository.get_file_info(file_id)
 
+    async def get_file_info_async(self, file_id: str) -> Dict[str, Any]:
+        """
+        获取文件信息（异步版本）
+
+        Args:
+            file_id: 文件ID
+
+        Returns:
+            文件信息字典
+        """
+        return await self.async_file_repository.get_file_info(file_id)
+
     def get_session_files(self, session_id: str) -> List[Dict[str, Any]]:
         """
         获取会话中的所有文件
@@ -178,6 +317,52 @@ class FileService:
         """
         return self.file_repository.get_session_files(session_id)
 
+    async def get_session_file_urls(self, session_id: str) -> List[Dict[str, Any]]:
+        """
+        获取会话中所有文件的访问地址
+
+        OSS上的原文件、预览图和缩略图一次性批量签名，签名URL在有效期内复用，
+        加载带附件的历史记录时不需要逐个文件请求
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            文件列表，每项包含id、original_name、file_type、file_size以及签名后的
+            file_url、download_url、preview_url和thumbnail_url
+        """
+        files = await self.async_file_repository.get_session_files(session_id)
+        url_fields = ("file_url", "preview_url", "thumbnail_url")
+        signed = {}
+        if self.oss_service:
+            prefix = f"{self.oss_service.base_url}/"
+            names = [
+                file_info[field][len(prefix):]
+                for file_info in files for field in url_fields
+                if (file_info.get(field) or "").startswith(prefix)
+            ]
+            signed = await self.oss_service.get_file_urls(names)
+
+        def resolve(url: Optional[str]) -> Optional[str]:
+            if url and self.oss_service and url.startswith(prefix):
+                return signed.get(url[len(prefix):], url)
+            return url
+
+        results = []
+        for file_info in files:
+            file_url = resolve(file_info.get("file_url"))
+            results.append({
+                "id": file_info["id"],
+                "original_name": file_info.get("original_name"),
+                "file_type": file_info.get("file_type"),
+                "file_size": file_info.get("file_size"),
+                "file_url": file_url,
+                "download_url": file_url,
+                "preview_url": resolve(file_info.get("preview_url")),
+                "thumbnail_url": resolve(file_info.get("thumbnail_url"))
+            })
+        return results
+
     async def delete_file(self, file_id: str) -> bool:
         """
         删除文件
@@ -189,30 +374,20 @@ class FileService:
             是否删除成功
         """
         # 获取文件信息
-        file_info = self.get_file_info(file_id)
+        file_info = await self.get_file_info_async(file_id)
         if not file_info:
             return False
 
-        # 根据存储方式删除文件
-        if file_info.get("is_oss", False) and self.oss_service:
-            # 从OSS删除文件
-            stored_name = file_info.get("oss_file_info", {}).get("stored_name") or file_info["stored_name"]
-            try:
-                print(f"[DEBUG] 文件服务: 从OSS删除文件 {stored_name}")
-                deleted = await self.oss_service.delete_file(stored_name)
-                if not deleted:
-                    print(f"[ERROR] 文件服务: 从OSS删除文件失败")
-            except Exception as e:
-                print(f"[ERROR] 文件服务: 从OSS删除文件出错: {str(e)}")
-        else:
-            # 删除本地文件
-            try:
-                if os.path.exists(file_info["file_path"]):
-                    os.remove(file_info["file_path"])
-                else:
-                    print(f"[WARNING] 文件服务: 本地文件不存在 {file_info['file_path']}")
-            except Exception as e:
-                print(f"[ERROR] 文件服务: 删除本地文件失败: {str(e)}")
+        # 按内容去重存储的文件：先删除记录，再释放对内容的引用
+        if file_info.get("blob_id"):
+            deleted = await self.async_file_repository.delete_file_info(file_id)
+            if deleted:
+                await self._release_blob(file_info["blob_id"])
+            return deleted
+
+        # 早期未去重的文件直接删除存储对象
+        stored_name = file_info.get("oss_file_info", {}).get("stored_name") or file_info["stored_name"]
+        await self._remove_object({**file_info, "stored_name": stored_name})
 
         # 从数据库删除记录
-        return self.file_repository.delete_file_info(file_id)
+        return await self.async_file_repository.delete_file_info(file_id)
@@ -0,0 +1,252 @@
+"""
+孤儿文件回收模块
+分批查找所属会话已不存在的文件，批量删除文件记录、释放文件内容引用并删除存储对象
+"""
+
+import time
+import uuid
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from app.crud.blob_repository import AsyncBlobRepository
+from app.crud.chat_repository import AsyncChatRepository
+from app.crud.file_repository import AsyncFileRepository
+from app.services.storage_backends import backend_name
+from app.core.config import settings
+
+async def throttle(deleted: int, elapsed: float, max_per_second: float):
+    """
+    限制删除速率：本批删除用时不足deleted / max_per_second秒时等待到该时长
+
+    Args:
+        deleted: 本批删除的数量
+        elapsed: 本批已用时间（秒）
+        max_per_second: 每秒最多删除的数量，不大于0时不限速
+    """
+    if max_per_second > 0:
+        remaining = deleted / max_per_second - elapsed
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+
+class GCAlreadyRunningError(Exception):
+    """已有回收正在进行"""
+
+class OrphanFileCollector:
+    """
+    孤儿文件回收器
+
+    会话汇总中已删除或不存在、且没有消息的会话中的文件视为孤儿文件；
+    上传时间在宽限期内的文件不回收，避免删除刚上传、会话尚未产生消息的文件。
+
+    删除顺序为：认领文件记录 -> 删除文件记录 -> 释放文件内容引用 -> 删除引用归零的内容记录 -> 删除存储对象，
+    中途失败只会遗留多余的引用或存储对象，不会删除仍被引用的内容
+    """
+
+    def __init__(self, file_service: Any):
+        """
+        初始化回收器
+
+        Args:
+            file_service: 文件服务，提供各存储后端
+        """
+        self.file_service = file_service
+        self.async_file_repository = AsyncFileRepository()
+        self.async_blob_repository = AsyncBlobRepository()
+        self.async_chat_repository = AsyncChatRepository()
+        self.grace_period = timedelta(hours=settings.GC_GRACE_PERIOD_HOURS)
+        self.batch_size = settings.GC_BATCH_SIZE
+        self.max_deletes_per_second = settings.GC_MAX_DELETES_PER_SECOND
+        self.interval = settings.GC_INTERVAL_SECONDS
+        # 当前进行中的回收进度、最近一次回收结果和累计指标
+        self.current: Optional[Dict[str, Any]] = None
+        self.last_run: Optional[Dict[str, Any]] = None
+        self.totals = Counter()
+        self._running = False
+        self._task: Optional[asyncio.Task] = None
+        self._run_task: Optional[asyncio.Task] = None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        获取回收指标
+
+        Returns:
+            running、current（进行中的进度）、last_run（最近一次结果）和totals（累计值）
+        """
+        return {
+            "running": self._running,
+            "current": self.current,
+            "last_run": self.last_run,
+            "totals": dict(self.totals),
+            "interval_seconds": self.interval
+        }
+
+    async def _delete_objects(self, locations: List[Dict[str, Any]], progress: Dict[str, Any]):
+        """按存储后端分组批量删除存储对象"""
+        groups: Dict[str, List[str]] = {}
+        for location in locations:
+            groups.setdefault(backend_name(location), []).append(location["stored_name"])
+        for name, keys in groups.items():
+            storage = self.file_service.storage_backends.get(name)
+            if storage is None:
+                print(f"[ERROR] 孤儿文件回收: 未配置{name}存储，跳过 {len(keys)} 个存储对象")
+                progress["failed_objects"] += len(keys)
+                continue
+            deleted = await storage.delete_many(keys)
+            progress["deleted_objects"] += len(deleted)
+            progress["failed_objects"] += len(keys) - len(deleted)
+
+    async def delete_files(self, files: List[Dict[str, Any]], token: str, progress: Dict[str, Any]) -> int:
+        """
+        删除一批文件：认领并删除文件记录，释放文件内容引用，批量删除不再被引用的存储对象
+
+        Args:
+            files: 文件记录列表
+            token: 本轮删除的认领标记
+            progress: 进度字典，累加deleted_files、deleted_blobs、deleted_objects、failed_objects和freed_bytes
+
+        Returns:
+            本批删除的文件记录数
+        """
+        claimed = await self.async_file_repository.claim_files([f["id"] for f in files], token)
+        if not claimed:
+            return 0
+        # 只为本次实际删除的文件记录释放引用，避免与其他删除路径重复释放
+        deleted = await self.async_file_repository.delete_claimed_files(token)
+        progress["deleted_files"] += len(deleted)
+        release_counts = Counter(f["blob_id"] for f in deleted if f.get("blob_id"))
+        # 早期未去重的文件直接删除存储对象
+        locations = [
+            {**f, "stored_name": f.get("oss_file_info", {}).get("stored_name") or f["stored_name"]}
+            for f in deleted if not f.get("blob_id")
+        ]
+        progress["freed_bytes"] += sum(f.get("file_size") or 0 for f in locations)
+
+        await self.async_blob_repository.release_many(release_counts)
+        blobs = await self.async_blob_repository.claim_unreferenced(list(release_counts), token)
+        if blobs:
+            deleted_ids = set(await self.async_blob_repository.delete_claimed(token, [b["_id"] for b in blobs]))
+            for blob in blobs:
+                if blob["_id"] in deleted_ids:
+                    locations.append(blob)
+                    locations.extend(blob.get("renditions") or [])
+                    progress["freed_bytes"] += blob.get("size") or 0
+            progress["deleted_blobs"] += len(deleted_ids)
+        await self._delete_objects(locations, progress)
+        return len(deleted)
+
+    async def run(self, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        执行一轮回收
+
+        Args:
+            dry_run: 只统计孤儿文件，不删除
+
+        Returns:
+            本轮回收结果
+
+        Raises:
+            GCAlreadyRunningError: 本进程已有回收正在进行
+        """
+        if self._running:
+            raise GCAlreadyRunningError("孤儿文件回收正在进行")
+        self._running = True
+        token = uuid.uuid4().hex
+        cutoff = datetime.utcnow() - self.grace_period
+        progress = self.current = {
+            "dry_run": dry_run,
+            "started_at": datetime.utcnow(),
+            "cutoff": cutoff,
+            "batches": 0,
+            "scanned_files": 0,
+            "orphan_files": 0,
+            "orphan_bytes": 0,
+            "deleted_files": 0,
+            "deleted_blobs": 0,
+            "deleted_objects": 0,
+            "failed_objects": 0,
+            "freed_bytes": 0
+        }
+        start_time = time.monotonic()
+        try:
+            after = None
+            while True:
+                files = await self.async_file_repository.find_files_uploaded_before(cutoff, after, self.batch_size)
+                if not files:
+                    break
+                after = files[-1]["_id"]
+                live = await self.async_chat_repository.get_live_session_ids(list({f["session_id"] for f in files}))
+                orphans = [f for f in files if f["session_id"] not in live]
+                progress["batches"] += 1
+                progress["scanned_files"] += len(files)
+                progress["orphan_files"] += len(orphans)
+                progress["orphan_bytes"] += sum(f.get("file_size") or 0 for f in orphans)
+                if orphans and not dry_run:
+                    batch_start = time.monotonic()
+                    await self.delete_files(orphans, token, progress)
+                    await throttle(len(orphans), time.monotonic() - batch_start, self.max_deletes_per_second)
+            progress["status"] = "completed"
+        except Exception as e:
+            progress["status"] = "failed"
+            progress["error"] = str(e)
+            print(f"[ERROR] 孤儿文件回收失败: {str(e)}")
+            raise
+        finally:
+            progress["finished_at"] = datetime.utcnow()
+            progress["duration"] = round(time.monotonic() - start_time, 3)
+            self.last_run = progress
+            self.current = None
+            self._running = False
+            self.totals["runs"] += 1
+            if not dry_run:
+                for field in ("deleted_files", "deleted_blobs", "deleted_objects", "failed_objects", "freed_bytes"):
+                    self.totals[field] += progress[field]
+            print(f"[INFO] 孤儿文件回收{'（试运行）' if dry_run else ''}: 扫描 {progress['scanned_files']} 个文件，"
+                  f"孤儿文件 {progress['orphan_files']} 个，删除文件记录 {progress['deleted_files']} 个，"
+                  f"存储对象 {progress['deleted_objects']} 个，耗时 {progress['duration']}秒")
+        return progress
+
+    def start_run(self, dry_run: bool = False) -> bool:
+        """
+        在后台开始一轮回收，立即返回
+
+        Args:
+            dry_run: 只统计孤儿文件，不删除
+
+        Returns:
+            是否开始；已有回收正在进行时返回False
+        """
+        if self._running:
+            return False
+        self._run_task = asyncio.create_task(self.run(dry_run))
+        # 结果记录在last_run中，这里只取出异常避免未处理异常的警告
+        self._run_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return True
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run()
+            except GCAlreadyRunningError:
+                pass
+            except Exception as e:
+                print(f"[ERROR] 定期孤儿文件回收失败: {str(e)}")
+
+    def start(self):
+        """启动定期回收，GC_INTERVAL_SECONDS为0时不启动"""
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+            print(f"[INFO] 孤儿文件回收: 每 {self.interval} 秒回收一次")
+
+    async def stop(self):
+        """停止定期回收和进行中的回收"""
+        for task in (self._task, self._run_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._task = None
+        self._run_task = None
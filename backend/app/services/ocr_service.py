@@ -0,0 +1,149 @@
+"""
+OCR服务模块
+按页并行识别扫描版PDF和图片，页面结果按内容哈希缓存，并在每页完成时立即返回
+"""
+
+import asyncio
+from typing import Dict, Any, AsyncGenerator, Optional, Tuple
+from app.crud.ocr_page_repository import AsyncOCRPageRepository
+from app.utils.process_pool import get_process_pool
+from app.utils.temp_files import release_temp_file, retain_temp_file
+from app.utils.text_extraction import EXTRACTOR_VERSION, analyze_pages, ocr_page
+from app.core.config import settings
+
+class OCRService:
+    """OCR服务类"""
+
+    def __init__(self):
+        """初始化OCR服务"""
+        self.async_ocr_page_repository = AsyncOCRPageRepository()
+        # 正在识别的页面，同一页面同时只识别一次，其他调用方等待同一结果
+        self._inflight: Dict[Tuple[str, int, str], asyncio.Task] = {}
+
+    async def _recognize(self, file_path: str, file_name: str, sha256: Optional[str], page: int, lang: str) -> str:
+        """在进程池中识别单个页面，完成后写入缓存"""
+        loop = asyncio.get_running_loop()
+        text = await loop.run_in_executor(
+            get_process_pool(), ocr_page, file_path, file_name, page, lang, settings.OCR_DPI
+        )
+        if sha256:
+            try:
+                await self.async_ocr_page_repository.save_page(sha256, page, lang, text, EXTRACTOR_VERSION)
+            except Exception as e:
+                print(f"[ERROR] OCR服务: 缓存第 {page + 1} 页识别结果失败: {str(e)}")
+        return text
+
+    def _start(self, file_path: str, file_name: str, sha256: Optional[str], page: int, lang: str) -> asyncio.Task:
+        """
+        启动页面的识别任务
+
+        任务会在调用方退出后继续执行，运行期间持有临时文件的引用，
+        调用方退出时不会删除任务仍在读取的临时副本
+        """
+        task = asyncio.ensure_future(self._recognize(file_path, file_name, sha256, page, lang))
+        if retain_temp_file(file_path):
+            task.add_done_callback(lambda _: release_temp_file(file_path))
+        return task
+
+    def _recognize_once(self, file_path: str, file_name: str, sha256: Optional[str], page: int, lang: str) -> asyncio.Task:
+        """获取页面的识别任务，已有相同页面在识别时复用该任务"""
+        if not sha256:
+            return self._start(file_path, file_name, sha256, page, lang)
+        key = (sha256, page, lang)
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._start(file_path, file_name, sha256, page, lang)
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # 所有调用方都已退出时仍要取出异常，避免未处理异常的警告
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def iter_pages(
+        self,
+        file_path: str,
+        file_name: str,
+        sha256: Optional[str] = None,
+        lang: Optional[str] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        按页识别文件文本，每页完成时立即返回
+
+        有文本层的页面直接使用文本层，扫描页先查缓存，未缓存的页面在进程池中并行识别，
+        返回顺序为完成顺序而不是页码顺序
+
+        Args:
+            file_path: 本地文件路径
+            file_name: 原始文件名，用于判断文件类型
+            sha256: 内容哈希，为None时不使用缓存
+            lang: OCR语言，为None时使用配置
+
+        Yields:
+            页面结果，包含page（从0开始）、total、text和source（text_layer/cache/ocr）
+        """
+        lang = lang or settings.OCR_LANG
+        loop = asyncio.get_running_loop()
+        layers = await loop.run_in_executor(
+            get_process_pool(), analyze_pages, file_path, file_name, settings.OCR_MIN_TEXT_CHARS
+        )
+        total = len(layers)
+
+        scanned = []
+        for page, text in enumerate(layers):
+            if text is None:
+                scanned.append(page)
+            else:
+                yield {"page": page, "total": total, "text": text, "source": "text_layer"}
+
+        cached = {}
+        if sha256 and scanned:
+            try:
+                cached = await self.async_ocr_page_repository.get_pages(sha256, scanned, lang, EXTRACTOR_VERSION)
+            except Exception as e:
+                print(f"[ERROR] OCR服务: 读取OCR缓存失败: {str(e)}")
+        for page in scanned:
+            if page in cached:
+                yield {"page": page, "total": total, "text": cached[page], "source": "cache"}
+
+        pending = [page for page in scanned if page not in cached]
+        if not pending:
+            return
+        print(f"[DEBUG] OCR服务: 文件 {file_name} 共 {total} 页，需要识别 {len(pending)} 页")
+
+        async def wait_page(page: int) -> Tuple[int, str]:
+            # 调用方提前退出时只取消等待，识别任务继续执行并写入缓存，临时文件在任务结束后才删除
+            task = self._recognize_once(file_path, file_name, sha256, page, lang)
+            return page, await asyncio.shield(task)
+
+        waiters = [asyncio.ensure_future(wait_page(page)) for page in pending]
+        try:
+            for finished in asyncio.as_completed(waiters):
+                page, text = await finished
+                yield {"page": page, "total": total, "text": text, "source": "ocr"}
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    async def recognize(
+        self,
+        file_path: str,
+        file_name: str,
+        sha256: Optional[str] = None,
+        lang: Optional[str] = None
+    ) -> str:
+        """
+        识别文件全部页面，按页码顺序拼接文本
+
+        Args:
+            file_path: 本地文件路径
+            file_name: 原始文件名
+            sha256: 内容哈希，为None时不使用缓存
+            lang: OCR语言，为None时使用配置
+
+        Returns:
+            全部页面的文本
+        """
+        pages = {}
+        async for result in self.iter_pages(file_path, file_name, sha256, lang):
+            pages[result["page"]] = result["text"]
+        return "\n".join(pages[page] for page in sorted(pages))
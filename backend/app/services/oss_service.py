@@ -3,29 +3,149 @@
 负责处理阿里云对象存储的相关操作
 """
 
+import io
 import os
 import uuid
-from typing import Dict, Any, Optional
+import asyncio
+import functools
+import hashlib
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Dict, Any, Optional, AsyncIterator, Callable, List
 from datetime import datetime
 import oss2
+from cachetools import TTLCache
 from oss2.exceptions import ClientError, ServerError
+from app.utils.disk_cache import DiskCache
 from app.core.config import settings
 
+# OSS调用专用线程池，oss2是阻塞客户端，所有网络调用都在这里执行，避免阻塞事件循环
+oss_executor = ThreadPoolExecutor(
+    max_workers=settings.OSS_MAX_WORKERS,
+    thread_name_prefix="oss"
+)
+
+class InMemoryBucket:
+    """
+    进程内的OSS Bucket替身
+
+    实现OSSService用到的oss2.Bucket方法子集，行为与OSS一致，
+    用于本地开发和测试，无需连接真实的OSS
+    """
+
+    def __init__(self, base_url: str = "memory://bucket"):
+        """初始化进程内Bucket"""
+        self.base_url = base_url
+        self.objects: Dict[str, bytes] = {}
+        self.uploads: Dict[str, Dict[int, bytes]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _etag(data: bytes) -> str:
+        return hashlib.md5(data).hexdigest().upper()
+
+    def get_bucket_info(self):
+        return SimpleNamespace(name="memory")
+
+    def put_object(self, key: str, data: bytes):
+        with self._lock:
+            self.objects[key] = bytes(data)
+        return SimpleNamespace(etag=self._etag(data))
+
+    def get_object(self, key: str):
+        with self._lock:
+            if key not in self.objects:
+                raise oss2.exceptions.NoSuchKey(404, {}, b"", {})
+            data = self.objects[key]
+        return SimpleNamespace(read=io.BytesIO(data).read, content_length=len(data))
+
+    def get_object_to_file(self, key: str, filename: str):
+        data = self.get_object(key).read()
+        with open(filename, "wb") as f:
+            f.write(data)
+        return SimpleNamespace(content_length=len(data))
+
+    def init_multipart_upload(self, key: str):
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self.uploads[upload_id] = {}
+        return SimpleNamespace(upload_id=upload_id)
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, data: bytes):
+        with self._lock:
+            self.uploads[upload_id][part_number] = bytes(data)
+        return SimpleNamespace(etag=self._etag(data))
+
+    def complete_multipart_upload(self, key: str, upload_id: str, parts: List[Any]):
+        with self._lock:
+            uploaded = self.uploads.pop(upload_id)
+            self.objects[key] = b"".join(uploaded[part.part_number] for part in parts)
+        return SimpleNamespace(etag=self._etag(self.objects[key]))
+
+    def abort_multipart_upload(self, key: str, upload_id: str):
+        with self._lock:
+            self.uploads.pop(upload_id, None)
+
+    def delete_object(self, key: str):
+        with self._lock:
+            self.objects.pop(key, None)
+
+    def batch_delete_objects(self, keys: List[str]):
+        with self._lock:
+            for key in keys:
+                self.objects.pop(key, None)
+        return SimpleNamespace(deleted_keys=list(keys))
+
+    def sign_url(self, method: str, key: str, expires: int, **kwargs) -> str:
+        return f"{self.base_url}/{key}?Expires={expires}"
+
 class OSSService:
     """阿里云OSS服务类"""
 
-    def __init__(self):
-        """初始化OSS服务"""
+    def __init__(self, bucket: Optional[Any] = None, executor: Optional[Executor] = None,
+                 cache: Optional[DiskCache] = None):
+        """
+        初始化OSS服务
+
+        Args:
+            bucket: 可选的Bucket实例，用于注入InMemoryBucket等替身；为None时按配置连接OSS
+            executor: 执行OSS调用的线程池，为None时使用oss_executor
+            cache: 下载文件使用的本地磁盘缓存，为None时按OSS_CACHE_DIR配置创建，未配置时不缓存
+        """
         # 从环境变量获取配置
         self.access_key_id = settings.OSS_ACCESS_KEY_ID
         self.access_key_secret = settings.OSS_ACCESS_KEY_SECRET
         self.endpoint = settings.OSS_ENDPOINT
         self.bucket_name = settings.OSS_BUCKET_NAME
         self.base_url = settings.OSS_BASE_URL
+        self.executor = executor or oss_executor
+        self.multipart_threshold = settings.OSS_MULTIPART_THRESHOLD
+        self.part_size = settings.UPLOAD_BUFFER_SIZE
+        self.multipart_parallelism = settings.OSS_MULTIPART_PARALLELISM
+        # OSS的批量删除接口每次最多1000个文件
+        self.batch_delete_size = min(max(settings.OSS_BATCH_DELETE_SIZE, 1), 1000)
+        # 读取对象的本地磁盘缓存，存储名唯一且内容不变，按存储名缓存；同一主机的工作进程共享
+        self.cache = cache
+        if self.cache is None and settings.OSS_CACHE_DIR:
+            self.cache = DiskCache(settings.OSS_CACHE_DIR, settings.OSS_CACHE_MAX_BYTES)
+        # 签名URL缓存，键为(对象名, 方法, 有效期, 时间段)，时间段结束后自然过期
+        self.url_expires = settings.OSS_SIGNED_URL_EXPIRES
+        self.url_refresh = settings.OSS_SIGNED_URL_REFRESH
+        self._url_cache = TTLCache(maxsize=settings.OSS_SIGNED_URL_CACHE_SIZE, ttl=self.url_refresh)
+        # TTLCache不是线程安全的，同步方法可能在线程池中调用
+        self._url_lock = threading.Lock()
 
-        # 创建OSS Bucket实例
-        self.auth = oss2.Auth(self.access_key_id, self.access_key_secret)
-        self.bucket = oss2.Bucket(self.auth, self.endpoint, self.bucket_name)
+        if bucket is not None:
+            self.bucket = bucket
+            self.base_url = getattr(bucket, "base_url", self.base_url)
+        else:
+            # 创建OSS Bucket实例，所有请求共用一个带连接池的Session，复用HTTP连接
+            # endpoint可以指向本地的OSS兼容服务
+            self.auth = oss2.Auth(self.access_key_id, self.access_key_secret)
+            self.session = oss2.Session(pool_size=settings.OSS_CONNECTION_POOL_SIZE)
+            self.bucket = oss2.Bucket(self.auth, self.endpoint, self.bucket_name, session=self.session)
 
         # 确保Bucket存在
         self._ensure_bucket_exists()
@@ -42,10 +162,82 @@ class OSSService:
                 print(f"[ERROR] 创建OSS Bucket失败: {str(e)}")
                 raise Exception(f"创建OSS Bucket失败: {str(e)}")
 
+    async def _run(self, func: Callable, *args, **kwargs) -> Any:
+        """在OSS线程池中执行阻塞的oss2调用"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    @staticmethod
+    def _unique_name(file_name: str) -> str:
+        """生成唯一的存储文件名"""
+        file_ext = os.path.splitext(file_name)[1]
+        return f"{uuid.uuid4()}{file_ext}"
+
+    def _build_result(self, stored_name: str, file_size: int, result: Any) -> Dict[str, Any]:
+        """构建上传结果信息"""
+        return {
+            "stored_name": stored_name,
+            "file_url": f"{self.base_url}/{stored_name}",
+            "file_size": file_size,
+            "last_modified": datetime.utcnow(),
+            "etag": (getattr(result, "etag", "") or "").strip('"')
+        }
+
+    async def _upload_parts(self, key: str, parts_source: AsyncIterator[bytes]) -> Any:
+        """
+        并行分片上传
+
+        同时上传的分片数不超过multipart_parallelism，未上传的分片会等待，
+        因此内存中最多保留multipart_parallelism个分片；任一分片失败时中止整个上传
+
+        Args:
+            key: 存储文件名
+            parts_source: 按顺序产生每个分片数据的异步迭代器
+
+        Returns:
+            完成分片上传的结果
+        """
+        upload_id = (await self._run(self.bucket.init_multipart_upload, key)).upload_id
+        semaphore = asyncio.Semaphore(self.multipart_parallelism)
+        tasks = []
+
+        async def upload_part(part_number: int, data: bytes) -> Any:
+            try:
+                result = await self._run(self.bucket.upload_part, key, upload_id, part_number, data)
+                return oss2.models.PartInfo(part_number, result.etag, size=len(data))
+            finally:
+                semaphore.release()
+
+        try:
+            part_number = 0
+            async for data in parts_source:
+                await semaphore.acquire()
+                # 先检查已完成的分片是否失败，尽早中止
+                for task in tasks:
+                    if task.done() and task.exception() is not None:
+                        semaphore.release()
+                        raise task.exception()
+                part_number += 1
+                tasks.append(asyncio.ensure_future(upload_part(part_number, data)))
+            parts = await asyncio.gather(*tasks)
+            return await self._run(self.bucket.complete_multipart_upload, key, upload_id, list(parts))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # 中止未完成的分片上传，避免残留分片占用存储
+            try:
+                await self._run(self.bucket.abort_multipart_upload, key, upload_id)
+            except Exception as abort_error:
+                print(f"[ERROR] OSS服务: 中止分片上传失败: {str(abort_error)}")
+            raise
+
     async def upload_file(self, file_content: bytes, file_name: str) -> Dict[str, Any]:
         """
         上传文件到阿里云OSS
 
+        文件大小超过multipart_threshold时使用并行分片上传
+
         Args:
             file_content: 文件内容
             file_name: 文件名
@@ -55,29 +247,21 @@ class OSSService:
         """
         try:
             # 生成唯一文件名
-            file_ext = os.path.splitext(file_name)[1]
-            unique_filename = f"{uuid.uuid4()}{file_ext}"
+            unique_filename = self._unique_name(file_name)
 
             # 上传文件到OSS
             print(f"[DEBUG] OSS服务: 上传文件 {file_name} 到OSS，存储文件名: {unique_filename}")
-            self.bucket.put_object(unique_filename, file_content)
-            result = None
-
-            # 构建文件访问URL
-            file_url = f"{self.base_url}/{unique_filename}"
-
-            print(f"[DEBUG] OSS服务: 文件上传成功，URL: {file_url}")
-            
-            # 获取文件大小
-            file_size = len(file_content)
-            
-            return {
-                "stored_name": unique_filename,
-                "file_url": file_url,
-                "file_size": file_size,
-                "last_modified": datetime.utcnow(),
-                "etag": ""  # OSS返回的ETag可能需要特殊处理
-            }
+            if len(file_content) >= self.multipart_threshold:
+                async def slices():
+                    for offset in range(0, len(file_content), self.part_size):
+                        yield file_content[offset:offset + self.part_size]
+                result = await self._upload_parts(unique_filename, slices())
+            else:
+                result = await self._run(self.bucket.put_object, unique_filename, file_content)
+
+            file_info = self._build_result(unique_filename, len(file_content), result)
+            print(f"[DEBUG] OSS服务: 文件上传成功，URL: {file_info['file_url']}")
+            return file_info
         except (ClientError, ServerError) as e:
             print(f"[ERROR] OSS服务: 文件上传失败: {str(e)}")
             raise Exception(f"文件上传到OSS失败: {str(e)}")
@@ -85,6 +269,166 @@ class OSSService:
             print(f"[ERROR] OSS服务: 未知错误: {str(e)}")
             raise Exception(f"文件上传到OSS失败: {str(e)}")
 
+    async def upload_local_file(self, file_path: str, file_name: str, object_name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        上传本地文件到阿里云OSS
+
+        分片在线程池中按需读取，文件大小超过multipart_threshold时使用并行分片上传
+
+        Args:
+            file_path: 本地文件路径
+            file_name: 原始文件名
+            object_name: 存储文件名，为None时生成唯一文件名
+
+        Returns:
+            上传结果信息
+        """
+        unique_filename = object_name or self._unique_name(file_name)
+        file_size = os.path.getsize(file_path)
+        try:
+            print(f"[DEBUG] OSS服务: 上传本地文件 {file_path} 到OSS，存储文件名: {unique_filename}")
+            with open(file_path, "rb") as source:
+                if file_size >= self.multipart_threshold:
+                    async def parts():
+                        while True:
+                            data = await self._run(source.read, self.part_size)
+                            if not data:
+                                return
+                            yield data
+                    result = await self._upload_parts(unique_filename, parts())
+                else:
+                    data = await self._run(source.read)
+                    result = await self._run(self.bucket.put_object, unique_filename, data)
+            await self._cache_upload(unique_filename, file_path)
+            return self._build_result(unique_filename, file_size, result)
+        except (ClientError, ServerError) as e:
+            print(f"[ERROR] OSS服务: 文件上传失败: {str(e)}")
+            raise Exception(f"文件上传到OSS失败: {str(e)}")
+
+    async def upload_stream(self, chunks: AsyncIterator[bytes], file_name: str, part_size: int) -> Dict[str, Any]:
+        """
+        以流的方式上传文件到阿里云OSS
+
+        与upload_local_file相同，文件大小达到multipart_threshold时使用并行分片上传，边读取边上传，
+        内存中最多保留multipart_parallelism + 1个分片；否则读完后使用普通上传。
+        判断前最多缓冲max(multipart_threshold, part_size)字节
+
+        Args:
+            chunks: 文件内容的异步数据块迭代器
+            file_name: 文件名
+            part_size: 分片大小（字节），OSS要求除最后一个分片外不小于100KB
+
+        Returns:
+            上传结果信息
+        """
+        unique_filename = self._unique_name(file_name)
+        state = {"size": 0, "first": b"", "exhausted": False}
+        iterator = chunks.__aiter__()
+
+        async def fill(buffer: bytearray, target: int = part_size) -> bytearray:
+            """从上游读取数据直到缓冲区达到target字节（默认一个分片）或读完"""
+            while len(buffer) < target and not state["exhausted"]:
+                try:
+                    chunk = await iterator.__anext__()
+                except StopAsyncIteration:
+                    state["exhausted"] = True
+                    break
+                buffer.extend(chunk)
+                state["size"] += len(chunk)
+            return buffer
+
+        async def parts():
+            buffer = bytearray(state["first"])
+            while True:
+                buffer = await fill(buffer)
+                if len(buffer) > part_size:
+                    yield bytes(buffer[:part_size])
+                    del buffer[:part_size]
+                elif buffer:
+                    yield bytes(buffer)
+                    buffer = bytearray()
+                if state["exhausted"] and not buffer:
+                    return
+
+        try:
+            print(f"[DEBUG] OSS服务: 流式上传文件 {file_name} 到OSS，存储文件名: {unique_filename}")
+            first = await fill(bytearray(), max(self.multipart_threshold, part_size))
+            if state["exhausted"] and len(first) < self.multipart_threshold:
+                # 文件小于分片上传阈值，直接上传
+                result = await self._run(self.bucket.put_object, unique_filename, bytes(first))
+            else:
+                state["first"] = bytes(first)
+                result = await self._upload_parts(unique_filename, parts())
+
+            file_info = self._build_result(unique_filename, state["size"], result)
+            print(f"[DEBUG] OSS服务: 文件流式上传成功，URL: {file_info['file_url']}")
+            return file_info
+        except (ClientError, ServerError) as e:
+            print(f"[ERROR] OSS服务: 文件流式上传失败: {str(e)}")
+            raise Exception(f"文件上传到OSS失败: {str(e)}")
+
+    async def _cache_upload(self, file_name: str, file_path: str):
+        """上传后把本地文件放入磁盘缓存，刚上传的文件通常马上会被提取文本和生成预览图"""
+        if self.cache is None:
+            return
+        try:
+            await self._run(self.cache.put_file, file_name, file_path)
+        except Exception as e:
+            print(f"[WARNING] OSS服务: 写入本地缓存失败: {str(e)}")
+
+    async def download_file(self, file_name: str, file_path: str):
+        """
+        下载OSS文件到本地
+
+        配置了磁盘缓存时先读本地缓存，未命中时下载并写入缓存；
+        本地文件可能是缓存文件的硬链接，只能读取和删除，不能原地修改
+
+        Args:
+            file_name: 存储文件名
+            file_path: 本地文件路径
+        """
+        try:
+            if self.cache is None:
+                await self._run(self.bucket.get_object_to_file, file_name, file_path)
+                return
+            loader = functools.partial(self.bucket.get_object_to_file, file_name)
+            if await self._run(self.cache.get_or_load, file_name, file_path, loader):
+                print(f"[DEBUG] OSS服务: 文件 {file_name} 命中本地缓存")
+        except (ClientError, ServerError) as e:
+            print(f"[ERROR] OSS服务: 下载文件失败: {str(e)}")
+            raise Exception(f"从OSS下载文件失败: {str(e)}")
+
+    async def iter_object(self, file_name: str, chunk_size: int) -> AsyncIterator[bytes]:
+        """
+        按块流式读取OSS文件，已在本地缓存的文件直接读取缓存
+
+        Args:
+            file_name: 存储文件名
+            chunk_size: 每块的大小
+
+        Yields:
+            文件内容块
+        """
+        cached_path = self.cache.path_for(file_name) if self.cache is not None else None
+        try:
+            source = open(cached_path, "rb") if cached_path else None
+        except FileNotFoundError:
+            source = None
+        try:
+            if source is None:
+                source = await self._run(self.bucket.get_object, file_name)
+            while True:
+                chunk = await self._run(source.read, chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+        except (ClientError, ServerError) as e:
+            print(f"[ERROR] OSS服务: 读取文件失败: {str(e)}")
+            raise Exception(f"从OSS读取文件失败: {str(e)}")
+        finally:
+            if source is not None and hasattr(source, "close"):
+                source.close()
+
     async def delete_file(self, file_name: str) -> bool:
         """
         从阿里云OSS删除文件
@@ -96,7 +440,9 @@ class OSSService:
             是否删除成功
         """
         try:
-            self.bucket.delete_object(file_name)
+            await self._run(self.bucket.delete_object, file_name)
+            if self.cache is not None:
+                await self._run(self.cache.discard, file_name)
             return True
         except (ClientError, ServerError) as e:
             print(f"[ERROR] OSS服务: 删除文件失败: {str(e)}")
@@ -105,20 +451,97 @@ class OSSService:
             print(f"[ERROR] OSS服务: 删除文件未知错误: {str(e)}")
             return False
 
-    async def get_file_url(self, file_name: str) -> str:
+    async def delete_files(self, file_names: List[str]) -> List[str]:
         """
-        获取文件的访问URL
+        批量删除OSS文件，每次请求最多删除OSS_BATCH_DELETE_SIZE（不超过1000）个文件
 
         Args:
-            file_name: 文件名
+            file_names: 文件名列表
 
         Returns:
-            文件访问URL
+            删除成功的文件名列表
         """
-        try:
-            # 生成签名URL，有效期1小时
-            url = self.bucket.sign_url('GET', file_name, 3600)
+        deleted = []
+        for offset in range(0, len(file_names), self.batch_delete_size):
+            batch = file_names[offset:offset + self.batch_delete_size]
+            try:
+                result = await self._run(self.bucket.batch_delete_objects, batch)
+                deleted.extend(result.deleted_keys)
+            except (ClientError, ServerError) as e:
+                print(f"[ERROR] OSS服务: 批量删除 {len(batch)} 个文件失败: {str(e)}")
+        if self.cache is not None:
+            for file_name in deleted:
+                await self._run(self.cache.discard, file_name)
+        return deleted
+
+    def sign_url(self, file_name: str, method: str = "GET", expires: Optional[int] = None) -> str:
+        """
+        生成签名URL，同一时间段内的相同请求复用缓存的URL
+
+        时间按OSS_SIGNED_URL_REFRESH划分为时间段，同一时间段内签出的URL都在
+        时间段结束后再过expires秒失效，因此URL内容在时间段内不变，
+        客户端和浏览器缓存也可以命中；签名只在本地计算，不访问网络
+
+        Args:
+            file_name: 存储文件名
+            method: HTTP方法
+            expires: 有效期（秒），为None时使用配置
+
+        Returns:
+            签名URL，签名失败时返回不带签名的URL
+        """
+        expires = expires or self.url_expires
+        now = int(time.time())
+        period = now // self.url_refresh
+        key = (file_name, method, expires, period)
+        with self._url_lock:
+            url = self._url_cache.get(key)
+        if url is not None:
             return url
+        try:
+            expires_at = (period + 1) * self.url_refresh + expires
+            url = self.bucket.sign_url(method, file_name, expires_at - now)
         except Exception as e:
             print(f"[ERROR] OSS服务: 获取文件URL失败: {str(e)}")
             return f"{self.base_url}/{file_name}"
+        with self._url_lock:
+            self._url_cache[key] = url
+        return url
+
+    def sign_urls(self, file_names: List[str], method: str = "GET", expires: Optional[int] = None) -> Dict[str, str]:
+        """
+        批量生成签名URL
+
+        Args:
+            file_names: 存储文件名列表
+            method: HTTP方法
+            expires: 有效期（秒），为None时使用配置
+
+        Returns:
+            存储文件名到签名URL的映射
+        """
+        return {file_name: self.sign_url(file_name, method, expires) for file_name in dict.fromkeys(file_names)}
+
+    async def get_file_url(self, file_name: str) -> str:
+        """
+        获取文件的访问URL
+
+        Args:
+            file_name: 文件名
+
+        Returns:
+            文件访问URL
+        """
+        return self.sign_url(file_name)
+
+    async def get_file_urls(self, file_names: List[str]) -> Dict[str, str]:
+        """
+        批量获取文件的访问URL
+
+        Args:
+            file_names: 文件名列表
+
+        Returns:
+            文件名到访问URL的映射
+        """
+        return self.sign_urls(file_names)
@@ -0,0 +1,202 @@
+"""
+会话清理模块
+删除会话时只标记墓碑，由后台分批删除会话中的消息、文件记录和存储对象
+"""
+
+import time
+import uuid
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from app.crud.chat_repository import AsyncChatRepository
+from app.crud.file_repository import AsyncFileRepository
+from app.services.gc_service import OrphanFileCollector, throttle
+from app.core.config import settings
+
+class SessionPurger:
+    """
+    已删除会话的后台清理器
+
+    会话被删除时汇总文档的purge_status标记为pending，读取时按cleared_at隐藏消息；
+    清理器认领等待清理的会话（带租约，多个工作进程不会同时清理同一个会话），
+    分批删除cleared_at之前的消息和上传的文件，每批按PURGE_MAX_DELETES_PER_SECOND限速，
+    进度记录在会话汇总文档中
+    """
+
+    def __init__(self, file_collector: OrphanFileCollector):
+        """
+        初始化清理器
+
+        Args:
+            file_collector: 孤儿文件回收器，用于删除文件记录、释放文件内容引用和删除存储对象
+        """
+        self.file_collector = file_collector
+        self.async_chat_repository = AsyncChatRepository()
+        self.async_file_repository = AsyncFileRepository()
+        self.batch_size = settings.PURGE_BATCH_SIZE
+        self.max_deletes_per_second = settings.PURGE_MAX_DELETES_PER_SECOND
+        self.poll_interval = settings.PURGE_POLL_SECONDS
+        self.lease = timedelta(seconds=settings.PURGE_LEASE_SECONDS)
+        # 当前正在清理的会话进度和累计指标
+        self.current: Optional[Dict[str, Any]] = None
+        self.totals = Counter()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        获取清理指标
+
+        Returns:
+            running、current（正在清理的会话进度）和totals（累计值）
+        """
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "current": self.current,
+            "totals": dict(self.totals)
+        }
+
+    async def get_status(self, session_id: str, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        获取会话的清理进度
+
+        Args:
+            session_id: 会话ID
+            user_id: 可选的用户ID
+
+        Returns:
+            每个用户的会话清理进度
+        """
+        return await self.async_chat_repository.get_session_purge_status(session_id, user_id)
+
+    def notify(self):
+        """通知清理器有新删除的会话，可以在请求线程中调用"""
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _purge_messages(self, session: Dict[str, Any], progress: Dict[str, Any]) -> bool:
+        """分批删除会话清空时间之前的消息，会话不再由本次清理负责时返回False"""
+        while True:
+            batch_start = time.monotonic()
+            deleted = await self.async_chat_repository.delete_cleared_messages(session, self.batch_size)
+            if not deleted:
+                return True
+            progress["deleted_messages"] += deleted
+            if not await self.async_chat_repository.update_session_purge(session, self.lease, messages=deleted):
+                return False
+            await throttle(deleted, time.monotonic() - batch_start, self.max_deletes_per_second)
+
+    async def _purge_files(self, session: Dict[str, Any], progress: Dict[str, Any]) -> bool:
+        """分批删除会话清空时间之前上传的文件，会话不再由本次清理负责时返回False"""
+        token = uuid.uuid4().hex
+        while True:
+            batch_start = time.monotonic()
+            files = await self.async_file_repository.find_session_files_before(
+                session["session_id"], session["user_id"], session["cleared_at"], self.batch_size
+            )
+            if not files:
+                return True
+            deleted = await self.file_collector.delete_files(files, token, progress)
+            if not await self.async_chat_repository.update_session_purge(session, self.lease, files=deleted):
+                return False
+            await throttle(len(files), time.monotonic() - batch_start, self.max_deletes_per_second)
+
+    async def purge_session(self, session: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        清理一个已认领的会话
+
+        Args:
+            session: claim_session_purge认领的会话汇总文档
+
+        Returns:
+            本次清理的进度
+        """
+        progress = self.current = {
+            "session_id": session["session_id"],
+            "user_id": session.get("user_id"),
+            "cleared_at": session["cleared_at"],
+            "started_at": datetime.utcnow(),
+            "deleted_messages": 0,
+            "deleted_files": 0,
+            "deleted_blobs": 0,
+            "deleted_objects": 0,
+            "failed_objects": 0,
+            "freed_bytes": 0
+        }
+        start_time = time.monotonic()
+        try:
+            finished = (await self._purge_messages(session, progress)
+                        and await self._purge_files(session, progress)
+                        and await self.async_chat_repository.update_session_purge(session, self.lease, done=True))
+            # 清理期间会话再次被删除时，由新的墓碑重新安排清理
+            progress["status"] = "done" if finished else "superseded"
+        finally:
+            progress["duration"] = round(time.monotonic() - start_time, 3)
+            self.current = None
+            for field in ("deleted_messages", "deleted_files", "deleted_blobs", "deleted_objects",
+                          "failed_objects", "freed_bytes"):
+                self.totals[field] += progress[field]
+        self.totals["sessions"] += 1
+        print(f"[INFO] 会话清理: {session['session_id']} 删除消息 {progress['deleted_messages']} 条，"
+              f"文件 {progress['deleted_files']} 个，存储对象 {progress['deleted_objects']} 个，耗时 {progress['duration']}秒")
+        return progress
+
+    async def run_pending(self) -> int:
+        """
+        清理所有等待清理的会话
+
+        Returns:
+            本次清理的会话数
+        """
+        count = 0
+        while True:
+            session = await self.async_chat_repository.claim_session_purge(self.lease)
+            if session is None:
+                return count
+            try:
+                await self.purge_session(session)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 租约过期后由下一次轮询重试
+                self.totals["failed_sessions"] += 1
+                print(f"[ERROR] 会话清理失败: {session['session_id']}: {str(e)}")
+                return count
+            count += 1
+
+    async def _run_loop(self):
+        while True:
+            self._wake.clear()
+            try:
+                await self.run_pending()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[ERROR] 会话清理失败: {str(e)}")
+            try:
+                # 收到删除通知时立即清理，否则定期检查其他进程遗留或租约过期的会话
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        """启动后台清理"""
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run_loop())
+            print(f"[INFO] 会话清理: 已启动，每批 {self.batch_size} 条，每秒最多删除 {self.max_deletes_per_second} 条")
+
+    async def stop(self):
+        """停止后台清理，未完成的会话在租约过期后继续清理"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._task = None
+        self._loop = None
+        self._wake = None
@@ -0,0 +1,240 @@
+"""
+预览图服务模块
+在后台进程池中为图片和PDF生成缩略图和预览图，与原文件存放在一起，并把地址记录到文件信息中
+"""
+
+import os
+import asyncio
+import tempfile
+import time
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+from app.crud.blob_repository import AsyncBlobRepository
+from app.crud.file_repository import AsyncFileRepository
+from app.services.extraction_service import local_file_copy
+from app.utils.process_pool import get_process_pool
+from app.utils.renditions import RENDITION_VERSION, has_renditions, render_renditions
+from app.core.config import settings
+
+# 预览图生成状态
+RENDITION_PENDING = "pending"
+RENDITION_PROCESSING = "processing"
+RENDITION_READY = "ready"
+RENDITION_FAILED = "failed"
+
+def initial_rendition_status(file_name: str) -> Optional[str]:
+    """根据文件类型得到新文件的预览图状态，不生成预览图的文件为None"""
+    return RENDITION_PENDING if has_renditions(file_name) else None
+
+def rendition_fields(renditions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    把预览图列表转换为文件信息中的字段
+
+    Args:
+        renditions: 文件内容记录中的预览图列表
+
+    Returns:
+        包含renditions、thumbnail_url、preview_url和rendition_status的字段，
+        renditions按种类分组，如{"thumbnail": {"width": 256, "height": 192, "webp": url, "jpg": url}}
+    """
+    grouped: Dict[str, Dict[str, Any]] = {}
+    for rendition in renditions:
+        entry = grouped.setdefault(rendition["kind"], {"width": rendition["width"], "height": rendition["height"]})
+        entry[rendition["format"]] = rendition["file_url"]
+    fields: Dict[str, Any] = {"renditions": grouped, "rendition_status": RENDITION_READY}
+    if "thumbnail" in grouped:
+        fields["thumbnail_url"] = grouped["thumbnail"].get("webp")
+    if "preview" in grouped:
+        fields["preview_url"] = grouped["preview"].get("webp")
+    return fields
+
+class RenditionService:
+    """预览图服务类"""
+
+    def __init__(self, storage_backends: Optional[Dict[str, Any]] = None, store_object: Optional[Any] = None,
+                 remove_object: Optional[Any] = None):
+        """
+        初始化预览图服务
+
+        Args:
+            storage_backends: 后端名称到存储后端的映射，用于读取原文件
+            store_object: 存储预览图的协程函数，参数为(本地路径, 存储名, 原文件名)，返回存储位置信息
+            remove_object: 删除存储对象的协程函数，参数为存储位置信息
+        """
+        self.storage_backends = storage_backends or {}
+        self.store_object = store_object
+        self.remove_object = remove_object
+        self.async_file_repository = AsyncFileRepository()
+        self.async_blob_repository = AsyncBlobRepository()
+        self.upload_dir = settings.STORAGE_LOCAL_DIR
+        self.lease = timedelta(seconds=settings.RENDITION_LEASE_SECONDS)
+        self.sizes = {
+            "thumbnail": settings.RENDITION_THUMBNAIL_SIZE,
+            "preview": settings.RENDITION_PREVIEW_SIZE
+        }
+        # 持有后台任务的引用，避免任务在完成前被回收
+        self._tasks = set()
+
+    def schedule(self, file_info: Dict[str, Any], claimed: bool = False):
+        """
+        在后台生成文件的预览图，立即返回
+
+        Args:
+            file_info: 已保存到数据库的文件信息
+            claimed: 文件是否已由claim_processing认领
+        """
+        task = asyncio.create_task(self.generate(file_info, claimed))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def get_cached(self, sha256: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        获取相同内容已生成的预览图
+
+        Args:
+            sha256: 内容哈希
+
+        Returns:
+            预览图列表，尚未生成或版本过旧时返回None
+        """
+        blob = await self.async_blob_repository.get_blob(sha256)
+        if blob and blob.get("renditions_version") == RENDITION_VERSION:
+            return blob.get("renditions")
+        return None
+
+    async def _render(self, file_info: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """在进程池中生成预览图，并存放到原文件所在的存储中"""
+        loop = asyncio.get_running_loop()
+        with tempfile.TemporaryDirectory(dir=self.upload_dir) as output_dir:
+            async with local_file_copy(file_info, self.storage_backends, self.upload_dir) as file_path:
+                outputs = await loop.run_in_executor(
+                    get_process_pool(),
+                    render_renditions,
+                    file_path,
+                    file_info["original_name"],
+                    output_dir,
+                    # 预览图与原文件存储对象同名前缀，随文件内容记录一起创建和删除
+                    os.path.splitext(file_info["stored_name"])[0],
+                    self.sizes,
+                    settings.RENDITION_QUALITY
+                )
+            renditions = []
+            try:
+                for output in outputs:
+                    location = await self.store_object(output["path"], os.path.basename(output["path"]), file_info["original_name"])
+                    renditions.append({
+                        **location,
+                        "kind": output["kind"],
+                        "format": output["format"],
+                        "width": output["width"],
+                        "height": output["height"],
+                        "content_type": output["content_type"]
+                    })
+            except BaseException:
+                await self.remove_all(renditions)
+                raise
+            return renditions
+
+    async def remove_all(self, renditions: List[Dict[str, Any]]):
+        """删除预览图的存储对象"""
+        for rendition in renditions:
+            await self.remove_object(rendition)
+
+    async def _claim(self, file_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """认领等待生成预览图或租约过期的文件，见AsyncFileRepository.claim_processing"""
+        return await self.async_file_repository.claim_processing(
+            "rendition", [RENDITION_PENDING, RENDITION_PROCESSING], RENDITION_PROCESSING, self.lease, file_id
+        )
+
+    async def generate(self, file_info: Dict[str, Any], claimed: bool = False) -> Optional[List[Dict[str, Any]]]:
+        """
+        生成文件的预览图并更新文件信息
+
+        先认领文件，已被其他工作进程认领的文件跳过；内容相同的文件共用一组预览图，已生成时直接引用
+
+        Args:
+            file_info: 文件信息
+            claimed: 文件是否已由claim_processing认领
+
+        Returns:
+            预览图列表，失败、不支持或已被其他工作进程认领时返回None
+        """
+        file_id = file_info["id"]
+        sha256 = file_info.get("sha256")
+        if not sha256 or not file_info.get("blob_id") or not has_renditions(file_info["original_name"]):
+            if claimed:
+                # 早期记录没有文件内容引用，无法生成预览图
+                await self.async_file_repository.update_file_info(file_id, {"rendition_status": None})
+            return None
+        if not claimed and await self._claim(file_id) is None:
+            print(f"[DEBUG] 预览图服务: 文件 {file_info['original_name']} 已由其他工作进程处理，跳过")
+            return None
+
+        try:
+            renditions = await self.get_cached(sha256)
+            if renditions is None:
+                start_time = time.time()
+                renditions = await self._render(file_info)
+                if not await self.async_blob_repository.set_renditions(sha256, renditions, RENDITION_VERSION):
+                    # 生成期间文件内容已被删除
+                    await self.remove_all(renditions)
+                    return None
+                print(f"[DEBUG] 预览图服务: 文件 {file_info['original_name']} 生成 {len(renditions)} 个预览图，"
+                      f"耗时: {time.time() - start_time:.2f}秒")
+            await self.async_file_repository.update_file_info(file_id, rendition_fields(renditions))
+            return renditions
+        except Exception as e:
+            print(f"[ERROR] 预览图服务: 生成文件 {file_info.get('original_name')} 的预览图失败: {str(e)}")
+            try:
+                await self.async_file_repository.update_file_info(file_id, {
+                    "rendition_status": RENDITION_FAILED,
+                    "rendition_error": str(e)
+                })
+            except Exception as status_error:
+                print(f"[ERROR] 预览图服务: 更新预览图状态失败: {str(status_error)}")
+            return None
+
+    async def resume_pending(self, limit: int = 100) -> int:
+        """
+        重新生成服务重启前未完成的预览图
+
+        每个工作进程启动时都会调用，逐个认领文件后再提交，同一个文件只会被一个工作进程处理
+
+        Args:
+            limit: 本次重新生成的最大文件数
+
+        Returns:
+            重新提交的文件数
+        """
+        count = 0
+        while count < limit:
+            file_info = await self._claim()
+            if file_info is None:
+                break
+            self.schedule(file_info, claimed=True)
+            count += 1
+        if count:
+            print(f"[INFO] 预览图服务: 重新生成 {count} 个文件的预览图")
+        return count
+
+    async def get_status(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取文件的预览图状态
+
+        Args:
+            file_id: 文件ID
+
+        Returns:
+            预览图状态信息，文件不存在时返回None
+        """
+        file_info = await self.async_file_repository.get_file_info(file_id)
+        if not file_info:
+            return None
+        return {
+            "file_id": file_id,
+            "status": file_info.get("rendition_status"),
+            "renditions": file_info.get("renditions"),
+            "thumbnail_url": file_info.get("thumbnail_url"),
+            "preview_url": file_info.get("preview_url"),
+            "error": file_info.get("rendition_error")
+        }
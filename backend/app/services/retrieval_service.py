@@ -0,0 +1,105 @@
+"""
+段落检索服务模块
+为每个会话维护上传文件的BM25段落索引，对话时只把最相关的段落提供给模型
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from cachetools import LRUCache
+from app.services.extraction_service import ExtractionService
+from app.utils.retrieval import BM25Index
+from app.core.config import settings
+
+class RetrievalService:
+    """段落检索服务类"""
+
+    def __init__(self, extraction_service: Optional[ExtractionService] = None):
+        """
+        初始化段落检索服务
+
+        Args:
+            extraction_service: 读取提取结果的文本提取服务
+        """
+        self.extraction_service = extraction_service or ExtractionService()
+        # 每个用户的每个会话一个索引，只保留最近使用的会话；
+        # 不同用户可能使用相同的会话ID，索引键包含用户ID，避免检索到其他用户的文件
+        self._indexes: LRUCache = LRUCache(maxsize=settings.RETRIEVAL_MAX_SESSIONS)
+        # 同一会话的索引更新串行执行
+        self._locks: LRUCache = LRUCache(maxsize=settings.RETRIEVAL_MAX_SESSIONS)
+
+    def _get_index(self, key: Tuple[Optional[str], str]) -> BM25Index:
+        index = self._indexes.get(key)
+        if index is None:
+            index = BM25Index(chunk_size=settings.RETRIEVAL_CHUNK_SIZE, overlap=settings.RETRIEVAL_CHUNK_OVERLAP)
+            self._indexes[key] = index
+        return index
+
+    async def _sync_index(self, session_id: str, user_id: Optional[str]) -> BM25Index:
+        """
+        增量更新会话索引：加入新提取完成的文件，移除已删除的文件
+
+        只读取尚未索引的文件文本，分段和切分词项在线程中执行，不阻塞事件循环
+        """
+        key = (user_id, session_id)
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        async with lock:
+            index = self._get_index(key)
+            files = await self.extraction_service.get_ready_files(session_id, user_id)
+            # 内容相同的文件只索引一次
+            names = {}
+            for file_info in files:
+                names.setdefault(file_info["sha256"], file_info["original_name"])
+
+            for doc_id in index.document_ids:
+                if doc_id not in names:
+                    index.remove_document(doc_id)
+
+            missing = [sha256 for sha256 in names if sha256 not in index]
+            if missing:
+                start_time = time.time()
+                texts = await self.extraction_service.get_texts(missing)
+                for sha256 in missing:
+                    # 没有文本的文件也登记为已索引，避免每次都重新读取
+                    await asyncio.to_thread(index.add_document, sha256, names[sha256], texts.get(sha256) or "")
+                print(f"[DEBUG] 检索服务: 会话 {session_id} 新索引 {len(missing)} 个文件，"
+                      f"共 {index.passage_count} 个段落，耗时: {time.time() - start_time:.2f}秒")
+            return index
+
+    async def get_passages(
+        self,
+        session_id: str,
+        user_id: Optional[str],
+        query: str,
+        k: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        获取会话文件中与问题最相关的段落
+
+        段落总长度不超过EXTRACTION_CONTEXT_MAX_CHARS
+
+        Args:
+            session_id: 会话ID
+            user_id: 用户ID，只检索该用户在会话中上传的文件
+            query: 用户问题
+            k: 最多返回的段落数，为None时使用配置
+
+        Returns:
+            按相关度排列的段落，每项包含name、position、text和score
+        """
+        index = await self._sync_index(session_id, user_id)
+        if not index.passage_count:
+            return []
+        passages = await asyncio.to_thread(index.search, query, k or settings.RETRIEVAL_TOP_K)
+
+        budget = settings.EXTRACTION_CONTEXT_MAX_CHARS
+        selected = []
+        for passage in passages:
+            if budget <= 0:
+                break
+            passage["text"] = passage["text"][:budget]
+            budget -= len(passage["text"])
+            selected.append(passage)
+        return selected
@@ -0,0 +1,88 @@
+"""
+法条服务模块
+从本地法条索引中查找用户问题引用或相关的法律条文，供AI回复时引用
+"""
+
+import os
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional
+from app.utils.statute_index import StatuteIndex
+from app.core.config import settings
+
+# 每个进程共享一个索引，索引文件通过mmap映射，多个工作进程共享页缓存
+_index: Optional[StatuteIndex] = None
+_index_lock = threading.Lock()
+_index_missing_logged = False
+
+def get_statute_index() -> Optional[StatuteIndex]:
+    """
+    获取当前进程的法条索引，首次调用时打开
+
+    Returns:
+        法条索引，索引文件不存在或无法打开时返回None
+    """
+    global _index, _index_missing_logged
+    if _index is not None:
+        return _index
+    with _index_lock:
+        if _index is None:
+            path = settings.STATUTE_INDEX_PATH
+            if not path or not os.path.exists(path):
+                if not _index_missing_logged:
+                    _index_missing_logged = True
+                    print(f"[WARNING] 法条服务: 未找到法条索引 {path}，对话不附带法条")
+                return None
+            try:
+                _index = StatuteIndex(path)
+                print(f"[INFO] 法条服务: 已加载法条索引 {path}，共 {len(_index)} 条条文")
+            except Exception as e:
+                _index_missing_logged = True
+                print(f"[ERROR] 法条服务: 打开法条索引 {path} 失败: {str(e)}")
+                return None
+        return _index
+
+class StatuteService:
+    """法条服务类"""
+
+    def __init__(self, index: Optional[StatuteIndex] = None):
+        """
+        初始化法条服务
+
+        Args:
+            index: 法条索引，为None时使用进程共享的索引
+        """
+        self._index = index
+
+    @property
+    def index(self) -> Optional[StatuteIndex]:
+        return self._index or get_statute_index()
+
+    def _find_articles(self, index: StatuteIndex, message: str, k: int) -> List[Dict[str, Any]]:
+        articles = index.find_citations(message)
+        seen = {(article["law"], article["number"]) for article in articles}
+        for article in index.search(message, k):
+            key = (article["law"], article["number"])
+            if key not in seen:
+                seen.add(key)
+                articles.append(article)
+        return articles
+
+    async def get_articles(self, message: str, k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        获取与用户问题相关的法条
+
+        问题中明确引用的条文（如“民法典第五百七十七条”）排在前面，
+        其后是按关键词检索得到的条文
+
+        Args:
+            message: 用户问题
+            k: 按关键词检索的条文数，为None时使用配置
+
+        Returns:
+            条文列表，每项包含law、number、label和text
+        """
+        index = self.index
+        if index is None or not len(index):
+            return []
+        return await asyncio.to_thread(self._find_articles, index, message, k or settings.STATUTE_TOP_K)
@@ -0,0 +1,277 @@
+"""
+存储后端模块
+为上传文件提供统一的存储接口：本地按哈希分目录存储、阿里云OSS和进程内存储（用于测试）
+
+存储键即存储文件名（stored_name），在所有后端中唯一且内容不变；
+每个存储位置记录所属后端（storage字段），删除和读取时按记录找到对应的后端
+"""
+
+import os
+import abc
+import asyncio
+import hashlib
+import shutil
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+# 流式读取时每块的大小
+STREAM_CHUNK_SIZE = 256 * 1024
+
+def backend_name(location: Dict[str, Any]) -> str:
+    """存储位置所属的后端，早期记录没有storage字段，按is_oss判断"""
+    return location.get("storage") or ("oss" if location.get("is_oss") else "local")
+
+class StorageBackend(abc.ABC):
+    """
+    存储后端接口
+
+    put_file可能移动源文件（本地后端），调用方之后不应再使用源文件
+    """
+
+    name = ""
+
+    @abc.abstractmethod
+    async def put_file(self, source_path: str, key: str) -> Dict[str, Any]:
+        """
+        存储本地文件
+
+        Returns:
+            存储位置，包含stored_name、storage、is_oss、file_path和file_url
+        """
+
+    @abc.abstractmethod
+    async def get_to_file(self, key: str, dest_path: str):
+        """把存储的文件读取到本地路径，调用方只能读取和删除该文件"""
+
+    @abc.abstractmethod
+    def iter_chunks(self, key: str, chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """按块流式读取存储的文件，子类以异步生成器实现"""
+
+    @abc.abstractmethod
+    async def delete(self, key: str) -> bool:
+        """删除存储的文件，返回是否删除成功"""
+
+    async def delete_many(self, keys: List[str]) -> List[str]:
+        """批量删除存储的文件，返回删除成功的存储键"""
+        return [key for key in keys if await self.delete(key)]
+
+    def local_path(self, key: str) -> Optional[str]:
+        """文件的本地路径，可以直接读取时返回路径，否则返回None"""
+        return None
+
+    @abc.abstractmethod
+    def url(self, key: str) -> str:
+        """文件的访问地址"""
+
+    def _location(self, key: str, file_path: str) -> Dict[str, Any]:
+        return {
+            "stored_name": key,
+            "storage": self.name,
+            "is_oss": self.name == "oss",
+            "file_path": file_path,
+            "file_url": self.url(key)
+        }
+
+class LocalStorageBackend(StorageBackend):
+    """
+    本地存储后端
+
+    文件按存储名的哈希分两级子目录存放（如uploads/3f/a2/{stored_name}），
+    避免单个目录中的文件过多；访问地址仍为/uploads/{stored_name}，由静态文件路由解析实际路径。
+    迁移前平铺在根目录中的文件仍可读取和删除
+    """
+
+    name = "local"
+
+    def __init__(self, root: str = "uploads", url_prefix: str = "/uploads"):
+        """
+        初始化本地存储后端
+
+        Args:
+            root: 存储根目录
+            url_prefix: 访问地址前缀
+        """
+        self.root = root
+        self.url_prefix = url_prefix
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, key: str) -> str:
+        """分目录存储的文件路径"""
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, digest[:2], digest[2:4], key)
+
+    def legacy_path(self, key: str) -> str:
+        """迁移前平铺在根目录中的文件路径"""
+        return os.path.join(self.root, key)
+
+    def local_path(self, key: str) -> Optional[str]:
+        path = self.path_for(key)
+        if os.path.isfile(path):
+            return path
+        legacy = self.legacy_path(key)
+        return legacy if os.path.isfile(legacy) else None
+
+    def url(self, key: str) -> str:
+        return f"{self.url_prefix}/{key}"
+
+    def _put(self, source_path: str, key: str) -> str:
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 源文件通常是同一文件系统上的临时文件，直接重命名，不复制内容
+        try:
+            os.replace(source_path, path)
+        except OSError:
+            shutil.copyfile(source_path, path)
+        return path
+
+    async def put_file(self, source_path: str, key: str) -> Dict[str, Any]:
+        path = await asyncio.to_thread(self._put, source_path, key)
+        return self._location(key, path)
+
+    async def get_to_file(self, key: str, dest_path: str):
+        path = self.local_path(key)
+        if path is None:
+            raise FileNotFoundError(f"文件不存在: {key}")
+        await asyncio.to_thread(shutil.copyfile, path, dest_path)
+
+    async def iter_chunks(self, key: str, chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        path = self.local_path(key)
+        if path is None:
+            raise FileNotFoundError(f"文件不存在: {key}")
+        with open(path, "rb") as f:
+            while True:
+                chunk = await asyncio.to_thread(f.read, chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def _delete(self, key: str) -> bool:
+        path = self.local_path(key)
+        if path is None:
+            print(f"[WARNING] 本地存储: 文件不存在 {key}")
+            return False
+        try:
+            os.remove(path)
+            return True
+        except OSError as e:
+            print(f"[ERROR] 本地存储: 删除文件失败: {str(e)}")
+            return False
+
+    async def delete(self, key: str) -> bool:
+        return await asyncio.to_thread(self._delete, key)
+
+    async def delete_many(self, keys: List[str]) -> List[str]:
+        # 在一个线程中依次删除，避免每个文件切换一次线程
+        return await asyncio.to_thread(lambda: [key for key in keys if self._delete(key)])
+
+class OSSStorageBackend(StorageBackend):
+    """阿里云OSS存储后端，网络调用由OSSService在专用线程池中执行"""
+
+    name = "oss"
+
+    def __init__(self, oss_service: Any):
+        """
+        初始化OSS存储后端
+
+        Args:
+            oss_service: OSS服务
+        """
+        self.oss_service = oss_service
+
+    def url(self, key: str) -> str:
+        return f"{self.oss_service.base_url}/{key}"
+
+    async def put_file(self, source_path: str, key: str) -> Dict[str, Any]:
+        result = await self.oss_service.upload_local_file(source_path, key, object_name=key)
+        return self._location(key, result["file_url"])
+
+    async def get_to_file(self, key: str, dest_path: str):
+        await self.oss_service.download_file(key, dest_path)
+
+    async def iter_chunks(self, key: str, chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        async for chunk in self.oss_service.iter_object(key, chunk_size):
+            yield chunk
+
+    async def delete(self, key: str) -> bool:
+        return await self.oss_service.delete_file(key)
+
+    async def delete_many(self, keys: List[str]) -> List[str]:
+        return await self.oss_service.delete_files(keys)
+
+class InMemoryStorageBackend(StorageBackend):
+    """
+    进程内存储后端，用于测试和本地开发
+
+    读写源文件和目标文件与本地后端一样在线程中执行，不阻塞事件循环
+    """
+
+    name = "memory"
+
+    def __init__(self, base_url: str = "memory://storage"):
+        self.base_url = base_url
+        self.objects: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+    def _get(self, key: str) -> bytes:
+        with self._lock:
+            if key not in self.objects:
+                raise FileNotFoundError(f"文件不存在: {key}")
+            return self.objects[key]
+
+    @staticmethod
+    def _read(path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+
+    @staticmethod
+    def _write(path: str, data: bytes):
+        with open(path, "wb") as f:
+            f.write(data)
+
+    async def put_file(self, source_path: str, key: str) -> Dict[str, Any]:
+        data = await asyncio.to_thread(self._read, source_path)
+        with self._lock:
+            self.objects[key] = data
+        return self._location(key, self.url(key))
+
+    async def get_to_file(self, key: str, dest_path: str):
+        data = self._get(key)
+        await asyncio.to_thread(self._write, dest_path, data)
+
+    async def iter_chunks(self, key: str, chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        data = self._get(key)
+        for offset in range(0, len(data), chunk_size):
+            yield data[offset:offset + chunk_size]
+
+    async def delete(self, key: str) -> bool:
+        with self._lock:
+            return self.objects.pop(key, None) is not None
+
+def create_storage_backend(backend: str, oss_service: Optional[Any] = None,
+                           local_root: str = "uploads") -> StorageBackend:
+    """
+    根据配置创建存储后端
+
+    Args:
+        backend: 后端类型，local/oss/memory，为空时配置了OSS则使用OSS，否则使用本地存储
+        oss_service: OSS服务，使用OSS后端时必需
+        local_root: 本地存储根目录
+
+    Returns:
+        存储后端实例
+    """
+    backend = (backend or "").lower()
+    if not backend:
+        backend = "oss" if oss_service is not None else "local"
+    if backend == "local":
+        return LocalStorageBackend(local_root)
+    if backend == "oss":
+        if oss_service is None:
+            raise ValueError("使用OSS存储后端需要完整的OSS配置")
+        return OSSStorageBackend(oss_service)
+    if backend == "memory":
+        return InMemoryStorageBackend()
+    raise ValueError(f"不支持的存储后端: {backend}")
@@ -0,0 +1,101 @@
+"""
+异步桥接工具模块
+将阻塞的同步迭代器放到线程中执行，并通过有界队列交给协程消费
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, AsyncGenerator, Callable, Iterator, Optional
+
+# 生产者线程结束标记
+_DONE = object()
+
+async def iterate_in_thread(
+    make_iterator: Callable[[], Iterator[Any]],
+    maxsize: int = 16,
+    executor: Optional[concurrent.futures.Executor] = None,
+    on_cancel: Optional[Callable[[Any], None]] = None
+) -> AsyncGenerator[Any, None]:
+    """
+    在线程中运行同步迭代器，并以异步生成器的形式返回其元素
+
+    上游调用（包括创建迭代器）全部在线程中完成，不会阻塞事件循环。
+    队列已满时生产者线程会阻塞等待（背压），消费者取消或提前退出时
+    生产者停止读取，并调用on_cancel关闭上游请求。
+
+    Args:
+        make_iterator: 创建同步迭代器的函数，在工作线程中调用
+        maxsize: 队列的最大长度
+        executor: 运行生产者的线程池，为None时使用默认线程池
+        on_cancel: 消费者提前退出时调用，参数为上游迭代器
+
+    Yields:
+        上游迭代器产生的元素
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+    cancelled = threading.Event()
+    upstream = {"iterator": None, "closed": False}
+    upstream_lock = threading.Lock()
+
+    def close_upstream():
+        """关闭上游迭代器，消费者和生产者线程都可能调用，只执行一次"""
+        with upstream_lock:
+            iterator = upstream["iterator"]
+            if on_cancel is None or iterator is None or upstream["closed"]:
+                return
+            upstream["closed"] = True
+        try:
+            on_cancel(iterator)
+        except Exception as e:
+            print(f"[ERROR] 关闭上游流失败: {str(e)}")
+
+    def put(item: Any) -> bool:
+        """在生产者线程中放入队列，队列满时阻塞，取消时返回False"""
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        while True:
+            try:
+                future.result(timeout=0.1)
+                return True
+            except concurrent.futures.TimeoutError:
+                if cancelled.is_set():
+                    future.cancel()
+                    return False
+
+    def produce():
+        """生产者：在线程中读取上游数据"""
+        try:
+            iterator = make_iterator()
+            with upstream_lock:
+                upstream["iterator"] = iterator
+            if cancelled.is_set():
+                # 创建上游迭代器期间消费者已退出，消费者无法关闭它，由生产者关闭
+                close_upstream()
+                return
+            for item in upstream["iterator"]:
+                if cancelled.is_set() or not put((item, None)):
+                    return
+        except BaseException as e:
+            if not cancelled.is_set():
+                put((_DONE, e))
+            return
+        put((_DONE, None))
+
+    producer = loop.run_in_executor(executor, produce)
+    finished = False
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is _DONE:
+                finished = True
+                if error is not None:
+                    raise error
+                break
+            yield item
+    finally:
+        cancelled.set()
+        if not finished:
+            close_upstream()
+        # 生产者可能仍阻塞在上游读取中，不在这里等待它结束
+        producer.add_done_callback(lambda f: f.exception() if not f.cancelled() else None)
@@ -3,47 +3,687 @@
 提供各种缓存功能和工具
 """
 
-from cachetools import cached, TTLCache, LRUCache
+from cachetools import cached, Cache, TTLCache, LRUCache
+import asyncio
+import functools
+import inspect
+import itertools
 import json
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
 from datetime import datetime
-from typing import Optional, Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple, Callable, NamedTuple
+from app.core.config import settings
+from app.utils.cache_backends import SharedCacheBackend, create_shared_backend
+from app.utils.cache_metrics import CacheMetrics, key_family, render_prometheus
+
+# 失效广播频道
+INVALIDATION_CHANNEL = "invalidate"
+
+# 在事件循环中发起的L2失效在此线程中执行，单线程保证同一进程的失效按发起顺序到达L2
+_invalidation_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-invalidate")
+
+# 可以写入共享L2的NamedTuple类型，按名称编码和还原
+_SERIALIZABLE_TYPES: Dict[str, type] = {}
+
+def _encode_value(value: Any) -> Any:
+    """将缓存值转换为可以JSON序列化的结构，datetime和已登记的NamedTuple带类型标记"""
+    if isinstance(value, tuple) and type(value).__name__ in _SERIALIZABLE_TYPES:
+        return {"__type__": type(value).__name__, "fields": [_encode_value(item) for item in value]}
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, dict):
+        return {key: _encode_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode_value(item) for item in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    raise TypeError(f"缓存值不支持写入共享缓存: {type(value).__name__}")
+
+def _decode_object(obj: Dict[str, Any]) -> Any:
+    if "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    if "__type__" in obj:
+        return _SERIALIZABLE_TYPES[obj["__type__"]](*obj["fields"])
+    return obj
+
+def dumps_shared(stored_at: float, value: Any) -> bytes:
+    """
+    序列化写入共享L2的缓存值
+
+    共享缓存由多个进程读写，使用JSON而不是pickle，读取时不会执行任意代码
+
+    Args:
+        stored_at: 写入时间
+        value: 缓存值
+
+    Returns:
+        序列化后的字节串
+
+    Raises:
+        TypeError: 缓存值包含无法序列化的类型
+    """
+    return json.dumps({"t": stored_at, "v": _encode_value(value)}, ensure_ascii=False).encode("utf-8")
+
+def loads_shared(raw: bytes) -> Tuple[float, Any]:
+    """
+    解析dumps_shared序列化的缓存值
+
+    Returns:
+        (写入时间, 缓存值)
+    """
+    payload = json.loads(raw, object_hook=_decode_object)
+    return payload["t"], payload["v"]
+
+class CacheGeneration(NamedTuple):
+    """加载前记录的代际：本进程L1的代际号和共享L2的版本号（未启用L2或读取失败时为None）"""
+    local: int
+    shared: Optional[int]
+
+class InstrumentedTTLCache(TTLCache):
+    """
+    记录淘汰和过期事件的TTLCache，键为(tag, generation, field)
+
+    只通过公开接口统计：写入时记录每个键的过期时间（ttl固定，过期顺序与最后写入顺序一致），
+    expire()之后按该顺序找出已被移除的键，不依赖cachetools的内部链表
+    """
+
+    def __init__(self, maxsize: int, ttl: float, metrics: CacheMetrics, timer: Callable[[], float] = time.monotonic):
+        super().__init__(maxsize=maxsize, ttl=ttl, timer=timer)
+        self.metrics = metrics
+        self._deadlines: "OrderedDict[Any, float]" = OrderedDict()
+        self._clearing = False
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._deadlines[key] = self.timer() + self.ttl
+        self._deadlines.move_to_end(key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._deadlines.pop(key, None)
+
+    def expire(self, time=None):
+        if time is None:
+            time = self.timer()
+        result = super().expire(time)
+        while self._deadlines:
+            key, deadline = next(iter(self._deadlines.items()))
+            # 记录的过期时间略晚于cachetools的过期时间，键仍在缓存中时下次再统计
+            if time < deadline or Cache.__contains__(self, key):
+                break
+            del self._deadlines[key]
+            self.metrics.record("expirations", key_family(key[0]))
+        return result
+
+    def popitem(self):
+        # 由Cache在容量已满时调用，popitem内部会先清理过期项
+        key, value = super().popitem()
+        if not self._clearing:
+            self.metrics.record("evictions", key_family(key[0]))
+        return key, value
+
+    def clear(self):
+        # MutableMapping.clear逐个调用popitem，清空不计入淘汰
+        self._clearing = True
+        try:
+            super().clear()
+        finally:
+            self._clearing = False
+        self._deadlines.clear()
+
+class TieredCache:
+    """
+    两级缓存：进程内L1（TTLCache）+ 可选的共享L2（Redis等）
+
+    缓存键为(tag, field)元组，tag表示失效分组（如某个会话），field区分组内的不同缓存项。
+    L1键中拼入标签的代际号，失效时只需更换代际号，复杂度O(1)；
+    L2按标签分组存放，失效时删除整个分组，并广播给其他工作进程使其更换本地代际号。
+    在事件循环中失效时只在当前线程更换L1代际号，L2的删除和广播交给后台线程，不阻塞事件循环；
+    L2删除完成前本进程不从L2读取该标签，避免读到失效前的旧数据
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float, shared: Optional[SharedCacheBackend] = None):
+        """
+        初始化两级缓存
+
+        Args:
+            name: 缓存名称，用于L2键和失效广播
+            maxsize: L1最大缓存项数量
+            ttl: 缓存项有效期（秒）
+            shared: 共享L2后端，为None时只使用L1
+        """
+        self.name = name
+        self.ttl = ttl
+        self.metrics = CacheMetrics(name)
+        self.l1 = InstrumentedTTLCache(maxsize, ttl, self.metrics)
+        self.shared = None
+        # 缓存实例标识，用于忽略自己发出的失效广播
+        self.instance_id = uuid.uuid4().hex
+        # TTLCache不是线程安全的，同步接口运行在线程池中，需要加锁
+        self._lock = threading.RLock()
+        # 代际表：标签被LRU淘汰后会分配一个从未使用过的新代际号，只会造成未命中，不会读到旧数据
+        self._generations = LRUCache(maxsize=100000)
+        self._generation_counter = itertools.count(1)
+        # 已发起、尚未在L2完成的失效次数
+        self._pending_invalidations = Counter()
+        if shared is not None:
+            self.attach_shared(shared)
+
+    @property
+    def maxsize(self) -> int:
+        return self.l1.maxsize
+
+    @property
+    def currsize(self) -> float:
+        return self.l1.currsize
+
+    def __len__(self) -> int:
+        return len(self.l1)
+
+    def attach_shared(self, shared: SharedCacheBackend):
+        """
+        启用共享L2并订阅失效广播
+
+        Args:
+            shared: 共享缓存后端
+        """
+        shared.subscribe(INVALIDATION_CHANNEL, self._on_invalidation_message)
+        self.shared = shared
+
+    def detach_shared(self):
+        """停用共享L2，之后只使用进程内缓存"""
+        self.shared = None
+
+    def _on_invalidation_message(self, message: str):
+        """处理其他工作进程广播的失效消息"""
+        try:
+            payload = json.loads(message)
+        except ValueError:
+            print(f"[ERROR] 无法解析缓存失效消息: {message}")
+            return
+        if payload.get("cache") != self.name or payload.get("origin") == self.instance_id:
+            return
+        self.invalidate_local(payload["tag"])
+        self.metrics.record("remote_invalidations", key_family(payload["tag"]))
+
+    def _l2_tag(self, tag: str) -> str:
+        return f"{self.name}:{tag}"
+
+    def _get_generation(self, tag: str) -> int:
+        """获取标签当前的代际号，首次出现时分配新代际号"""
+        with self._lock:
+            generation = self._generations.get(tag)
+            if generation is None:
+                generation = next(self._generation_counter)
+                self._generations[tag] = generation
+            return generation
+
+    def _l1_key(self, tag: str, field: str) -> Tuple[str, int, str]:
+        return (tag, self._get_generation(tag), field)
+
+    def _shared_version(self, tag: str) -> Optional[int]:
+        """读取共享L2中标签的版本号，读取失败时返回None"""
+        try:
+            return self.shared.get_version(self._l2_tag(tag))
+        except Exception as e:
+            self.metrics.record("l2_errors", key_family(tag))
+            print(f"[ERROR] 读取共享缓存版本失败: {str(e)}")
+            return None
+
+    def generation(self, tag: str) -> CacheGeneration:
+        """
+        获取标签当前的代际，加载前记录，写入时用于检测期间是否发生过失效
+
+        本进程的代际号只能发现本进程收到的失效；其他工作进程的失效广播可能晚于写入到达，
+        因此同时记录共享L2的版本号，L2只接受版本号未变化的写入
+        """
+        local = self._get_generation(tag)
+        shared = self._shared_version(tag) if self.shared is not None else None
+        return CacheGeneration(local, shared)
+
+    def __getitem__(self, key: Tuple[str, str]) -> Any:
+        tag, field = key
+        l1_key = self._l1_key(tag, field)
+        with self._lock:
+            try:
+                value = self.l1[l1_key]
+                self.metrics.record("l1_hits", key_family(tag))
+                return value
+            except KeyError:
+                pass
+
+        with self._lock:
+            pending = self._pending_invalidations[tag] > 0
+        if self.shared is not None and not pending:
+            raw = None
+            try:
+                raw = self.shared.get(self._l2_tag(tag), field)
+            except Exception as e:
+                self.metrics.record("l2_errors", key_family(tag))
+                print(f"[ERROR] 读取共享缓存失败: {str(e)}")
+            if raw is not None:
+                try:
+                    stored_at, value = loads_shared(raw)
+                except (ValueError, KeyError, TypeError) as e:
+                    self.metrics.record("l2_errors", key_family(tag))
+                    print(f"[ERROR] 解析共享缓存失败: {str(e)}")
+                    stored_at, value = 0.0, None
+                if time.time() - stored_at < self.ttl:
+                    with self._lock:
+                        self.l1[l1_key] = value
+                    self.metrics.record("l2_hits", key_family(tag))
+                    return value
+
+        self.metrics.record("misses", key_family(tag))
+        raise KeyError(key)
+
+    def __setitem__(self, key: Tuple[str, str], value: Any):
+        self.put(key, value)
+
+    def put(self, key: Tuple[str, str], value: Any, generation: Optional[CacheGeneration] = None) -> bool:
+        """
+        写入缓存项
+
+        Args:
+            key: (tag, field)缓存键
+            value: 缓存值
+            generation: 加载前记录的代际，若期间标签已失效则放弃写入，避免旧数据回填；
+                共享L2的版本号已变化（其他工作进程已失效）或未知时只写入L1
+
+        Returns:
+            是否写入
+        """
+        tag, field = key
+        with self._lock:
+            current = self._get_generation(tag)
+            if generation is not None and generation.local != current:
+                return False
+            self.l1[(tag, current, field)] = value
+        if self.shared is not None:
+            version = generation.shared if generation is not None else self._shared_version(tag)
+            if version is None:
+                return True
+            try:
+                written = self.shared.set_if_version(
+                    self._l2_tag(tag), field, dumps_shared(time.time(), value), self.ttl, version
+                )
+                if not written:
+                    # 加载期间其他工作进程已失效该标签，本进程L1中的值同样是旧数据
+                    with self._lock:
+                        self.l1.pop((tag, current, field), None)
+                    self.metrics.record("stale_writes", key_family(tag))
+                    return False
+            except Exception as e:
+                self.metrics.record("l2_errors", key_family(tag))
+                print(f"[ERROR] 写入共享缓存失败: {str(e)}")
+        return True
+
+    def peek(self, key: Tuple[str, str]) -> Any:
+        """只读取本进程L1中的缓存项，不计入命中统计，不存在时返回None"""
+        tag, field = key
+        with self._lock:
+            return self.l1.get(self._l1_key(tag, field))
+
+    def rewrite(self, tag: str, fields: List[str], update: Callable[[Any], Any]):
+        """
+        就地更新标签下指定字段的L1缓存项（写穿），其余字段失效
+
+        标签会更换代际号，更新后的缓存项写入新代际，
+        因此更新前开始的加载无法再把旧数据写回缓存。
+        共享L2中的该标签会被删除并广播失效，其他工作进程重新加载
+
+        Args:
+            tag: 标签
+            fields: 需要就地更新的字段
+            update: 接收旧缓存值并返回新缓存值的函数
+        """
+        with self._lock:
+            old_generation = self._get_generation(tag)
+            updated = {}
+            for field in fields:
+                value = self.l1.get((tag, old_generation, field))
+                if value is not None:
+                    updated[field] = update(value)
+            self.invalidate_local(tag)
+            new_generation = self._get_generation(tag)
+            for field, value in updated.items():
+                self.l1[(tag, new_generation, field)] = value
+        self.metrics.record("write_throughs", key_family(tag))
+        self._broadcast_invalidation(tag)
+
+    def invalidate_local(self, tag: str):
+        """只使本进程L1中该标签的缓存项失效"""
+        with self._lock:
+            self._generations[tag] = next(self._generation_counter)
+
+    def invalidate(self, tag: str):
+        """
+        使标签下的所有缓存项失效：本进程L1、共享L2，并广播给其他工作进程
+
+        Args:
+            tag: 失效标签
+        """
+        self.invalidate_local(tag)
+        self.metrics.record("invalidations", key_family(tag))
+        self._broadcast_invalidation(tag)
+
+    def _broadcast_invalidation(self, tag: str):
+        """
+        删除共享L2中的标签并广播给其他工作进程
+
+        在事件循环线程中调用时提交到后台线程执行，立即返回；其他线程中同步执行
+        """
+        shared = self.shared
+        if shared is None:
+            return
+        message = json.dumps({"cache": self.name, "tag": tag, "origin": self.instance_id})
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._invalidate_shared(shared, tag, message)
+            return
+        with self._lock:
+            self._pending_invalidations[tag] += 1
+        _invalidation_executor.submit(self._invalidate_shared, shared, tag, message, True)
+
+    def _invalidate_shared(self, shared: SharedCacheBackend, tag: str, message: str, pending: bool = False):
+        try:
+            shared.invalidate(self._l2_tag(tag), INVALIDATION_CHANNEL, message)
+        except Exception as e:
+            self.metrics.record("l2_errors", key_family(tag))
+            print(f"[ERROR] 广播缓存失效失败: {str(e)}")
+        finally:
+            if pending:
+                with self._lock:
+                    self._pending_invalidations[tag] -= 1
+                    if self._pending_invalidations[tag] <= 0:
+                        del self._pending_invalidations[tag]
+
+    def flush_invalidations(self):
+        """等待已提交到后台线程的L2失效完成，用于关闭前和测试"""
+        _invalidation_executor.submit(lambda: None).result()
+
+    def clear(self):
+        """清除本进程L1中的所有缓存项"""
+        with self._lock:
+            self.l1.clear()
+            self._generations.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存容量、各级命中率以及按键族划分的事件计数和加载耗时"""
+        with self._lock:
+            size = len(self.l1)
+            generations = len(self._generations)
+        metrics = self.metrics.snapshot()
+        totals = metrics["totals"]
+        lookups = totals["l1_hits"] + totals["l2_hits"] + totals["misses"]
+        l2_lookups = totals["l2_hits"] + totals["misses"]
+        return {
+            "size": size,
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "currsize": self.currsize,
+            "generations": generations,
+            "shared": self.shared is not None,
+            **totals,
+            "l1_hit_rate": totals["l1_hits"] / lookups if lookups else 0.0,
+            "l2_hit_rate": totals["l2_hits"] / l2_lookups if self.shared is not None and l2_lookups else 0.0,
+            "families": metrics["families"],
+            "load_latency": metrics["load_latency"]
+        }
+
+class CacheEntry(NamedTuple):
+    """带加载时间的缓存值，用于判断是否超过软过期时间"""
+    value: Any
+    loaded_at: float
+
+class _Flight:
+    """同一缓存键正在进行的一次加载，其他线程等待其结果"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+# 后台刷新线程池：软过期后由一个线程刷新，请求线程直接返回旧值
+_refresh_executor = ThreadPoolExecutor(
+    max_workers=settings.CACHE_REFRESH_WORKERS,
+    thread_name_prefix="cache-refresh"
+)
+
+def cached_swr(
+    cache: TieredCache,
+    key: Callable[..., Tuple[str, str]],
+    soft_ttl: float,
+    covers: Optional[Callable[..., bool]] = None,
+    family: Optional[str] = None
+):
+    """
+    带单飞加载和过期后台刷新（stale-while-revalidate）的缓存装饰器
+
+    - 缓存项在soft_ttl内直接返回
+    - 超过soft_ttl但未超过缓存的硬过期时间（cache.ttl）时返回旧值，并只触发一次后台刷新
+    - 未命中时同一个键只有一个调用者执行加载，其他并发调用者等待并共享结果
+    - 只支持同步函数，加载和L2读写都会阻塞，异步请求中应在线程池中调用
+
+    Args:
+        cache: 两级缓存实例，其ttl作为硬过期时间
+        key: 根据函数参数生成(tag, field)缓存键的函数
+        soft_ttl: 软过期时间（秒）
+        covers: 可选，covers(缓存值, *args, **kwargs)判断缓存值能否满足本次调用，
+            不能满足时按未命中处理并用本次参数重新加载
+        family: 加载耗时统计使用的名称，默认为函数名
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            # 加载和L2读写都是阻塞调用，协程中应在线程池中调用被装饰的同步函数
+            raise TypeError(f"cached_swr只支持同步函数: {func.__name__}")
+        load_family = family or func.__name__
+
+        flights: Dict[Tuple[str, str], Any] = {}
+        flights_lock = threading.Lock()
+
+        def lookup(cache_key) -> Optional[CacheEntry]:
+            try:
+                return cache[cache_key]
+            except KeyError:
+                return None
+
+        def is_fresh(entry: CacheEntry) -> bool:
+            return time.time() - entry.loaded_at < soft_ttl
+
+        def is_usable(value, args, kwargs) -> bool:
+            return covers is None or covers(value, *args, **kwargs)
+
+        def load(cache_key, flight: _Flight, args, kwargs):
+            generation = cache.generation(cache_key[0])
+            started = time.perf_counter()
+            try:
+                flight.value = func(*args, **kwargs)
+                cache.metrics.observe_load(load_family, time.perf_counter() - started)
+                cache.put(cache_key, CacheEntry(flight.value, time.time()), generation)
+            except BaseException as e:
+                print(f"[ERROR] 缓存加载失败: {str(e)}")
+                cache.metrics.record("load_errors", load_family)
+                flight.error = e
+            finally:
+                with flights_lock:
+                    if flights.get(cache_key) is flight:
+                        flights.pop(cache_key)
+                flight.done.set()
+
+        def start(cache_key) -> Tuple[_Flight, bool]:
+            with flights_lock:
+                flight = flights.get(cache_key)
+                if flight is not None:
+                    return flight, False
+                flight = _Flight()
+                flights[cache_key] = flight
+                return flight, True
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache_key = key(*args, **kwargs)
+            entry = lookup(cache_key)
+            if entry is not None and is_usable(entry.value, args, kwargs):
+                if not is_fresh(entry):
+                    flight, is_leader = start(cache_key)
+                    if is_leader:
+                        _refresh_executor.submit(load, cache_key, flight, args, kwargs)
+                return entry.value
+
+            flight, is_leader = start(cache_key)
+            if is_leader:
+                load(cache_key, flight, args, kwargs)
+            else:
+                flight.done.wait()
+                if flight.error is None and not is_usable(flight.value, args, kwargs):
+                    # 共享的加载结果不满足本次调用（如参数范围更大），单独加载一次
+                    flight = _Flight()
+                    load(cache_key, flight, args, kwargs)
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        return wrapper
+
+    return decorator
 
 # 创建缓存实例
-# 历史记录缓存：最大1000条记录，每条记录缓存5分钟
-history_cache = TTLCache(maxsize=1000, ttl=5)
-# 用户会话缓存：最大500条记录，每条记录缓存5分钟
-sessions_cache = TTLCache(maxsize=500, ttl=5)
+# 历史记录缓存：缓存项超过软过期时间后后台刷新，超过硬过期时间后淘汰
+history_cache = TieredCache("history", maxsize=1000, ttl=settings.HISTORY_CACHE_HARD_TTL)
+# 用户会话缓存
+sessions_cache = TieredCache("sessions", maxsize=500, ttl=settings.SESSIONS_CACHE_HARD_TTL)
+
+_caches = {cache.name: cache for cache in (history_cache, sessions_cache)}
+_shared_backend: Optional[SharedCacheBackend] = None
+
+def init_shared_cache(backend: Optional[SharedCacheBackend] = None):
+    """
+    启用共享L2缓存并订阅失效广播，应在应用启动时调用
+
+    Args:
+        backend: 共享缓存后端，为None时根据CACHE_BACKEND配置创建
+    """
+    global _shared_backend
+    if backend is None:
+        backend = create_shared_backend(settings.CACHE_BACKEND, settings.REDIS_URL)
+    if backend is None:
+        print("[INFO] 未配置共享缓存，仅使用进程内缓存")
+        return
+    for cache in _caches.values():
+        cache.attach_shared(backend)
+    _shared_backend = backend
+    print(f"[INFO] 共享缓存已启用: {type(backend).__name__}")
+
+def close_shared_cache():
+    """关闭共享L2缓存，应在应用关闭时调用"""
+    global _shared_backend
+    if _shared_backend is None:
+        return
+    for cache in _caches.values():
+        cache.flush_invalidations()
+        cache.detach_shared()
+    _shared_backend.close()
+    _shared_backend = None
+
+class HistoryWindow(NamedTuple):
+    """
+    会话历史记录的缓存窗口：按时间顺序的前limit条消息
+
+    不同limit的请求共用同一个窗口，较小的limit直接切片返回
+    """
+    limit: int
+    messages: List[Dict[str, Any]]
+
+    def covers(self, limit: int) -> bool:
+        """窗口能否满足指定limit的请求：窗口更大，或会话消息总数小于窗口（已包含全部消息）"""
+        return limit <= self.limit or len(self.messages) < self.limit
+
+    def slice(self, limit: int) -> List[Dict[str, Any]]:
+        """返回前limit条消息"""
+        return self.messages[:limit]
+
+    def append(self, messages: List[Dict[str, Any]]) -> "HistoryWindow":
+        """追加新写入的消息，只保留窗口范围内的部分，并按_id去重"""
+        existing = {message["_id"] for message in self.messages}
+        appended = list(self.messages)
+        for message in messages:
+            if len(appended) >= self.limit:
+                break
+            if message["_id"] not in existing:
+                appended.append(message)
+        return HistoryWindow(self.limit, appended)
+
+_SERIALIZABLE_TYPES.update({cls.__name__: cls for cls in (CacheEntry, HistoryWindow)})
+
+def history_cache_key(session_id: str, user_id: Optional[str]) -> Tuple[str, str]:
+    """
+    生成历史记录缓存键，与limit无关，每个会话和用户只缓存一个窗口
+
+    Args:
+        session_id: 会话ID
+        user_id: 可选的用户ID
+
+    Returns:
+        (会话标签, 字段)缓存键
+    """
+    return (f"session:{session_id}", user_id or "all")
+
+def append_history_cache(session_id: str, user_id: str, messages: List[Dict[str, Any]]):
+    """
+    将新写入的消息追加到会话的历史记录缓存窗口中（写穿），而不是清除缓存
+
+    Args:
+        session_id: 会话ID
+        user_id: 消息所属的用户ID
+        messages: 新写入的消息，格式与ChatRepository.get_chat_messages返回的一致
+    """
+    def update(entry: "CacheEntry") -> "CacheEntry":
+        return CacheEntry(entry.value.append(messages), entry.loaded_at)
+
+    history_cache.rewrite(f"session:{session_id}", [user_id, "all"], update)
+    print(f"[DEBUG] 已追加历史记录缓存: session_id={session_id}, 新消息{len(messages)}条")
+
+def sessions_cache_key(user_id: str, limit: int) -> Tuple[str, str]:
+    """
+    生成用户会话缓存键
+
+    Args:
+        user_id: 用户ID
+        limit: 返回会话数量限制
+
+    Returns:
+        (用户标签, 字段)缓存键
+    """
+    return (f"user:{user_id}", str(limit))
 
 def clear_history_cache(session_id: str, user_id: Optional[str] = None):
     """
     清除历史记录缓存
 
+    会话内任意用户的消息变化都会影响不区分用户的缓存项，
+    因此总是使该会话的所有缓存项（所有用户、所有limit）失效
+
     Args:
         session_id: 会话ID
-        user_id: 可选的用户ID，如果提供则只清除该用户的历史记录缓存
-    """
-    # 遍历缓存并移除相关项
-    keys_to_remove = []
-    for key in history_cache.keys():
-        if key.startswith(f"history:{session_id}"):
-            if user_id is None or key.endswith(f":{user_id}"):
-                keys_to_remove.append(key)
-
-    for key in keys_to_remove:
-        if key in history_cache:
-            del history_cache[key]
+        user_id: 可选的用户ID，仅用于日志
+    """
+    history_cache.invalidate(f"session:{session_id}")
     print(f"[DEBUG] 已清除历史记录缓存: session_id={session_id}, user_id={user_id}")
 
 def clear_sessions_cache(user_id: str):
     """
-    清除用户会话缓存
+    清除用户会话缓存，所有limit的缓存项都会失效
 
     Args:
         user_id: 用户ID
     """
-    key = f"sessions:{user_id}"
-    if key in sessions_cache:
-        del sessions_cache[key]
+    sessions_cache.invalidate(f"user:{user_id}")
     print(f"[DEBUG] 已清除用户会话缓存: user_id={user_id}")
 
 def clear_all_history_cache():
@@ -64,16 +704,16 @@ def get_cache_stats():
         包含缓存统计信息的字典
     """
     return {
-        "history_cache": {
-            "size": len(history_cache),
-            "maxsize": history_cache.maxsize,
-            "ttl": history_cache.ttl,
-            "currsize": history_cache.currsize
-        },
-        "sessions_cache": {
-            "size": len(sessions_cache),
-            "maxsize": sessions_cache.maxsize,
-            "ttl": sessions_cache.ttl,
-            "currsize": sessions_cache.currsize
-        }
+        "history_cache": history_cache.get_stats(),
+        "sessions_cache": sessions_cache.get_stats(),
+        "shared_backend": type(_shared_backend).__name__ if _shared_backend is not None else None
     }
+
+def get_cache_metrics_text() -> str:
+    """
+    以Prometheus文本格式获取缓存指标
+
+    Returns:
+        Prometheus文本格式的指标
+    """
+    return render_prometheus(list(_caches.values()))
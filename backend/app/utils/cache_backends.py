@@ -0,0 +1,244 @@
+"""
+共享缓存后端模块
+为多进程/多主机部署提供二级（L2）共享缓存和失效广播
+"""
+
+import abc
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+class SharedCacheBackend(abc.ABC):
+    """
+    共享缓存后端接口
+
+    缓存项按标签分组存放（标签对应一个哈希），删除标签即可使整组缓存项失效；
+    每个标签还有一个版本号，失效时递增，写入时只有加载前读到的版本号仍是当前版本才写入，
+    避免其他工作进程失效之后，本进程把失效前加载的旧数据写回共享缓存；
+    publish/subscribe用于向所有工作进程广播失效消息
+    """
+
+    # 版本号的保留时间（秒），远长于缓存项的有效期
+    VERSION_TTL = 24 * 3600
+
+    @abc.abstractmethod
+    def get(self, tag: str, field: str) -> Optional[bytes]:
+        """获取标签下某个字段的值，不存在时返回None"""
+
+    @abc.abstractmethod
+    def set(self, tag: str, field: str, value: bytes, ttl: float):
+        """设置标签下某个字段的值，并刷新整个标签的过期时间"""
+
+    @abc.abstractmethod
+    def get_version(self, tag: str) -> int:
+        """获取标签当前的版本号，从未失效过时为0"""
+
+    @abc.abstractmethod
+    def set_if_version(self, tag: str, field: str, value: bytes, ttl: float, version: int) -> bool:
+        """
+        标签的版本号仍为version时设置字段的值（原子操作）
+
+        Returns:
+            是否写入
+        """
+
+    @abc.abstractmethod
+    def delete(self, tag: str):
+        """删除标签下的所有字段并递增版本号"""
+
+    @abc.abstractmethod
+    def publish(self, channel: str, message: str):
+        """向频道广播消息"""
+
+    def invalidate(self, tag: str, channel: str, message: str):
+        """删除标签、递增版本号并广播失效消息"""
+        self.delete(tag)
+        self.publish(channel, message)
+
+    @abc.abstractmethod
+    def subscribe(self, channel: str, callback: Callable[[str], None]):
+        """订阅频道，收到消息时在后台线程中调用callback"""
+
+    def close(self):
+        """关闭连接和订阅线程"""
+
+# 版本号匹配时写入字段并刷新标签的过期时间
+_SET_IF_VERSION_SCRIPT = """
+local current = redis.call('GET', KEYS[2]) or '0'
+if current ~= ARGV[4] then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+class RedisCacheBackend(SharedCacheBackend):
+    """基于Redis协议的共享缓存后端"""
+
+    def __init__(self, url: str, key_prefix: str = "law_agent:cache:"):
+        """
+        初始化Redis缓存后端
+
+        Args:
+            url: Redis连接地址，如redis://localhost:6379/0
+            key_prefix: 缓存键前缀
+        """
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("使用Redis缓存后端需要安装redis包") from e
+
+        self.client = redis.Redis.from_url(url)
+        self.key_prefix = key_prefix
+        self._pubsub_threads = []
+        self._set_if_version = self.client.register_script(_SET_IF_VERSION_SCRIPT)
+
+    def _key(self, tag: str) -> str:
+        return f"{self.key_prefix}{tag}"
+
+    def _version_key(self, tag: str) -> str:
+        return f"{self.key_prefix}version:{tag}"
+
+    def get(self, tag: str, field: str) -> Optional[bytes]:
+        return self.client.hget(self._key(tag), field)
+
+    def set(self, tag: str, field: str, value: bytes, ttl: float):
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.hset(self._key(tag), field, value)
+        pipeline.expire(self._key(tag), max(1, int(ttl)))
+        pipeline.execute()
+
+    def get_version(self, tag: str) -> int:
+        return int(self.client.get(self._version_key(tag)) or 0)
+
+    def set_if_version(self, tag: str, field: str, value: bytes, ttl: float, version: int) -> bool:
+        return bool(self._set_if_version(
+            keys=[self._key(tag), self._version_key(tag)],
+            args=[field, value, max(1, int(ttl)), str(version)]
+        ))
+
+    def _delete(self, pipeline, tag: str):
+        pipeline.delete(self._key(tag))
+        pipeline.incr(self._version_key(tag))
+        pipeline.expire(self._version_key(tag), self.VERSION_TTL)
+
+    def delete(self, tag: str):
+        pipeline = self.client.pipeline(transaction=True)
+        self._delete(pipeline, tag)
+        pipeline.execute()
+
+    def publish(self, channel: str, message: str):
+        self.client.publish(f"{self.key_prefix}{channel}", message)
+
+    def invalidate(self, tag: str, channel: str, message: str):
+        # 删除、递增版本号和广播合并为一次往返
+        pipeline = self.client.pipeline(transaction=True)
+        self._delete(pipeline, tag)
+        pipeline.publish(f"{self.key_prefix}{channel}", message)
+        pipeline.execute()
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+
+        def handler(message):
+            data = message["data"]
+            callback(data.decode("utf-8") if isinstance(data, bytes) else data)
+
+        pubsub.subscribe(**{f"{self.key_prefix}{channel}": handler})
+        thread = pubsub.run_in_thread(sleep_time=1, daemon=True)
+        self._pubsub_threads.append(thread)
+
+    def close(self):
+        for thread in self._pubsub_threads:
+            thread.stop()
+        self._pubsub_threads = []
+        self.client.close()
+
+class InMemoryCacheBackend(SharedCacheBackend):
+    """
+    进程内共享缓存后端
+
+    行为与RedisCacheBackend一致，可在单进程内模拟多个工作进程共享同一个L2，
+    用于本地开发和测试
+    """
+
+    def __init__(self):
+        """初始化进程内缓存后端"""
+        self._data: Dict[str, Tuple[float, Dict[str, bytes]]] = {}
+        self._versions: Dict[str, int] = {}
+        self._subscribers: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def get(self, tag: str, field: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(tag)
+            if entry is None:
+                return None
+            expires_at, fields = entry
+            if expires_at <= time.monotonic():
+                del self._data[tag]
+                return None
+            return fields.get(field)
+
+    def _set(self, tag: str, field: str, value: bytes, ttl: float):
+        entry = self._data.get(tag)
+        fields = entry[1] if entry and entry[0] > time.monotonic() else {}
+        fields[field] = value
+        self._data[tag] = (time.monotonic() + ttl, fields)
+
+    def set(self, tag: str, field: str, value: bytes, ttl: float):
+        with self._lock:
+            self._set(tag, field, value, ttl)
+
+    def get_version(self, tag: str) -> int:
+        with self._lock:
+            return self._versions.get(tag, 0)
+
+    def set_if_version(self, tag: str, field: str, value: bytes, ttl: float, version: int) -> bool:
+        with self._lock:
+            if self._versions.get(tag, 0) != version:
+                return False
+            self._set(tag, field, value, ttl)
+            return True
+
+    def delete(self, tag: str):
+        with self._lock:
+            self._data.pop(tag, None)
+            self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def publish(self, channel: str, message: str):
+        with self._lock:
+            callbacks = list(self._subscribers.get(channel, []))
+        for callback in callbacks:
+            callback(message)
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]):
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(callback)
+
+    def close(self):
+        with self._lock:
+            self._data.clear()
+            self._versions.clear()
+            self._subscribers.clear()
+
+def create_shared_backend(backend: str, redis_url: str = "") -> Optional[SharedCacheBackend]:
+    """
+    根据配置创建共享缓存后端
+
+    Args:
+        backend: 后端类型，redis/memory，为空时不启用L2
+        redis_url: Redis连接地址
+
+    Returns:
+        共享缓存后端实例，未启用时返回None
+    """
+    backend = (backend or "").lower()
+    if not backend or backend == "none":
+        return None
+    if backend == "redis":
+        return RedisCacheBackend(redis_url)
+    if backend == "memory":
+        return InMemoryCacheBackend()
+    raise ValueError(f"不支持的缓存后端: {backend}")
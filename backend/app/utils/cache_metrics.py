@@ -0,0 +1,155 @@
+"""
+缓存指标模块
+统计各缓存按键族划分的命中、未命中、淘汰、过期、失效次数和加载耗时分布
+"""
+
+import bisect
+import threading
+from typing import Any, Dict, List, Tuple
+
+# 加载耗时直方图的桶上界（秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 缓存事件类型
+CACHE_EVENTS = (
+    "l1_hits",
+    "l2_hits",
+    "misses",
+    "evictions",
+    "expirations",
+    "invalidations",
+    "write_throughs",
+    "remote_invalidations",
+    "l2_errors",
+    "stale_writes",
+    "load_errors"
+)
+
+def key_family(tag: str) -> str:
+    """根据缓存标签得到键族，如session:abc的键族为session"""
+    return tag.split(":", 1)[0]
+
+class LatencyHistogram:
+    """累积分布的耗时直方图"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        buckets["+Inf"] = self.count
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "avg": self.sum / self.count if self.count else 0.0,
+            "buckets": buckets
+        }
+
+class CacheMetrics:
+    """单个缓存的指标，线程安全"""
+
+    def __init__(self, cache_name: str):
+        self.cache_name = cache_name
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._latency: Dict[str, LatencyHistogram] = {}
+
+    def record(self, event: str, family: str, count: int = 1):
+        """记录缓存事件"""
+        with self._lock:
+            counters = self._counters.get(family)
+            if counters is None:
+                counters = self._counters[family] = dict.fromkeys(CACHE_EVENTS, 0)
+            counters[event] += count
+
+    def observe_load(self, family: str, seconds: float):
+        """记录一次加载耗时"""
+        with self._lock:
+            histogram = self._latency.get(family)
+            if histogram is None:
+                histogram = self._latency[family] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        获取指标快照
+
+        Returns:
+            包含totals（全部键族合计）、families（按键族）和load_latency（按加载函数）的字典
+        """
+        with self._lock:
+            families = {family: dict(counters) for family, counters in self._counters.items()}
+            latency = {family: histogram.to_dict() for family, histogram in self._latency.items()}
+        totals = dict.fromkeys(CACHE_EVENTS, 0)
+        for counters in families.values():
+            for event, count in counters.items():
+                totals[event] += count
+        for counters in [totals, *families.values()]:
+            lookups = counters["l1_hits"] + counters["l2_hits"] + counters["misses"]
+            counters["hit_rate"] = (counters["l1_hits"] + counters["l2_hits"]) / lookups if lookups else 0.0
+        return {"totals": totals, "families": families, "load_latency": latency}
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render_prometheus(caches: List[Any]) -> str:
+    """
+    以Prometheus文本格式输出缓存指标
+
+    Args:
+        caches: 缓存实例列表，需提供name、metrics、len()和maxsize
+
+    Returns:
+        Prometheus文本格式的指标
+    """
+    lines = [
+        "# HELP law_agent_cache_events_total Cache events by cache, key family and event.",
+        "# TYPE law_agent_cache_events_total counter"
+    ]
+    for cache in caches:
+        snapshot = cache.metrics.snapshot()
+        for family, counters in sorted(snapshot["families"].items()):
+            for event in CACHE_EVENTS:
+                lines.append(
+                    f'law_agent_cache_events_total{{cache="{_escape(cache.name)}",'
+                    f'family="{_escape(family)}",event="{event}"}} {counters[event]}'
+                )
+
+    lines.extend([
+        "# HELP law_agent_cache_entries Current number of entries in the in-process cache.",
+        "# TYPE law_agent_cache_entries gauge"
+    ])
+    for cache in caches:
+        lines.append(f'law_agent_cache_entries{{cache="{_escape(cache.name)}"}} {len(cache)}')
+    lines.extend([
+        "# HELP law_agent_cache_max_entries Maximum number of entries in the in-process cache.",
+        "# TYPE law_agent_cache_max_entries gauge"
+    ])
+    for cache in caches:
+        lines.append(f'law_agent_cache_max_entries{{cache="{_escape(cache.name)}"}} {cache.maxsize}')
+
+    lines.extend([
+        "# HELP law_agent_cache_load_seconds Time spent loading values on cache miss or refresh.",
+        "# TYPE law_agent_cache_load_seconds histogram"
+    ])
+    for cache in caches:
+        for family, histogram in sorted(cache.metrics.snapshot()["load_latency"].items()):
+            labels = f'cache="{_escape(cache.name)}",family="{_escape(family)}"'
+            for bound, count in histogram["buckets"].items():
+                lines.append(f'law_agent_cache_load_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f"law_agent_cache_load_seconds_sum{{{labels}}} {histogram['sum']}")
+            lines.append(f"law_agent_cache_load_seconds_count{{{labels}}} {histogram['count']}")
+
+    return "\n".join(lines) + "\n"
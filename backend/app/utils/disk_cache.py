@@ -0,0 +1,257 @@
+"""
+本地磁盘缓存模块
+按字节数限制容量的LRU文件缓存，同一主机上的多个工作进程共享同一个缓存目录
+
+- 写入先写临时文件再重命名，读取方不会看到写了一半的文件
+- 命中时更新文件的修改时间，淘汰时按修改时间从旧到新删除，不需要进程间共享内存状态
+- 淘汰在文件锁（fcntl.flock）内进行，多个进程不会同时扫描和删除；不支持flock的平台上不加锁
+- 每个进程记录上次扫描得到的总大小加上之后写入的字节数，估计值超过上限或距上次扫描超过
+  scan_interval秒时才扫描目录，其他进程的写入最迟在下一次定期扫描时计入
+"""
+
+import os
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+class DiskCache:
+    """
+    磁盘LRU缓存
+
+    缓存的文件写入后不会修改，只会整体替换或删除，因此可以直接以硬链接交给调用方使用
+    """
+
+    def __init__(self, directory: str, max_bytes: int, low_watermark: float = 0.9, scan_interval: float = 60):
+        """
+        初始化磁盘缓存
+
+        Args:
+            directory: 缓存目录
+            max_bytes: 缓存文件总大小上限（字节）
+            low_watermark: 超过上限时淘汰到max_bytes * low_watermark以下，避免每次写入都淘汰
+            scan_interval: 写入时重新扫描目录的最长间隔（秒），用于计入其他进程的写入
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.low_watermark = low_watermark
+        self.temp_dir = os.path.join(directory, "tmp")
+        os.makedirs(self.temp_dir, exist_ok=True)
+        self._lock_path = os.path.join(directory, ".lock")
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.scan_interval = scan_interval
+        # 估计的缓存总大小，为None时下一次写入扫描目录
+        self._estimated_bytes: Optional[int] = None
+        self._last_scan = 0.0
+
+    def path_for(self, key: str) -> str:
+        """缓存文件路径，按键的哈希分两级目录存放"""
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def _count(self, field: str, amount: int = 1):
+        with self._stats_lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+    def stats(self) -> Dict[str, int]:
+        """命中、未命中和淘汰次数"""
+        with self._stats_lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    @staticmethod
+    def _link_or_copy(source: str, dest: str):
+        """把缓存文件交给调用方：同一文件系统上使用硬链接，否则复制"""
+        if os.path.exists(dest):
+            os.remove(dest)
+        try:
+            os.link(source, dest)
+        except OSError:
+            shutil.copyfile(source, dest)
+
+    def get_to_file(self, key: str, dest_path: str) -> bool:
+        """
+        把缓存的文件放到dest_path
+
+        Args:
+            key: 缓存键
+            dest_path: 目标路径
+
+        Returns:
+            是否命中
+        """
+        path = self.path_for(key)
+        try:
+            self._link_or_copy(path, dest_path)
+        except FileNotFoundError:
+            # 缓存文件不存在，或在链接前被其他进程淘汰
+            self._count("misses")
+            return False
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._count("hits")
+        return True
+
+    def _temp_path(self) -> str:
+        return os.path.join(self.temp_dir, f"{uuid.uuid4().hex}.part")
+
+    def _commit(self, key: str, temp_path: str):
+        """把写好的临时文件原子地放入缓存，然后按需淘汰"""
+        path = self.path_for(key)
+        size = os.path.getsize(temp_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+        with self._stats_lock:
+            if self._estimated_bytes is not None:
+                self._estimated_bytes += size
+            needs_scan = (self._estimated_bytes is None or self._estimated_bytes > self.max_bytes
+                          or time.monotonic() - self._last_scan >= self.scan_interval)
+        if needs_scan:
+            self.evict()
+
+    def get_or_load(self, key: str, dest_path: str, loader: Callable[[str], Any]) -> bool:
+        """
+        读穿缓存：命中时直接放到dest_path，否则调用loader写入临时文件后放入缓存
+
+        超过缓存容量的文件不缓存，直接移动到dest_path
+
+        Args:
+            key: 缓存键
+            dest_path: 目标路径
+            loader: 把内容写入给定路径的函数
+
+        Returns:
+            是否命中
+        """
+        if self.get_to_file(key, dest_path):
+            return True
+        temp_path = self._temp_path()
+        try:
+            loader(temp_path)
+            if os.path.getsize(temp_path) > self.max_bytes * self.low_watermark:
+                # 目标路径可能在另一个文件系统上，os.replace会失败（EXDEV）
+                shutil.move(temp_path, dest_path)
+            else:
+                self._link_or_copy(temp_path, dest_path)
+                self._commit(key, temp_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return False
+
+    def put_file(self, key: str, source_path: str) -> Optional[str]:
+        """
+        把本地文件放入缓存
+
+        同一文件系统上使用硬链接，调用方之后不能原地修改源文件
+
+        Args:
+            key: 缓存键
+            source_path: 本地文件路径
+
+        Returns:
+            缓存文件路径，未缓存时返回None
+        """
+        if os.path.getsize(source_path) > self.max_bytes * self.low_watermark:
+            return None
+        temp_path = self._temp_path()
+        try:
+            self._link_or_copy(source_path, temp_path)
+            self._commit(key, temp_path)
+            return self.path_for(key)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def discard(self, key: str):
+        """删除缓存的文件"""
+        try:
+            os.remove(self.path_for(key))
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[bool]:
+        """获取缓存目录的进程间排他锁，其他进程正在淘汰时返回False"""
+        if fcntl is None:
+            yield True
+            return
+        with open(self._lock_path, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def evict(self) -> int:
+        """
+        缓存超过容量上限时按最近使用时间淘汰
+
+        扫描缓存目录统计总大小并更新本进程的估计值，写入后估计值超过上限或到达扫描间隔时执行，
+        同时清理异常退出的进程遗留的临时文件；其他进程正在淘汰时直接返回
+
+        Returns:
+            淘汰的文件数
+        """
+        with self._exclusive() as acquired:
+            if not acquired:
+                return 0
+            stale_before = time.time() - 3600
+            for entry in os.scandir(self.temp_dir):
+                try:
+                    if entry.stat().st_mtime < stale_before:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+            entries = []
+            total = 0
+            for shard in os.scandir(self.directory):
+                if not shard.is_dir() or shard.path == self.temp_dir:
+                    continue
+                for entry in os.scandir(shard.path):
+                    try:
+                        stat_result = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat_result.st_mtime, stat_result.st_size, entry.path))
+                    total += stat_result.st_size
+            if total <= self.max_bytes:
+                self._set_estimate(total)
+                return 0
+
+            target = self.max_bytes * self.low_watermark
+            evicted = 0
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                evicted += 1
+            self._set_estimate(total)
+            self._count("evictions", evicted)
+            return evicted
+
+    def _set_estimate(self, total: int):
+        with self._stats_lock:
+            self._estimated_bytes = total
+            self._last_scan = time.monotonic()
@@ -0,0 +1,26 @@
+"""
+进程池模块
+为文本提取、OCR等CPU密集型任务提供共享的进程池
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from app.core.config import settings
+
+# 首次使用时才创建，避免导入模块的脚本也启动工作进程
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """获取共享进程池"""
+    global _process_pool
+    # 工作进程异常退出后进程池不再可用（_broken），需要重新创建
+    if _process_pool is None or getattr(_process_pool, "_broken", False):
+        _process_pool = ProcessPoolExecutor(max_workers=settings.EXTRACTION_MAX_WORKERS)
+    return _process_pool
+
+def shutdown_process_pool():
+    """关闭共享进程池"""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
@@ -0,0 +1,98 @@
+"""
+文件预览图工具模块
+为图片生成缩略图，为PDF生成首页预览图
+
+与文本提取相同，这里的函数是CPU密集型的，由预览图服务放到进程池的工作进程中执行，
+只依赖参数中的文件路径
+"""
+
+import os
+from typing import Any, Dict, List
+from app.utils.text_extraction import IMAGE_EXTENSIONS, PDF_EXTENSIONS, _portable_errors
+
+# 预览图生成逻辑变化时递增，旧版本的预览图会重新生成
+RENDITION_VERSION = 1
+
+# 每种预览图同时输出WebP和JPEG，不支持WebP的客户端使用JPEG
+RENDITION_FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpg": ("JPEG", "image/jpeg")
+}
+
+def has_renditions(file_name: str) -> bool:
+    """判断文件类型是否生成预览图（图片和PDF）"""
+    return os.path.splitext(file_name)[1].lower() in IMAGE_EXTENSIONS | PDF_EXTENSIONS
+
+def _open_source(file_path: str, file_name: str, max_edge: int):
+    """打开原图，PDF按最长边不超过max_edge栅格化首页"""
+    from PIL import Image, ImageOps
+
+    if os.path.splitext(file_name)[1].lower() in PDF_EXTENSIONS:
+        import fitz
+
+        with fitz.open(file_path) as document:
+            page = document[0]
+            zoom = max_edge / max(page.rect.width, page.rect.height)
+            pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            return Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+
+    with Image.open(file_path) as image:
+        # 大图只按需要的尺寸解码，GIF取第一帧
+        image.draft("RGB", (max_edge, max_edge))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+        return image
+
+def _flatten(image):
+    """把带透明通道的图片合成到白色背景上，JPEG不支持透明"""
+    from PIL import Image
+
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+@_portable_errors
+def render_renditions(file_path: str, file_name: str, output_dir: str, base_name: str,
+                      sizes: Dict[str, int], quality: int) -> List[Dict[str, Any]]:
+    """
+    生成预览图
+
+    Args:
+        file_path: 本地文件路径
+        file_name: 原始文件名，用于判断文件类型
+        output_dir: 预览图输出目录
+        base_name: 预览图文件名前缀，输出文件名为 {base_name}.{kind}.{ext}
+        sizes: 预览图种类到最长边像素数的映射，如{"thumbnail": 256, "preview": 1024}
+        quality: WebP和JPEG的压缩质量
+
+    Returns:
+        预览图列表，每项包含kind、format、path、width、height和content_type
+
+    Raises:
+        ValueError: 文件类型不支持
+    """
+    from PIL import Image
+
+    if not has_renditions(file_name):
+        raise ValueError(f"不支持生成预览图的文件类型: {file_name}")
+
+    source = _flatten(_open_source(file_path, file_name, max(sizes.values())))
+    renditions = []
+    # 从大到小依次缩小，每次都基于上一级结果，避免重复处理原图
+    for kind, max_edge in sorted(sizes.items(), key=lambda item: item[1], reverse=True):
+        source.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        for ext, (image_format, content_type) in RENDITION_FORMATS.items():
+            path = os.path.join(output_dir, f"{base_name}.{kind}.{ext}")
+            source.save(path, image_format, quality=quality, optimize=image_format == "JPEG")
+            renditions.append({
+                "kind": kind,
+                "format": ext,
+                "path": path,
+                "width": source.width,
+                "height": source.height,
+                "content_type": content_type
+            })
+    return renditions
@@ -0,0 +1,209 @@
+"""
+段落检索工具模块
+对文档分段并建立BM25倒排索引，中文按字符二元组切分，英文和数字按词切分
+"""
+
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Any, Tuple
+
+# 中文字符连续片段，或英文/数字单词
+_TOKEN_PATTERN = re.compile(r"[㐀-䶿一-鿿豈-﫿]+|[a-z0-9]+(?:\.[0-9]+)*")
+_CJK_PATTERN = re.compile(r"[㐀-䶿一-鿿豈-﫿]")
+# 分段时优先在这些位置断开
+_BREAK_PATTERN = re.compile(r"\n+|(?<=[。！？；!?;])")
+
+def tokenize(text: str) -> List[str]:
+    """
+    切分词项
+
+    中文没有空格分词，按相邻两个字符组成二元组；单个汉字的片段保留单字，
+    英文转为小写后按单词切分
+
+    Args:
+        text: 文本
+
+    Returns:
+        词项列表
+    """
+    tokens = []
+    for run in _TOKEN_PATTERN.findall(text.lower()):
+        if _CJK_PATTERN.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+def chunk_text(text: str, chunk_size: int = 400, overlap: int = 80) -> List[str]:
+    """
+    把文本切分为段落
+
+    尽量在换行和句末标点处断开，相邻段落重叠overlap个字符，避免关键信息被切断
+
+    Args:
+        text: 文本
+        chunk_size: 每段的目标字符数
+        overlap: 相邻段落重叠的字符数
+
+    Returns:
+        段落列表
+    """
+    overlap = min(overlap, chunk_size // 2)
+    sentences = [s for s in _BREAK_PATTERN.split(text) if s and s.strip()]
+    chunks = []
+    current = ""
+    # current开头从上一段带过来的重叠字符数
+    carried = 0
+    for sentence in sentences:
+        if len(current) + len(sentence) > chunk_size and len(current) > carried:
+            chunks.append(current)
+            current = current[len(current) - overlap:] if overlap else ""
+            carried = len(current)
+        current += sentence
+        # 超长句子硬切分
+        while len(current) > chunk_size:
+            chunks.append(current[:chunk_size])
+            current = current[chunk_size - overlap:]
+            carried = overlap
+    if len(current) > carried:
+        chunks.append(current)
+    return [chunk.strip() for chunk in chunks if chunk.strip()]
+
+class BM25Index:
+    """
+    BM25段落索引
+
+    支持增量添加和删除文档，每个文档切分为多个段落分别计分；
+    读写使用同一把锁，可以在线程中建立索引的同时在其他线程查询
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, chunk_size: int = 400, overlap: int = 80):
+        """
+        初始化索引
+
+        Args:
+            k1: 词频饱和参数
+            b: 段落长度归一化参数
+            chunk_size: 每段的目标字符数
+            overlap: 相邻段落重叠的字符数
+        """
+        self.k1 = k1
+        self.b = b
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        # 词项 -> {段落序号: 词频}
+        self._postings: Dict[str, Dict[int, int]] = {}
+        # 段落序号 -> (文档ID, 文档名, 段落在文档中的序号, 段落文本, 段落长度, 段落词项)
+        self._passages: Dict[int, Tuple[str, str, int, str, int, Tuple[str, ...]]] = {}
+        # 文档ID -> 段落序号列表
+        self._documents: Dict[str, List[int]] = {}
+        self._next_id = 0
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._documents
+
+    @property
+    def document_ids(self) -> List[str]:
+        """已索引的文档ID"""
+        return list(self._documents)
+
+    @property
+    def passage_count(self) -> int:
+        """已索引的段落数"""
+        return len(self._passages)
+
+    def add_document(self, doc_id: str, name: str, text: str) -> int:
+        """
+        添加文档，已存在的同ID文档先删除
+
+        分段和切分词项在加锁前完成，只有写入倒排表时持有锁
+
+        Args:
+            doc_id: 文档ID
+            name: 文档名
+            text: 文档文本
+
+        Returns:
+            文档的段落数
+        """
+        chunks = chunk_text(text, self.chunk_size, self.overlap)
+        analyzed = [(chunk, Counter(tokenize(chunk))) for chunk in chunks]
+
+        with self._lock:
+            self._remove_locked(doc_id)
+            passage_ids = []
+            for position, (chunk, counts) in enumerate(analyzed):
+                passage_id = self._next_id
+                self._next_id += 1
+                length = sum(counts.values())
+                self._passages[passage_id] = (doc_id, name, position, chunk, length, tuple(counts))
+                self._total_length += length
+                for term, tf in counts.items():
+                    self._postings.setdefault(term, {})[passage_id] = tf
+                passage_ids.append(passage_id)
+            self._documents[doc_id] = passage_ids
+        return len(passage_ids)
+
+    def _remove_locked(self, doc_id: str):
+        for passage_id in self._documents.pop(doc_id, []):
+            _, _, _, _, length, terms = self._passages.pop(passage_id)
+            self._total_length -= length
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(passage_id, None)
+                    if not postings:
+                        del self._postings[term]
+
+    def remove_document(self, doc_id: str):
+        """
+        删除文档
+
+        Args:
+            doc_id: 文档ID
+        """
+        with self._lock:
+            self._remove_locked(doc_id)
+
+    def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        """
+        查询与问题最相关的段落
+
+        Args:
+            query: 查询文本
+            k: 返回的段落数
+
+        Returns:
+            按得分从高到低排列的段落，每项包含doc_id、name、position、text和score
+        """
+        terms = Counter(tokenize(query))
+        with self._lock:
+            count = len(self._passages)
+            if not count or not terms:
+                return []
+            average_length = self._total_length / count
+            scores: Dict[int, float] = {}
+            for term, query_tf in terms.items():
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for passage_id, tf in postings.items():
+                    length = self._passages[passage_id][4]
+                    norm = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / average_length))
+                    scores[passage_id] = scores.get(passage_id, 0.0) + idf * norm * query_tf
+
+            top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            results = []
+            for passage_id, score in top:
+                doc_id, name, position, chunk = self._passages[passage_id][:4]
+                results.append({"doc_id": doc_id, "name": name, "position": position, "text": chunk, "score": score})
+            return results
@@ -0,0 +1,194 @@
+"""
+静态文件响应模块
+为本地上传目录中的文件提供支持Range、ETag和条件请求的响应
+
+文件在线程中按块读取，任意时刻只在内存中保留一个数据块。
+没有使用ASGI的zerocopysend扩展：uvicorn不支持该扩展，按块读取是实际运行的唯一路径
+"""
+
+import os
+import stat
+import weakref
+import mimetypes
+from email.utils import formatdate
+from typing import Dict, Optional, Tuple
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+# 按块读取时每块的大小
+CHUNK_SIZE = 256 * 1024
+# 存储名唯一，内容不会变化，允许客户端和CDN长期缓存
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def make_etag(stat_result: os.stat_result) -> str:
+    """
+    生成强ETag
+
+    上传目录中的文件写入后只会整体替换（os.replace）而不会原地修改，
+    inode、大小和修改时间确定唯一的内容
+    """
+    return f'"{stat_result.st_ino:x}-{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+def etag_matches(header: str, etag: str) -> bool:
+    """判断If-None-Match请求头是否匹配ETag，按弱比较忽略W/前缀"""
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析Range请求头
+
+    只支持单个范围；多个范围或格式不正确时返回None，按完整文件响应
+
+    Args:
+        header: Range请求头，如"bytes=0-1023"、"bytes=1024-"、"bytes=-500"
+        size: 文件大小
+
+    Returns:
+        (起始位置, 结束位置)，包含两端；需要忽略Range时返回None
+
+    Raises:
+        ValueError: 范围无法满足
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    start_text, _, end_text = ranges.strip().partition("-")
+    if (start_text and not start_text.isdigit()) or (end_text and not end_text.isdigit()) \
+            or not (start_text or end_text):
+        return None
+    if not start_text:
+        # 后缀范围：最后N个字节
+        length = int(end_text)
+        if length == 0 or size == 0:
+            raise ValueError("范围无法满足")
+        return max(size - length, 0), size - 1
+    start = int(start_text)
+    if end_text and int(end_text) < start:
+        return None
+    if start >= size:
+        raise ValueError("范围无法满足")
+    end = int(end_text) if end_text else size - 1
+    return start, min(end, size - 1)
+
+class FileRangeResponse(Response):
+    """
+    支持单个字节范围的文件响应
+
+    使用os.pread按位置读取，同一文件的并发请求不共享文件偏移；
+    响应持有file_response打开的文件描述符，发送完成后关闭；
+    响应没有被发送（如中间件替换了响应或请求在发送前被取消）时，在响应对象回收时关闭
+    """
+
+    def __init__(self, fd: int, path: str, stat_result: os.stat_result, status_code: int = 200,
+                 byte_range: Optional[Tuple[int, int]] = None, headers: Optional[Dict[str, str]] = None,
+                 media_type: Optional[str] = None, send_body: bool = True):
+        """
+        初始化文件响应
+
+        Args:
+            fd: 已打开的文件描述符，由响应负责关闭
+            path: 文件路径，用于推断内容类型
+            stat_result: 文件状态，用于计算长度
+            status_code: 响应状态码，范围请求为206
+            byte_range: 发送的字节范围(起始, 结束)，包含两端，为None时发送整个文件
+            headers: 附加响应头
+            media_type: 内容类型，为None时按扩展名推断
+            send_body: 是否发送响应体，HEAD请求为False
+        """
+        self.fd = fd
+        # finalize只执行一次：发送完成时主动调用，未发送时随响应对象回收
+        self._close_fd = weakref.finalize(self, os.close, fd)
+        self.path = path
+        self.status_code = status_code
+        self.send_body = send_body
+        self.offset, end = byte_range or (0, stat_result.st_size - 1)
+        self.count = max(end - self.offset + 1, 0)
+        self.media_type = media_type or mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.background = None
+        self.init_headers(headers)
+        self.headers["content-length"] = str(self.count)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        fd = self.fd
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if not self.send_body or not self.count:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                return
+            position, remaining = self.offset, self.count
+            while remaining > 0:
+                chunk = await anyio.to_thread.run_sync(os.pread, fd, min(CHUNK_SIZE, remaining), position)
+                if not chunk:
+                    # 文件被截断，已发送的长度无法更改，只能提前结束
+                    break
+                position += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            self._close_fd()
+
+def file_response(path: str, method: str, request_headers: Dict[str, str]) -> Response:
+    """
+    根据请求头生成文件响应
+
+    处理If-None-Match（304）、Range和If-Range（206/416），其余情况返回完整文件
+
+    Args:
+        path: 文件路径，调用方需确保路径安全
+        method: 请求方法，GET或HEAD
+        request_headers: 请求头
+
+    Returns:
+        响应对象
+
+    Raises:
+        FileNotFoundError: 文件不存在或不是普通文件
+    """
+    # 先打开文件再读取状态，之后文件被删除或替换时仍然发送打开时的内容
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        response = _fd_response(fd, path, method, request_headers)
+    except BaseException:
+        os.close(fd)
+        raise
+    if not isinstance(response, FileRangeResponse):
+        os.close(fd)
+    return response
+
+def _fd_response(fd: int, path: str, method: str, request_headers: Dict[str, str]) -> Response:
+    """根据已打开文件的状态生成响应，见file_response"""
+    stat_result = os.fstat(fd)
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise FileNotFoundError(path)
+    etag = make_etag(stat_result)
+    headers = {
+        "etag": etag,
+        "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "cache-control": IMMUTABLE_CACHE_CONTROL,
+        "accept-ranges": "bytes"
+    }
+
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    send_body = method != "HEAD"
+    range_header = request_headers.get("range")
+    if_range = request_headers.get("if-range")
+    # If-Range不匹配说明客户端缓存的是旧内容，返回完整文件
+    if range_header and (not if_range or if_range.strip() == etag):
+        size = stat_result.st_size
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+        if byte_range:
+            start, end = byte_range
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+            return FileRangeResponse(fd, path, stat_result, 206, byte_range, headers, send_body=send_body)
+    return FileRangeResponse(fd, path, stat_result, 200, None, headers, send_body=send_body)
@@ -0,0 +1,388 @@
+"""
+法条索引模块
+法律法规条文的紧凑磁盘格式：条文存储、条号索引和BM25倒排索引放在同一个文件中，
+通过mmap只读映射，多个工作进程共享操作系统的页缓存，而不是各自加载一份
+
+文件格式（所有整数为小端序，各区段按8字节对齐）:
+    magic(8字节) | 元数据长度(uint32) | 元数据(JSON) | 各区段
+
+区段:
+    article_offsets  uint64 * (N+1)   条文记录在article_data中的偏移
+    article_data     UTF-8            每条记录为 法规名\\x1f条号\\x1f条文标签\\x1f条文
+    doc_lengths      uint32 * N       条文的词项数
+    key_offsets      uint64 * (K+1)   条号键在key_data中的偏移，键按UTF-8字节序排列
+    key_data         UTF-8            条号键，格式为 规范化法规名#条号
+    key_values       uint32 * K       条号键对应的条文序号
+    term_offsets     uint64 * (T+1)   词项在term_data中的偏移，词项按UTF-8字节序排列
+    term_data        UTF-8            词项
+    term_postings    uint64 * T       词项倒排表在postings中的起始位置（以条目计）
+    term_counts      uint32 * T       词项倒排表的条目数
+    postings         uint32 * 2 * P   倒排表条目（条文序号, 词频）
+"""
+
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+from array import array
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from app.utils.retrieval import tokenize
+
+MAGIC = b"LAWIDX1\0"
+FORMAT_VERSION = 1
+_SEPARATOR = "\x1f"
+
+_CHINESE_DIGITS = {"零": 0, "〇": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4,
+                   "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+_CHINESE_UNITS = {"十": 10, "百": 100, "千": 1000, "万": 10000}
+_NUMERAL = "零〇一二两三四五六七八九十百千万0-9"
+
+# 条文标题，如“第五百七十七条”
+ARTICLE_HEADING_PATTERN = re.compile(rf"^\s*(第([{_NUMERAL}]+)条)\s*(.*)$")
+# 文本中的条文引用，如“《民法典》第五百七十七条”“民法典第577条”
+CITATION_PATTERN = re.compile(
+    rf"《?([一-鿿]{{2,30}}?(?:法典|法|条例|规定|解释|办法|决定))》?\s*第([{_NUMERAL}]+)条"
+)
+
+def chinese_to_int(numeral: str) -> int:
+    """
+    把中文或阿拉伯数字条号转换为整数，如“五百七十七”转换为577
+
+    Raises:
+        ValueError: 无法识别的数字
+    """
+    if numeral.isdigit():
+        return int(numeral)
+    total, section, number = 0, 0, 0
+    for char in numeral:
+        if char in _CHINESE_DIGITS:
+            number = _CHINESE_DIGITS[char]
+        elif char in _CHINESE_UNITS:
+            unit = _CHINESE_UNITS[char]
+            if unit == 10000:
+                total += (section + number) * unit
+                section = 0
+            else:
+                # “十二”中的“十”前面没有数字，按一十处理
+                section += (number or 1) * unit
+            number = 0
+        else:
+            raise ValueError(f"无法识别的条号: {numeral}")
+    return total + section + number
+
+def normalize_law_name(name: str) -> str:
+    """规范化法规名：去掉书名号、空白和“中华人民共和国”前缀"""
+    name = re.sub(r"[《》\s]", "", name)
+    if name.startswith("中华人民共和国"):
+        name = name[len("中华人民共和国"):]
+    return name
+
+def article_key(law: str, number: int) -> str:
+    """条号索引的键"""
+    return f"{normalize_law_name(law)}#{number}"
+
+def parse_statute_text(law: str, text: str) -> List[Dict[str, Any]]:
+    """
+    按“第X条”标题把法规全文切分为条文
+
+    Args:
+        law: 法规名
+        text: 法规全文
+
+    Returns:
+        条文列表，每项包含law、number、label和text
+    """
+    articles = []
+    current = None
+    for line in text.splitlines():
+        match = ARTICLE_HEADING_PATTERN.match(line)
+        if match:
+            if current:
+                articles.append(current)
+            current = {"law": law, "number": chinese_to_int(match.group(2)), "label": match.group(1), "text": match.group(3)}
+        elif current and line.strip():
+            current["text"] += "\n" + line.strip()
+    if current:
+        articles.append(current)
+    return articles
+
+def _align(buffer: bytearray):
+    buffer.extend(b"\0" * (-len(buffer) % 8))
+
+def _string_table(strings: List[bytes]) -> Tuple[bytes, bytes]:
+    offsets = array("Q", [0])
+    for value in strings:
+        offsets.append(offsets[-1] + len(value))
+    return offsets.tobytes(), b"".join(strings)
+
+def build_index(articles: Iterable[Dict[str, Any]], output_path: str) -> Dict[str, Any]:
+    """
+    建立法条索引文件
+
+    先写入临时文件再重命名，正在读取旧索引的进程不受影响
+
+    Args:
+        articles: 条文列表，每项包含law、number、label和text
+        output_path: 索引文件路径
+
+    Returns:
+        索引的元数据
+    """
+    records = []
+    doc_lengths = array("I")
+    keys: Dict[bytes, int] = {}
+    postings: Dict[bytes, List[Tuple[int, int]]] = {}
+    for article in articles:
+        article_id = len(records)
+        law = article["law"]
+        label = article.get("label") or f"第{article['number']}条"
+        records.append(_SEPARATOR.join([law, str(article["number"]), label, article["text"]]).encode("utf-8"))
+        keys.setdefault(article_key(law, article["number"]).encode("utf-8"), article_id)
+        counts = Counter(tokenize(f"{normalize_law_name(law)} {article['text']}"))
+        doc_lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            postings.setdefault(term.encode("utf-8"), []).append((article_id, min(tf, 0xFFFFFFFF)))
+
+    sorted_keys = sorted(keys)
+    sorted_terms = sorted(postings)
+    term_postings = array("Q")
+    term_counts = array("I")
+    posting_data = array("I")
+    for term in sorted_terms:
+        entries = postings[term]
+        term_postings.append(len(posting_data) // 2)
+        term_counts.append(len(entries))
+        for article_id, tf in entries:
+            posting_data.append(article_id)
+            posting_data.append(tf)
+
+    article_offsets, article_data = _string_table(records)
+    key_offsets, key_data = _string_table(sorted_keys)
+    term_offsets, term_data = _string_table(sorted_terms)
+    sections = [
+        ("article_offsets", article_offsets),
+        ("article_data", article_data),
+        ("doc_lengths", doc_lengths.tobytes()),
+        ("key_offsets", key_offsets),
+        ("key_data", key_data),
+        ("key_values", array("I", [keys[key] for key in sorted_keys]).tobytes()),
+        ("term_offsets", term_offsets),
+        ("term_data", term_data),
+        ("term_postings", term_postings.tobytes()),
+        ("term_counts", term_counts.tobytes()),
+        ("postings", posting_data.tobytes()),
+    ]
+
+    meta: Dict[str, Any] = {
+        "version": FORMAT_VERSION,
+        "articles": len(records),
+        "keys": len(sorted_keys),
+        "terms": len(sorted_terms),
+        "average_length": (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0,
+        "sections": {}
+    }
+    # 元数据中包含各区段的位置，位置又依赖元数据长度，先用占位长度计算
+    header_length = 0
+    while True:
+        position = len(MAGIC) + 4 + header_length
+        position += -position % 8
+        for name, data in sections:
+            meta["sections"][name] = [position, len(data)]
+            position += len(data) + (-len(data) % 8)
+        encoded = json.dumps(meta).encode("utf-8")
+        if len(encoded) == header_length:
+            break
+        header_length = len(encoded)
+
+    body = bytearray(MAGIC)
+    body.extend(struct.pack("<I", len(encoded)))
+    body.extend(encoded)
+    _align(body)
+    for name, data in sections:
+        assert len(body) == meta["sections"][name][0]
+        body.extend(data)
+        _align(body)
+
+    temp_path = f"{output_path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(body)
+    os.replace(temp_path, output_path)
+    return meta
+
+class StatuteIndex:
+    """
+    只读的法条索引
+
+    所有数据通过mmap访问，打开索引只解析元数据，不把条文或倒排表加载到进程内存
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        """
+        打开索引文件
+
+        Args:
+            path: 索引文件路径
+            k1: BM25词频饱和参数
+            b: BM25长度归一化参数
+
+        Raises:
+            ValueError: 文件格式不正确
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"不是有效的法条索引文件: {path}")
+        meta_length = struct.unpack_from("<I", self._mmap, len(MAGIC))[0]
+        start = len(MAGIC) + 4
+        self.meta = json.loads(self._mmap[start:start + meta_length].decode("utf-8"))
+        if self.meta["version"] != FORMAT_VERSION:
+            self._mmap.close()
+            raise ValueError(f"不支持的法条索引版本: {self.meta['version']}")
+
+        self._view = memoryview(self._mmap)
+        self._article_offsets = self._section("article_offsets", "Q")
+        self._article_data = self._section("article_data")
+        self._doc_lengths = self._section("doc_lengths", "I")
+        self._key_offsets = self._section("key_offsets", "Q")
+        self._key_data = self._section("key_data")
+        self._key_values = self._section("key_values", "I")
+        self._term_offsets = self._section("term_offsets", "Q")
+        self._term_data = self._section("term_data")
+        self._term_postings = self._section("term_postings", "Q")
+        self._term_counts = self._section("term_counts", "I")
+        self._postings = self._section("postings", "I")
+
+    def _section(self, name: str, typecode: Optional[str] = None) -> memoryview:
+        offset, length = self.meta["sections"][name]
+        view = self._view[offset:offset + length]
+        return view.cast(typecode) if typecode else view
+
+    def close(self):
+        """关闭索引"""
+        for name in list(vars(self)):
+            if isinstance(getattr(self, name), memoryview):
+                getattr(self, name).release()
+        self._mmap.close()
+
+    def __len__(self) -> int:
+        return self.meta["articles"]
+
+    def article(self, article_id: int) -> Dict[str, Any]:
+        """
+        按序号读取条文
+
+        Returns:
+            条文，包含law、number、label和text
+        """
+        start, end = self._article_offsets[article_id], self._article_offsets[article_id + 1]
+        law, number, label, text = bytes(self._article_data[start:end]).decode("utf-8").split(_SEPARATOR, 3)
+        return {"law": law, "number": int(number), "label": label, "text": text}
+
+    @staticmethod
+    def _bisect(offsets: memoryview, data: memoryview, count: int, target: bytes) -> int:
+        """在排序的字符串表中二分查找，返回下标，不存在时返回-1"""
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            value = bytes(data[offsets[middle]:offsets[middle + 1]])
+            if value < target:
+                low = middle + 1
+            elif value > target:
+                high = middle
+            else:
+                return middle
+        return -1
+
+    def lookup(self, law: str, number: Union[int, str]) -> Optional[Dict[str, Any]]:
+        """
+        按法规名和条号查找条文
+
+        Args:
+            law: 法规名，忽略书名号和“中华人民共和国”前缀
+            number: 条号，整数或中文数字（如“五百七十七”“第五百七十七条”）
+
+        Returns:
+            条文，不存在时返回None
+        """
+        if isinstance(number, str):
+            number = chinese_to_int(number.strip().lstrip("第").rstrip("条"))
+        position = self._bisect(
+            self._key_offsets, self._key_data, self.meta["keys"], article_key(law, number).encode("utf-8")
+        )
+        if position < 0:
+            return None
+        return self.article(self._key_values[position])
+
+    def find_citations(self, text: str) -> List[Dict[str, Any]]:
+        """
+        查找文本中引用的条文，如“《民法典》第五百七十七条”
+
+        法规名前面可能带有其他文字（如“根据民法典”），依次去掉开头的字符重试
+
+        Args:
+            text: 文本
+
+        Returns:
+            找到的条文，按出现顺序排列并去重
+        """
+        found = []
+        seen = set()
+        for match in CITATION_PATTERN.finditer(text):
+            try:
+                number = chinese_to_int(match.group(2))
+            except ValueError:
+                continue
+            law = match.group(1)
+            for start in range(len(law) - 1):
+                article = self.lookup(law[start:], number)
+                if article:
+                    key = (article["law"], article["number"])
+                    if key not in seen:
+                        seen.add(key)
+                        found.append(article)
+                    break
+        return found
+
+    def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        """
+        按关键词检索条文，BM25排序
+
+        Args:
+            query: 查询文本
+            k: 返回的条文数
+
+        Returns:
+            条文列表，每项额外包含score
+        """
+        count = self.meta["articles"]
+        if not count:
+            return []
+        average_length = self.meta["average_length"] or 1.0
+        scores: Dict[int, float] = {}
+        for term, query_tf in Counter(tokenize(query)).items():
+            position = self._bisect(self._term_offsets, self._term_data, self.meta["terms"], term.encode("utf-8"))
+            if position < 0:
+                continue
+            df = self._term_counts[position]
+            idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+            start = self._term_postings[position] * 2
+            entries = self._postings[start:start + df * 2]
+            for article_id, tf in zip(entries[0::2], entries[1::2]):
+                length = self._doc_lengths[article_id]
+                norm = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / average_length))
+                scores[article_id] = scores.get(article_id, 0.0) + idf * norm * query_tf
+
+        results = []
+        for article_id, score in heapq.nlargest(k, scores.items(), key=lambda item: item[1]):
+            article = self.article(article_id)
+            article["score"] = score
+            results.append(article)
+        return results
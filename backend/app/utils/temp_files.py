@@ -0,0 +1,54 @@
+"""
+临时文件引用计数模块
+读取到本地的临时副本可能被创建者退出后仍在运行的后台任务使用，引用计数归零时才删除
+"""
+
+import os
+from typing import Dict
+
+# 临时文件路径到引用数的映射，只在事件循环线程中访问
+_refs: Dict[str, int] = {}
+
+def track_temp_file(path: str):
+    """
+    登记新创建的临时文件，创建者持有一个引用
+
+    Args:
+        path: 临时文件路径
+    """
+    _refs[path] = _refs.get(path, 0) + 1
+
+def retain_temp_file(path: str) -> bool:
+    """
+    为仍在使用的临时文件增加一个引用
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        是否为登记过的临时文件；不是时（如本地存储的原文件）不需要释放
+    """
+    if path not in _refs:
+        return False
+    _refs[path] += 1
+    return True
+
+def release_temp_file(path: str):
+    """
+    释放一个引用，引用数归零时删除临时文件
+
+    Args:
+        path: 文件路径
+    """
+    refs = _refs.get(path)
+    if refs is None:
+        return
+    if refs > 1:
+        _refs[path] = refs - 1
+        return
+    del _refs[path]
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    except OSError as e:
+        print(f"[WARNING] 临时文件: 删除 {path} 失败: {str(e)}")
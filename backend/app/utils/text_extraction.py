@@ -0,0 +1,171 @@
+"""
+文本提取工具模块
+从PDF、Word、图片和纯文本文件中提取文本
+
+这里的函数是CPU密集型的，由提取服务放到进程池的工作进程中执行，
+只依赖参数中的文件路径，不访问数据库和全局状态
+"""
+
+import os
+import functools
+from typing import List, Optional
+
+# 提取器版本，提取逻辑变化时递增，使按内容哈希缓存的旧结果失效
+# 版本2：扫描版PDF页面改为OCR识别
+EXTRACTOR_VERSION = 2
+
+# 支持提取文本的文件扩展名
+PDF_EXTENSIONS = {".pdf"}
+DOCX_EXTENSIONS = {".docx"}
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif"}
+TEXT_EXTENSIONS = {".txt"}
+SUPPORTED_EXTENSIONS = PDF_EXTENSIONS | DOCX_EXTENSIONS | IMAGE_EXTENSIONS | TEXT_EXTENSIONS
+
+def _portable_errors(func):
+    """
+    把工作进程中的异常转换为RuntimeError
+
+    部分第三方异常（如pytesseract的异常）无法序列化回主进程，会导致整个进程池不可用
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except ValueError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"{type(e).__name__}: {str(e)}") from None
+    return wrapper
+
+def is_supported(file_name: str) -> bool:
+    """判断文件类型是否支持提取文本"""
+    return os.path.splitext(file_name)[1].lower() in SUPPORTED_EXTENSIONS
+
+def is_paged(file_name: str) -> bool:
+    """判断文件是否按页提取（PDF和图片），按页提取的文件可能需要OCR"""
+    return os.path.splitext(file_name)[1].lower() in PDF_EXTENSIONS | IMAGE_EXTENSIONS
+
+@_portable_errors
+def analyze_pages(file_path: str, file_name: str, min_text_chars: int) -> List[Optional[str]]:
+    """
+    获取每一页的文本层
+
+    Args:
+        file_path: 本地文件路径
+        file_name: 原始文件名，用于判断文件类型
+        min_text_chars: 文本层少于该字符数的页面视为扫描页
+
+    Returns:
+        每一页的文本，需要OCR的页面为None；图片视为一个需要OCR的页面
+    """
+    if os.path.splitext(file_name)[1].lower() in IMAGE_EXTENSIONS:
+        return [None]
+
+    import fitz
+
+    pages = []
+    with fitz.open(file_path) as document:
+        for page in document:
+            text = page.get_text().strip()
+            pages.append(text if len(text) >= min_text_chars else None)
+    return pages
+
+@_portable_errors
+def ocr_page(file_path: str, file_name: str, page_index: int, ocr_lang: str, dpi: int) -> str:
+    """
+    对单个页面进行OCR识别
+
+    PDF页面先按dpi栅格化为图片；每个页面独立执行，可在多个进程中并行
+
+    Args:
+        file_path: 本地文件路径
+        file_name: 原始文件名，用于判断文件类型
+        page_index: 页码，从0开始
+        ocr_lang: tesseract语言
+        dpi: PDF页面栅格化分辨率
+
+    Returns:
+        识别的文本
+    """
+    if os.path.splitext(file_name)[1].lower() in IMAGE_EXTENSIONS:
+        return _extract_image(file_path, ocr_lang).strip()
+
+    import fitz
+    import pytesseract
+    from PIL import Image
+
+    with fitz.open(file_path) as document:
+        pixmap = document[page_index].get_pixmap(dpi=dpi)
+        image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+    return pytesseract.image_to_string(image, lang=ocr_lang).strip()
+
+def _extract_pdf(file_path: str) -> str:
+    """提取PDF文本层"""
+    import fitz
+
+    with fitz.open(file_path) as document:
+        return "\n".join(page.get_text() for page in document)
+
+def _extract_docx(file_path: str) -> str:
+    """提取Word文档的段落和表格文本"""
+    import docx
+
+    document = docx.Document(file_path)
+    parts = [paragraph.text for paragraph in document.paragraphs if paragraph.text]
+    for table in document.tables:
+        for row in table.rows:
+            parts.append("\t".join(cell.text for cell in row.cells))
+    return "\n".join(parts)
+
+def _extract_image(file_path: str, ocr_lang: str) -> str:
+    """对图片进行OCR识别"""
+    import pytesseract
+    from PIL import Image
+
+    with Image.open(file_path) as image:
+        return pytesseract.image_to_string(image, lang=ocr_lang)
+
+def _extract_plain_text(file_path: str) -> str:
+    """读取纯文本文件，依次尝试UTF-8和GB18030编码"""
+    with open(file_path, "rb") as f:
+        data = f.read()
+    for encoding in ("utf-8-sig", "gb18030"):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode("utf-8", errors="replace")
+
+@_portable_errors
+def extract_text(file_path: str, file_name: str, ocr_lang: str = "chi_sim+eng", max_chars: int = 0) -> str:
+    """
+    提取文件文本
+
+    Args:
+        file_path: 本地文件路径
+        file_name: 原始文件名，用于判断文件类型
+        ocr_lang: 图片OCR使用的语言
+        max_chars: 返回文本的最大字符数，为0时不限制
+
+    Returns:
+        提取的文本
+
+    Raises:
+        ValueError: 文件类型不支持
+    """
+    file_ext = os.path.splitext(file_name)[1].lower()
+    if file_ext in PDF_EXTENSIONS:
+        text = _extract_pdf(file_path)
+    elif file_ext in DOCX_EXTENSIONS:
+        text = _extract_docx(file_path)
+    elif file_ext in IMAGE_EXTENSIONS:
+        text = _extract_image(file_path, ocr_lang)
+    elif file_ext in TEXT_EXTENSIONS:
+        text = _extract_plain_text(file_path)
+    else:
+        raise ValueError(f"不支持提取文本的文件类型: {file_ext}")
+
+    text = text.strip()
+    if max_chars and len(text) > max_chars:
+        text = text[:max_chars]
+    return text
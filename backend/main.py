@@ -1,8 +1,10 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import chat, health, cache, upload
+from app.api import chat, health, cache, upload, static, storage
 from app.db.db_config import db_config
 from app.core.config import settings
+from app.utils.cache import init_shared_cache, close_shared_cache
+from app.utils.process_pool import shutdown_process_pool
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -25,17 +27,40 @@ app.include_router(health.router)
 app.include_router(chat.router)
 app.include_router(cache.router)
 app.include_router(upload.router)
+app.include_router(static.router)
+app.include_router(storage.router)
 
 @app.on_event("startup")
 async def startup_event():
     """应用启动时执行的操作"""
     # 连接数据库
     db_config.connect()
+    db_config.connect_async()
     print("数据库连接已建立")
+    # 启用共享缓存并订阅失效广播
+    init_shared_cache()
+    # 重新提取上次关闭前未完成的文件文本
+    try:
+        await upload.file_service.extraction_service.resume_pending()
+    except Exception as e:
+        print(f"[ERROR] 重新提取未完成的文件失败: {str(e)}")
+    # 重新生成上次关闭前未完成的预览图
+    try:
+        await upload.file_service.rendition_service.resume_pending()
+    except Exception as e:
+        print(f"[ERROR] 重新生成未完成的预览图失败: {str(e)}")
+    # 启动定期孤儿文件回收
+    storage.orphan_collector.start()
+    # 启动已删除会话的后台清理
+    storage.session_purger.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """应用关闭时执行的操作"""
+    await storage.session_purger.stop()
+    await storage.orphan_collector.stop()
+    close_shared_cache()
+    shutdown_process_pool()
     # 断开数据库连接
     db_config.disconnect()
     print("数据库连接已关闭")
@@ -0,0 +1,121 @@
+"""
+测试公共夹具
+用mongomock替代MongoDB，并可以为每次数据库往返注入延迟，模拟真实的网络I/O
+"""
+
+import asyncio
+import time
+import mongomock
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from app.core.config import settings
+from app.db.db_config import db_config
+from app.services.file_service import FileService
+
+class Latency:
+    """每次数据库往返的模拟延迟（秒）"""
+
+    def __init__(self):
+        self.seconds = 0.0
+
+class _AsyncCursor:
+    """在首次读取时等待模拟延迟的异步游标"""
+
+    def __init__(self, cursor, latency: Latency):
+        self._cursor = cursor
+        self._latency = latency
+
+    def __getattr__(self, name):
+        attr = getattr(self._cursor, name)
+        if name in ("sort", "skip", "limit"):
+            def chain(*args, **kwargs):
+                attr(*args, **kwargs)
+                return self
+            return chain
+        return attr
+
+    async def to_list(self, length=None):
+        await asyncio.sleep(self._latency.seconds)
+        return await self._cursor.to_list(length)
+
+    async def __aiter__(self):
+        await asyncio.sleep(self._latency.seconds)
+        async for item in self._cursor:
+            yield item
+
+class _AsyncCollection:
+    """每个异步操作前等待模拟延迟的motor集合"""
+
+    def __init__(self, collection, latency: Latency):
+        self._collection = collection
+        self._latency = latency
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name == "find":
+            return lambda *args, **kwargs: _AsyncCursor(attr(*args, **kwargs), self._latency)
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            await asyncio.sleep(self._latency.seconds)
+            return await attr(*args, **kwargs)
+        return call
+
+class _AsyncDatabase:
+    def __init__(self, db, latency: Latency):
+        self._db = db
+        self._latency = latency
+
+    def __getitem__(self, name):
+        return _AsyncCollection(self._db[name], self._latency)
+
+class _SyncCollection:
+    """每个操作前阻塞等待模拟延迟的pymongo集合"""
+
+    def __init__(self, collection, latency: Latency):
+        self._collection = collection
+        self._latency = latency
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            time.sleep(self._latency.seconds)
+            return attr(*args, **kwargs)
+        return call
+
+@pytest.fixture
+def mock_db(monkeypatch):
+    """
+    让db_config的同步和异步集合都指向同一个mongomock数据库
+
+    Returns:
+        Latency，设置seconds后每次数据库往返等待该时长
+    """
+    latency = Latency()
+    sync_client = mongomock.MongoClient()
+    # 异步客户端包装同一个mongomock客户端，同步和异步仓库看到同一份数据
+    async_client = AsyncMongoMockClient(mock_mongo_client=sync_client)
+    async_db = async_client[db_config.db_name]
+    sync_db = sync_client[db_config.db_name]
+    monkeypatch.setattr(db_config, "client", sync_client)
+    monkeypatch.setattr(db_config, "db", sync_db)
+    monkeypatch.setattr(db_config, "chat_collection", _SyncCollection(sync_db["chat_messages"], latency))
+    monkeypatch.setattr(db_config, "_files_collection", _SyncCollection(sync_db["files"], latency))
+    monkeypatch.setattr(db_config, "_sessions_collection", _SyncCollection(sync_db["sessions"], latency))
+    monkeypatch.setattr(db_config, "async_client", async_client)
+    monkeypatch.setattr(db_config, "async_db", _AsyncDatabase(async_db, latency))
+    return latency
+
+@pytest.fixture
+def file_service(mock_db, tmp_path, monkeypatch):
+    """使用进程内存储后端的文件服务，不运行后台文本提取和预览图生成"""
+    monkeypatch.setattr(settings, "STORAGE_BACKEND", "memory")
+    monkeypatch.setattr(settings, "STORAGE_LOCAL_DIR", str(tmp_path / "uploads"))
+    service = FileService()
+    monkeypatch.setattr(service.extraction_service, "schedule", lambda file_info: None)
+    monkeypatch.setattr(service.rendition_service, "schedule", lambda file_info: None)
+    return service
@@ -0,0 +1,134 @@
+"""
+异步桥接测试
+验证消费者提前退出时关闭上游并停止生产者线程，以及有界队列的背压
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from app.utils.async_bridge import iterate_in_thread
+
+class _Upstream:
+    """无限产生数据的上游流，记录读取次数和是否被关闭"""
+
+    def __init__(self):
+        self.produced = 0
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self.lock:
+            if self.closed:
+                raise StopIteration
+            self.produced += 1
+            return self.produced
+
+def _close(upstream: _Upstream):
+    with upstream.lock:
+        upstream.closed = True
+
+async def _producer_stopped(executor: ThreadPoolExecutor):
+    """单线程的线程池中排在生产者之后的任务能执行，说明生产者已经结束"""
+    loop = asyncio.get_running_loop()
+    await asyncio.wait_for(loop.run_in_executor(executor, lambda: None), timeout=2)
+
+def test_early_close_cancels_upstream_and_stops_producer():
+    upstream = _Upstream()
+    cancelled = []
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    def on_cancel(iterator):
+        cancelled.append(iterator)
+        _close(iterator)
+
+    async def run():
+        chunks = iterate_in_thread(lambda: upstream, maxsize=4, executor=executor, on_cancel=on_cancel)
+        received = [await chunks.__anext__() for _ in range(3)]
+        await chunks.aclose()
+        await _producer_stopped(executor)
+        return received
+
+    try:
+        assert asyncio.run(run()) == [1, 2, 3]
+    finally:
+        executor.shutdown(wait=False)
+    assert cancelled == [upstream]
+    assert upstream.closed
+    # 已读取的数据不超过消费数 + 队列长度 + 一个阻塞中的元素
+    assert upstream.produced <= 3 + 4 + 1
+
+def test_cancelled_consumer_task_closes_upstream():
+    upstream = _Upstream()
+    cancelled = []
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    async def consume(chunks):
+        # 与AIService相同，消费者在finally中关闭桥接
+        try:
+            async for _ in chunks:
+                await asyncio.sleep(0.01)
+        finally:
+            await chunks.aclose()
+
+    async def run():
+        chunks = iterate_in_thread(lambda: upstream, maxsize=2, executor=executor, on_cancel=cancelled.append)
+        task = asyncio.ensure_future(consume(chunks))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await _producer_stopped(executor)
+
+    try:
+        asyncio.run(run())
+    finally:
+        executor.shutdown(wait=False)
+    assert cancelled == [upstream]
+
+def test_bounded_queue_blocks_producer():
+    upstream = _Upstream()
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    async def run():
+        chunks = iterate_in_thread(lambda: upstream, maxsize=2, executor=executor, on_cancel=_close)
+        assert await chunks.__anext__() == 1
+        # 消费者暂停期间生产者阻塞在队列上，不会继续读取上游
+        await asyncio.sleep(0.3)
+        blocked_at = upstream.produced
+        assert blocked_at <= 1 + 2 + 1
+        await asyncio.sleep(0.2)
+        assert upstream.produced == blocked_at
+
+        # 继续消费后生产者恢复读取
+        received = [await chunks.__anext__() for _ in range(10)]
+        assert received == list(range(2, 12))
+        assert upstream.produced >= 11
+        await chunks.aclose()
+        await _producer_stopped(executor)
+
+    try:
+        asyncio.run(run())
+    finally:
+        executor.shutdown(wait=False)
+
+def test_upstream_error_reaches_consumer_without_cancel():
+    cancelled = []
+
+    def failing():
+        yield "first"
+        raise ConnectionError("上游连接中断")
+
+    async def run():
+        received = []
+        with pytest.raises(ConnectionError):
+            async for item in iterate_in_thread(failing, on_cancel=cancelled.append):
+                received.append(item)
+        return received
+
+    assert asyncio.run(run()) == ["first"]
+    # 上游自行结束或出错时不需要关闭
+    assert cancelled == []
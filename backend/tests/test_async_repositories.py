@@ -0,0 +1,82 @@
+"""
+异步仓库测试
+验证异步仓库的读写结果，以及并发请求的数据库I/O不会串行阻塞事件循环
+"""
+
+import asyncio
+import time
+from app.crud.chat_repository import AsyncChatRepository, ChatRepository
+
+# 每次数据库往返的模拟延迟和并发请求数
+LATENCY = 0.05
+CONCURRENCY = 20
+
+async def _max_loop_stall(work) -> float:
+    """运行work的同时每毫秒检查一次事件循环，返回事件循环被阻塞的最长时间"""
+    stall = 0.0
+    done = asyncio.Event()
+
+    async def heartbeat():
+        nonlocal stall
+        last = time.monotonic()
+        while not done.is_set():
+            await asyncio.sleep(0.001)
+            now = time.monotonic()
+            stall = max(stall, now - last)
+            last = now
+
+    monitor = asyncio.create_task(heartbeat())
+    # 先让心跳任务开始计时
+    await asyncio.sleep(0)
+    try:
+        await work()
+    finally:
+        done.set()
+        await monitor
+    return stall
+
+def test_async_chat_repository_round_trip(mock_db):
+    async def run():
+        repository = AsyncChatRepository()
+        await repository.add_chat_message("s1", "u1", "user", "你好")
+        await repository.add_chat_message("s1", "u1", "assistant", "您好")
+        messages = await repository.get_chat_messages("s1", "u1")
+        sessions = await repository.get_user_sessions("u1")
+        return messages, sessions
+
+    messages, sessions = asyncio.run(run())
+    assert [m["content"] for m in messages] == ["你好", "您好"]
+    assert sessions[0]["session_id"] == "s1"
+    assert sessions[0]["message_count"] == 2
+
+def test_concurrent_chat_requests_overlap_db_io(mock_db):
+    mock_db.seconds = LATENCY
+    repository = AsyncChatRepository()
+
+    async def request(index: int):
+        # 一次对话请求的数据库操作：读取历史、写入用户消息和回复
+        await repository.get_chat_messages(f"s{index}", "u1")
+        await repository.add_chat_message(f"s{index}", "u1", "user", "问题")
+        await repository.add_chat_message(f"s{index}", "u1", "assistant", "回答")
+
+    async def run():
+        start = time.monotonic()
+        stall = await _max_loop_stall(lambda: asyncio.gather(*(request(i) for i in range(CONCURRENCY))))
+        return time.monotonic() - start, stall
+
+    elapsed, stall = asyncio.run(run())
+    # 每个请求5次数据库往返：串行执行需要CONCURRENCY * 5 * LATENCY秒
+    serial = CONCURRENCY * 5 * LATENCY
+    assert elapsed < serial / 4
+    assert stall < LATENCY
+
+def test_sync_repository_blocks_event_loop(mock_db):
+    """对照：在协程中直接调用同步仓库时，每次数据库往返都会阻塞事件循环"""
+    mock_db.seconds = LATENCY
+    repository = ChatRepository()
+
+    async def request():
+        repository.add_chat_message("s1", "u1", "user", "问题")
+
+    stall = asyncio.run(_max_loop_stall(request))
+    assert stall >= LATENCY
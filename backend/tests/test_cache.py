@@ -0,0 +1,123 @@
+"""
+两级缓存测试
+验证共享L2的版本号检查和JSON序列化
+"""
+
+import asyncio
+import pickle
+import threading
+import time
+from datetime import datetime
+import pytest
+from app.utils.cache import TieredCache, CacheEntry, HistoryWindow, InstrumentedTTLCache
+from app.utils.cache_backends import InMemoryCacheBackend, SharedCacheBackend
+
+@pytest.fixture
+def backend():
+    return InMemoryCacheBackend()
+
+def test_shared_value_round_trip(backend):
+    worker_a = TieredCache("history", maxsize=10, ttl=60, shared=backend)
+    worker_b = TieredCache("history", maxsize=10, ttl=60, shared=backend)
+    message = {"_id": "1", "content": "你好", "timestamp": datetime(2024, 1, 2, 3, 4, 5)}
+    entry = CacheEntry(HistoryWindow(50, [message]), time.time())
+
+    assert worker_a.put(("session:s1", "u1"), entry)
+    value = worker_b[("session:s1", "u1")]
+    assert value == entry
+    assert isinstance(value.value, HistoryWindow)
+    assert value.value.messages[0]["timestamp"] == message["timestamp"]
+
+def test_stale_write_after_remote_invalidation_is_rejected(backend, monkeypatch):
+    worker_a = TieredCache("history", maxsize=10, ttl=60, shared=backend)
+    worker_b = TieredCache("history", maxsize=10, ttl=60, shared=backend)
+    key = ("session:s1", "u1")
+
+    # A开始加载后B失效了该标签，失效广播尚未到达A
+    generation = worker_a.generation("session:s1")
+    monkeypatch.setattr(backend, "publish", lambda channel, message: None)
+    worker_b.invalidate("session:s1")
+
+    assert not worker_a.put(key, CacheEntry("stale", time.time()), generation)
+    with pytest.raises(KeyError):
+        worker_b[key]
+    with pytest.raises(KeyError):
+        worker_a[key]
+    assert worker_a.get_stats()["stale_writes"] == 1
+
+def test_write_with_current_version_is_accepted(backend):
+    worker_a = TieredCache("history", maxsize=10, ttl=60, shared=backend)
+    worker_b = TieredCache("history", maxsize=10, ttl=60, shared=backend)
+    worker_b.invalidate("session:s1")
+
+    generation = worker_a.generation("session:s1")
+    assert worker_a.put(("session:s1", "u1"), CacheEntry("fresh", time.time()), generation)
+    assert worker_b[("session:s1", "u1")].value == "fresh"
+
+def test_shared_values_are_not_unpickled(backend):
+    cache = TieredCache("history", maxsize=10, ttl=60, shared=backend)
+    backend.set("history:session:s1", "u1", pickle.dumps((time.time(), "value")), 60)
+
+    with pytest.raises(KeyError):
+        cache[("session:s1", "u1")]
+    assert cache.get_stats()["l2_errors"] == 1
+
+def test_l1_counts_expirations_and_evictions():
+    now = [0.0]
+    cache = TieredCache("history", maxsize=2, ttl=10)
+    cache.l1 = InstrumentedTTLCache(2, 10, cache.metrics, timer=lambda: now[0])
+
+    cache.put(("session:a", "u1"), "a")
+    cache.put(("session:b", "u1"), "b")
+    cache.put(("user:c", "10"), "c")
+    now[0] = 20
+    cache.l1.expire()
+
+    stats = cache.get_stats()
+    assert stats["evictions"] == 1
+    assert stats["expirations"] == 2
+    assert stats["families"]["session"]["expirations"] == 1
+    assert stats["families"]["user"]["expirations"] == 1
+    assert len(cache) == 0
+
+def test_invalidation_on_event_loop_does_not_block(backend, monkeypatch):
+    """事件循环中失效时L2的删除和广播在后台线程执行，完成前本进程不从L2读取旧值"""
+    cache = TieredCache("sessions", maxsize=10, ttl=60, shared=backend)
+    key = ("user:u1", "20")
+    cache.put(key, CacheEntry("old", time.time()))
+    release = threading.Event()
+    real_invalidate = backend.invalidate
+
+    def slow_invalidate(tag, channel, message):
+        release.wait(5)
+        real_invalidate(tag, channel, message)
+
+    monkeypatch.setattr(backend, "invalidate", slow_invalidate)
+
+    async def run():
+        started = time.perf_counter()
+        cache.invalidate("user:u1")
+        elapsed = time.perf_counter() - started
+        # L2中仍有旧值，但失效尚未完成，不能被读回L1
+        with pytest.raises(KeyError):
+            cache[key]
+        return elapsed
+
+    assert asyncio.run(run()) < 0.5
+    release.set()
+    cache.flush_invalidations()
+    assert backend.get("sessions:user:u1", "20") is None
+    with pytest.raises(KeyError):
+        cache[key]
+
+def test_shared_backend_interface_is_abstract():
+    class Subclassed(InMemoryCacheBackend):
+        pass
+
+    class Incomplete(SharedCacheBackend):
+        def get(self, tag, field):
+            return None
+
+    assert Subclassed()
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,116 @@
+"""
+cached_swr装饰器测试
+验证单飞加载、过期后台刷新、加载异常和加载期间失效
+"""
+
+import threading
+import time
+import pytest
+from app.utils.cache import CacheEntry, TieredCache, cached_swr
+
+def _wait_until(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("等待超时")
+        time.sleep(0.005)
+
+def _run_threads(count: int, target):
+    results, errors = [None] * count, [None] * count
+    barrier = threading.Barrier(count)
+
+    def run(index):
+        barrier.wait()
+        try:
+            results[index] = target()
+        except Exception as e:
+            errors[index] = e
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+def test_concurrent_cold_misses_load_once():
+    cache = TieredCache("test", maxsize=10, ttl=60)
+    calls = []
+
+    @cached_swr(cache, key=lambda item: ("tag", item), soft_ttl=30)
+    def load(item):
+        calls.append(item)
+        time.sleep(0.05)
+        return f"value-{item}"
+
+    results, errors = _run_threads(8, lambda: load("a"))
+    assert errors == [None] * 8
+    assert results == ["value-a"] * 8
+    assert calls == ["a"]
+
+def test_soft_expired_entry_is_served_stale_and_refreshed_once():
+    cache = TieredCache("test", maxsize=10, ttl=60)
+    calls = []
+    release = threading.Event()
+
+    @cached_swr(cache, key=lambda item: ("tag", item), soft_ttl=1)
+    def load(item):
+        calls.append(item)
+        release.wait(2)
+        return "fresh"
+
+    cache.put(("tag", "a"), CacheEntry("stale", time.time() - 5))
+    results, errors = _run_threads(5, lambda: load("a"))
+    assert errors == [None] * 5
+    assert results == ["stale"] * 5
+
+    release.set()
+    _wait_until(lambda: cache.peek(("tag", "a")).value == "fresh")
+    assert calls == ["a"]
+    assert load("a") == "fresh"
+
+def test_loader_error_reaches_every_waiter_and_clears_flight():
+    cache = TieredCache("test", maxsize=10, ttl=60)
+    calls = []
+
+    @cached_swr(cache, key=lambda item: ("tag", item), soft_ttl=30)
+    def load(item):
+        calls.append(item)
+        time.sleep(0.05)
+        if len(calls) == 1:
+            raise RuntimeError("数据库不可用")
+        return "recovered"
+
+    results, errors = _run_threads(4, lambda: load("a"))
+    assert results == [None] * 4
+    assert all(isinstance(error, RuntimeError) for error in errors)
+    assert len(calls) == 1
+    assert cache.get_stats()["load_errors"] == 1
+
+    # 失败的加载不会留在单飞表中，下一次调用重新加载
+    assert load("a") == "recovered"
+    assert len(calls) == 2
+
+def test_invalidation_during_load_discards_result():
+    cache = TieredCache("test", maxsize=10, ttl=60)
+    versions = iter(["before write", "after write"])
+
+    @cached_swr(cache, key=lambda item: ("tag", item), soft_ttl=30)
+    def load(item):
+        value = next(versions)
+        if value == "before write":
+            # 加载读到旧数据后，另一个请求写入并使缓存失效
+            cache.invalidate("tag")
+        return value
+
+    assert load("a") == "before write"
+    assert cache.peek(("tag", "a")) is None
+    assert load("a") == "after write"
+    assert cache.peek(("tag", "a")).value == "after write"
+
+def test_coroutine_functions_are_rejected():
+    cache = TieredCache("test", maxsize=10, ttl=60)
+    with pytest.raises(TypeError):
+        @cached_swr(cache, key=lambda item: ("tag", item), soft_ttl=30)
+        async def load(item):
+            return item
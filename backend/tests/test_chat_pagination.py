@@ -0,0 +1,85 @@
+"""
+聊天记录游标分页测试
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from app.crud.chat_repository import AsyncChatRepository, ChatRepository, decode_cursor, encode_cursor
+from app.db.db_config import db_config
+
+def _insert(session_id: str, content: str, timestamp: datetime) -> ObjectId:
+    result = db_config.chat_collection.insert_one({
+        "session_id": session_id, "user_id": "u1", "role": "user", "content": content,
+        "message_type": "text", "timestamp": timestamp, "additional_data": {}
+    })
+    return result.inserted_id
+
+def _pages(repository: ChatRepository, limit: int, cursor=None):
+    contents = []
+    while True:
+        page = repository.get_chat_messages_page("s1", "u1", limit, before=cursor)
+        contents.extend(m["content"] for m in page["messages"])
+        cursor = page["next_cursor"]
+        if not page["has_more"]:
+            assert cursor is None
+            return contents
+
+def test_cursor_round_trip():
+    message = {"timestamp": datetime(2024, 5, 1, 12, 0, 0, 123000), "_id": ObjectId()}
+    assert decode_cursor(encode_cursor(message)) == (message["timestamp"], message["_id"])
+
+def test_equal_timestamps_are_ordered_by_id(mock_db):
+    """同一时间戳的消息按_id排序，翻页时既不重复也不遗漏"""
+    now = datetime.utcnow()
+    _insert("s1", "older", now - timedelta(seconds=1))
+    for index in range(5):
+        _insert("s1", f"tie-{index}", now)
+
+    expected = ["tie-4", "tie-3", "tie-2", "tie-1", "tie-0", "older"]
+    repository = ChatRepository()
+    for limit in (1, 2, 4):
+        assert _pages(repository, limit) == expected
+
+    async def run():
+        page = await AsyncChatRepository().get_chat_messages_page("s1", "u1", 2)
+        return [m["content"] for m in page["messages"]], page["next_cursor"]
+
+    contents, cursor = asyncio.run(run())
+    assert contents == ["tie-4", "tie-3"]
+    assert [m["content"] for m in repository.get_chat_messages_page("s1", "u1", 2, before=cursor)["messages"]] \
+        == ["tie-2", "tie-1"]
+
+def test_pages_are_stable_when_messages_arrive(mock_db):
+    """翻页过程中插入的新消息不影响更早的页，通过after游标获取"""
+    start = datetime.utcnow() - timedelta(minutes=1)
+    for index in range(6):
+        _insert("s1", f"m{index}", start + timedelta(seconds=index))
+    repository = ChatRepository()
+
+    first = repository.get_chat_messages_page("s1", "u1", 2)
+    assert [m["content"] for m in first["messages"]] == ["m5", "m4"]
+
+    # 新消息的时间戳与最新一条相同，且_id更大
+    _insert("s1", "new-tie", start + timedelta(seconds=5))
+    _insert("s1", "new", datetime.utcnow())
+    assert _pages(repository, 2, first["next_cursor"]) == ["m3", "m2", "m1", "m0"]
+
+    newest_cursor = encode_cursor({"timestamp": start + timedelta(seconds=5), "_id": ObjectId(first["messages"][0]["_id"])})
+    newer = repository.get_chat_messages_page("s1", "u1", 10, after=newest_cursor)
+    assert [m["content"] for m in newer["messages"]] == ["new", "new-tie"]
+    assert not newer["has_more"]
+
+    # 没有更新的消息时沿用原游标，便于轮询
+    idle = repository.get_chat_messages_page("s1", "u1", 10, after=newer["next_cursor"])
+    assert idle["messages"] == [] and idle["next_cursor"] == newer["next_cursor"]
+
+@pytest.mark.parametrize("cursor", ["garbage", "!!!", "e30", "eyJ0IjogIngiLCAiaSI6ICJ5In0", "bnVsbA", "游标"])
+def test_malformed_cursor_is_value_error(mock_db, cursor):
+    """无效游标抛出ValueError，由接口转换为400而不是500"""
+    repository = ChatRepository()
+    with pytest.raises(ValueError, match="无效的分页游标"):
+        repository.get_chat_messages_page("s1", "u1", 10, before=cursor)
+    with pytest.raises(ValueError, match="无效的分页游标"):
+        asyncio.run(AsyncChatRepository().get_chat_messages_page("s1", "u1", 10, after=cursor))
@@ -0,0 +1,86 @@
+"""
+聊天记录增量同步测试
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+import pytest
+from app.crud.chat_repository import (
+    AsyncChatRepository, ChatRepository, _build_changes_query, decode_token, encode_token
+)
+from app.db.db_config import db_config
+
+def test_token_round_trip():
+    payload = {"t": datetime(2024, 5, 1).isoformat(), "c": None}
+    token = encode_token(payload)
+    assert "=" not in token
+    assert decode_token(token) == payload
+    with pytest.raises(ValueError):
+        decode_token("游标")
+
+def test_changes_resume_mid_page_via_next_cursor(mock_db):
+    """一轮同步分多批返回时，用next_cursor续传，同一时间戳的消息也不重复或遗漏"""
+    since = datetime.utcnow() - timedelta(minutes=1)
+    timestamp = datetime.utcnow()
+    for index in range(5):
+        db_config.chat_collection.insert_one({
+            "session_id": "s1" if index % 2 else "s2", "user_id": "u1", "role": "user",
+            "content": f"m{index}", "message_type": "text", "timestamp": timestamp, "additional_data": {}
+        })
+    repository = ChatRepository()
+
+    contents, cursor, batches = [], None, 0
+    while True:
+        page = repository.get_changes_since("u1", since, after=cursor, limit=2)
+        contents.extend(m["content"] for m in page["messages"])
+        cursor = page["next_cursor"]
+        batches += 1
+        if not page["has_more"]:
+            break
+    assert contents == ["m0", "m1", "m2", "m3", "m4"]
+    assert batches == 3
+
+    # 只同步一个会话时续传游标同样有效
+    first = repository.get_changes_since("u1", since, "s1", limit=1)
+    rest = repository.get_changes_since("u1", since, "s1", first["next_cursor"], limit=10)
+    assert [m["content"] for m in first["messages"] + rest["messages"]] == ["m1", "m3"]
+
+def test_changes_query_hides_only_recently_cleared_sessions():
+    """清空时间晚于since的会话用$nor隐藏清空前的消息，更早清空的会话已被since条件排除"""
+    since = datetime(2024, 5, 1)
+    sessions = [
+        {"session_id": "recent", "cleared_at": since + timedelta(hours=1)},
+        {"session_id": "old", "cleared_at": since - timedelta(hours=1)},
+        {"session_id": "never", "cleared_at": None}
+    ]
+    query = _build_changes_query("u1", since, changed_sessions=sessions)
+    assert query["$nor"] == [{"session_id": "recent", "timestamp": {"$lte": since + timedelta(hours=1)}}]
+    assert "$nor" not in _build_changes_query("u1", since, changed_sessions=sessions[1:])
+
+def test_cleared_sessions_are_hidden_and_tombstones_reported(mock_db):
+    """删除的会话作为墓碑返回，清空前的消息不返回；墓碑只在since之后变更时返回"""
+    repository = AsyncChatRepository()
+
+    async def run():
+        since = datetime.utcnow() - timedelta(seconds=1)
+        await repository.add_chat_message("deleted", "u1", "user", "gone")
+        await repository.add_chat_message("kept", "u1", "user", "kept")
+        await repository.delete_chat_messages("deleted", "u1")
+        after_delete = datetime.utcnow()
+        time.sleep(0.002)
+        await repository.add_chat_message("kept", "u1", "user", "later")
+        return since, after_delete, await repository.get_changes_since("u1", since)
+
+    since, after_delete, page = asyncio.run(run())
+    assert [m["content"] for m in page["messages"]] == ["kept", "later"]
+    tombstone = next(s for s in page["sessions"] if s["session_id"] == "deleted")
+    assert isinstance(tombstone["deleted_at"], datetime)
+    assert tombstone["cleared_at"] == tombstone["deleted_at"]
+    assert tombstone["message_count"] == 0
+    kept = next(s for s in page["sessions"] if s["session_id"] == "kept")
+    assert kept["deleted_at"] is None
+
+    later = ChatRepository().get_changes_since("u1", after_delete)
+    assert [s["session_id"] for s in later["sessions"]] == ["kept"]
+    assert [m["content"] for m in later["messages"]] == ["later"]
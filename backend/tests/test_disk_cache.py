@@ -0,0 +1,52 @@
+"""
+本地磁盘缓存测试
+"""
+
+import errno
+import os
+from app.utils.disk_cache import DiskCache
+
+def _loader(data: bytes):
+    def load(path: str):
+        with open(path, "wb") as f:
+            f.write(data)
+    return load
+
+def test_scans_only_when_estimate_crosses_limit(tmp_path, monkeypatch):
+    """写入时按估计的总大小决定是否扫描目录，而不是每次写入都扫描"""
+    cache = DiskCache(str(tmp_path / "cache"), max_bytes=1000, scan_interval=3600)
+    scans = []
+    real_evict = DiskCache.evict
+    monkeypatch.setattr(DiskCache, "evict", lambda self: scans.append(1) or real_evict(self))
+
+    for index in range(9):
+        assert not cache.get_or_load(f"key-{index}", str(tmp_path / f"out-{index}"), _loader(b"x" * 100))
+    # 第一次写入扫描一次得到初始总大小，之后9 * 100字节未超过上限
+    assert len(scans) == 1
+
+    for index in range(9, 12):
+        cache.get_or_load(f"key-{index}", str(tmp_path / f"out-{index}"), _loader(b"x" * 100))
+    # 估计值超过上限时扫描并淘汰
+    assert len(scans) == 2
+    assert cache.stats()["evictions"] > 0
+    total = sum(entry.stat().st_size for shard in os.scandir(cache.directory)
+                if shard.is_dir() and shard.path != cache.temp_dir for entry in os.scandir(shard.path))
+    assert total <= 1000
+
+def test_oversized_file_moves_across_filesystems(tmp_path, monkeypatch):
+    """超过缓存容量的文件直接移动到目标路径，目标在另一个文件系统上时复制"""
+    cache = DiskCache(str(tmp_path / "cache"), max_bytes=100)
+    dest = str(tmp_path / "out")
+    real_rename = os.rename
+
+    def rename(source, target):
+        if target == dest:
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        return real_rename(source, target)
+
+    monkeypatch.setattr(os, "rename", rename)
+    monkeypatch.setattr(os, "replace", lambda source, target: rename(source, target))
+    assert not cache.get_or_load("big", dest, _loader(b"x" * 500))
+    with open(dest, "rb") as f:
+        assert f.read() == b"x" * 500
+    assert not os.listdir(cache.temp_dir)
@@ -0,0 +1,71 @@
+"""
+文本提取服务测试
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from app.db.db_config import db_config
+from app.services.extraction_service import (
+    EXTRACTION_PENDING, EXTRACTION_PROCESSING, EXTRACTION_READY, ExtractionService
+)
+
+async def _add_file(file_id: str, status: str, **fields):
+    await db_config.async_files_collection.insert_one({
+        "id": file_id,
+        "original_name": f"{file_id}.txt",
+        "stored_name": f"{file_id}.txt",
+        "extraction_status": status,
+        **fields
+    })
+
+def test_resume_pending_extracts_each_file_once(mock_db, monkeypatch):
+    """多个工作进程同时启动时，每个未完成的文件只被一个工作进程重新提取"""
+    extracted = []
+
+    async def run_extraction(self, file_info):
+        extracted.append(file_info["id"])
+        await asyncio.sleep(0.01)
+        return "text"
+
+    monkeypatch.setattr(ExtractionService, "_run_extraction", run_extraction)
+
+    async def scenario():
+        mock_db.seconds = 0.001
+        for index in range(5):
+            await _add_file(f"pending-{index}", EXTRACTION_PENDING)
+        # 工作进程退出时留下的提取任务，租约已过期
+        await _add_file("expired", EXTRACTION_PROCESSING,
+                        extraction_lease_until=datetime.utcnow() - timedelta(seconds=1))
+        # 其他工作进程正在提取，租约未过期
+        await _add_file("leased", EXTRACTION_PROCESSING,
+                        extraction_lease_until=datetime.utcnow() + timedelta(minutes=5))
+
+        workers = [ExtractionService() for _ in range(4)]
+        counts = await asyncio.gather(*(worker.resume_pending() for worker in workers))
+        for worker in workers:
+            await asyncio.gather(*list(worker._tasks))
+        return counts
+
+    counts = asyncio.run(scenario())
+    assert sum(counts) == 6
+    assert sorted(extracted) == sorted([f"pending-{index}" for index in range(5)] + ["expired"])
+
+    statuses = {file["id"]: file["extraction_status"] for file in db_config.files_collection.find({})}
+    assert statuses.pop("leased") == EXTRACTION_PROCESSING
+    assert set(statuses.values()) == {EXTRACTION_READY}
+
+def test_scheduled_extraction_skips_claimed_file(mock_db, monkeypatch):
+    """上传后提交的提取任务遇到已被其他工作进程认领的文件时跳过"""
+    async def run_extraction(self, file_info):
+        raise AssertionError("已认领的文件不应再次提取")
+
+    monkeypatch.setattr(ExtractionService, "_run_extraction", run_extraction)
+
+    async def scenario():
+        await _add_file("file", EXTRACTION_PENDING)
+        service = ExtractionService()
+        assert await service._claim("file") is not None
+        return await service.extract({"id": "file", "original_name": "file.txt", "stored_name": "file.txt"})
+
+    assert asyncio.run(scenario()) is None
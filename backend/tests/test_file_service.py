@@ -0,0 +1,48 @@
+"""
+文件服务测试
+使用mongomock和进程内存储后端验证文件保存、去重和删除
+"""
+
+import asyncio
+import io
+from starlette.datastructures import Headers, UploadFile
+
+def _upload(content: bytes, filename: str = "notes.txt", content_type: str = "text/plain") -> UploadFile:
+    return UploadFile(io.BytesIO(content), filename=filename, headers=Headers({"content-type": content_type}))
+
+def test_save_and_delete_round_trip(file_service):
+    storage = file_service.storage
+
+    async def run():
+        first = await file_service.save_file(_upload(b"contract text"), "s1", "u1")
+        second = await file_service.save_file(_upload(b"contract text", "copy.txt"), "s1", "u1")
+        assert first["stored_name"] == second["stored_name"]
+        assert list(storage.objects) == [first["stored_name"]]
+
+        assert await file_service.delete_file(first["id"])
+        assert first["stored_name"] in storage.objects
+        assert await file_service.delete_file(second["id"])
+        assert storage.objects == {}
+        assert await file_service.async_blob_repository.get_blob(first["sha256"]) is None
+
+    asyncio.run(run())
+
+def test_release_does_not_delete_reuploaded_content(file_service):
+    """最后一个引用释放后、删除存储对象前，重新上传的相同内容使用新的存储对象"""
+    storage = file_service.storage
+
+    async def run():
+        first = await file_service.save_file(_upload(b"same bytes"), "s1", "u1")
+        await file_service.async_file_repository.delete_file_info(first["id"])
+        released = await file_service.async_blob_repository.release(first["sha256"])
+        assert released is not None
+
+        second = await file_service.save_file(_upload(b"same bytes"), "s1", "u1")
+        assert second["stored_name"] != first["stored_name"]
+
+        # 第一次释放的调用方此时才删除它的存储对象
+        await file_service._remove_object(released)
+        assert second["stored_name"] in storage.objects
+        assert first["stored_name"] not in storage.objects
+
+    asyncio.run(run())
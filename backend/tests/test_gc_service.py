@@ -0,0 +1,105 @@
+"""
+孤儿文件回收测试
+"""
+
+import asyncio
+import io
+from collections import Counter
+from datetime import datetime, timedelta
+from starlette.datastructures import Headers, UploadFile
+from app.db.db_config import db_config
+from app.services.gc_service import OrphanFileCollector
+
+def _upload(content: bytes, filename: str = "notes.txt") -> UploadFile:
+    return UploadFile(io.BytesIO(content), filename=filename, headers=Headers({"content-type": "text/plain"}))
+
+def test_concurrent_delete_does_not_double_release(file_service):
+    """回收认领文件后，用户同时删除同一文件不会再释放一次引用"""
+    collector = OrphanFileCollector(file_service)
+    repository = collector.async_file_repository
+    real_delete_claimed = repository.delete_claimed_files
+
+    async def run():
+        first = await file_service.save_file(_upload(b"shared"), "s1", "u1")
+        second = await file_service.save_file(_upload(b"shared", "copy.txt"), "s1", "u1")
+
+        async def delete_claimed_with_race(token):
+            # 用户在回收认领之后、删除记录之前删除同一文件
+            assert not await file_service.delete_file(first["id"])
+            return await real_delete_claimed(token)
+
+        repository.delete_claimed_files = delete_claimed_with_race
+        progress = Counter()
+        assert await collector.delete_files([first], "token", progress) == 1
+
+        blob = await file_service.async_blob_repository.get_blob(first["sha256"])
+        assert blob["ref_count"] == 1
+        assert second["stored_name"] in file_service.storage.objects
+        assert progress["deleted_files"] == 1
+
+    asyncio.run(run())
+
+def test_stale_claims_are_reclaimed(file_service):
+    """回收中途退出遗留的认领过期后，文件仍会被查找和删除"""
+    collector = OrphanFileCollector(file_service)
+    repository = collector.async_file_repository
+
+    async def run():
+        stale = await file_service.save_file(_upload(b"stale"), "s1", "u1")
+        fresh = await file_service.save_file(_upload(b"fresh"), "s1", "u1")
+        await db_config.async_files_collection.update_one(
+            {"id": stale["id"]},
+            {"$set": {"gc_token": "crashed", "gc_claimed_at": datetime.utcnow() - timedelta(days=1)}}
+        )
+        await db_config.async_files_collection.update_one(
+            {"id": fresh["id"]}, {"$set": {"gc_token": "running", "gc_claimed_at": datetime.utcnow()}}
+        )
+
+        files = await repository.find_session_files_before("s1", "u1", datetime.utcnow(), 10)
+        assert [f["id"] for f in files] == [stale["id"]]
+        assert await collector.delete_files(files, "token", Counter()) == 1
+        assert await repository.get_file_info(stale["id"]) is None
+        assert stale["stored_name"] not in file_service.storage.objects
+        # 未过期的认领仍由原来的回收负责
+        assert not await file_service.delete_file(fresh["id"])
+
+    asyncio.run(run())
+
+class _DeleteBeforeSecondCall:
+    """回收读取认领记录之后、删除之前，模拟另一条删除路径删掉其中一条记录"""
+
+    def __init__(self, collection, file_id: str):
+        self._collection = collection
+        self._file_id = file_id
+        self._calls = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            self._calls += 1
+            if self._calls == 2:
+                db_config.db["files"].delete_one({"id": self._file_id})
+            return attr(*args, **kwargs)
+        return call
+
+def test_records_deleted_elsewhere_are_not_released(file_service, monkeypatch):
+    """回收查询认领记录之后，其他路径删除了其中一条，该记录的引用不由回收释放"""
+    collector = OrphanFileCollector(file_service)
+    repository = collector.async_file_repository
+
+    async def run():
+        first = await file_service.save_file(_upload(b"shared"), "s1", "u1")
+        second = await file_service.save_file(_upload(b"shared", "copy.txt"), "s1", "u1")
+        await db_config.async_files_collection.update_many(
+            {"id": {"$in": [first["id"], second["id"]]}},
+            {"$set": {"gc_token": "token", "gc_claimed_at": datetime.utcnow()}}
+        )
+        racing = _DeleteBeforeSecondCall(repository.files_collection, second["id"])
+        monkeypatch.setattr(type(repository), "files_collection", property(lambda self: racing))
+        deleted = await repository.delete_claimed_files("token")
+        assert [f["id"] for f in deleted] == [first["id"]]
+
+    asyncio.run(run())
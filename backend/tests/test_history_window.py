@@ -0,0 +1,122 @@
+"""
+历史记录缓存窗口测试
+验证写穿追加与数据库查询结果一致，以及写穿与加载并发时不会写回旧数据
+"""
+
+import threading
+import time
+import pytest
+from app.core.config import settings
+from app.crud.chat_repository import ChatRepository
+from app.utils.cache import (
+    CacheEntry, HistoryWindow, append_history_cache, cached_swr, history_cache, history_cache_key
+)
+
+@pytest.fixture(autouse=True)
+def clean_history_cache():
+    history_cache.clear()
+    yield
+    history_cache.clear()
+
+def _ids(messages):
+    return [message["_id"] for message in messages]
+
+def _add(repository: ChatRepository, count: int, start: int = 0):
+    messages = []
+    for index in range(start, start + count):
+        messages.append(repository.add_chat_message("s1", "u1", "user", f"m{index}")["message"])
+        time.sleep(0.002)
+    return messages
+
+@pytest.mark.parametrize("existing, added", [(2, 2), (3, 4), (5, 3), (0, 7)])
+def test_append_matches_oldest_first_query(mock_db, existing, added):
+    """追加后的窗口与重新查询前limit条消息的结果一致，窗口已满时不再追加"""
+    repository = ChatRepository()
+    _add(repository, existing)
+    window = HistoryWindow(5, repository.get_chat_messages("s1", "u1", 5))
+    new_messages = _add(repository, added, existing)
+
+    appended = window.append(new_messages)
+    assert appended.limit == 5
+    assert _ids(appended.messages) == _ids(repository.get_chat_messages("s1", "u1", 5))
+    # 重复追加同一批消息不会产生重复
+    assert _ids(appended.append(new_messages).messages) == _ids(appended.messages)
+    # 原窗口不被修改
+    assert len(window.messages) == existing
+
+def test_slice_and_covers():
+    messages = [{"_id": str(index)} for index in range(5)]
+    window = HistoryWindow(10, messages)
+    assert window.slice(3) == messages[:3]
+    assert window.slice(10) == messages
+    # 会话消息少于窗口大小时窗口已包含全部消息，可以满足更大的limit
+    assert window.covers(50)
+    full = HistoryWindow(5, messages)
+    assert full.covers(5) and not full.covers(6)
+
+def _window_loader(repository: ChatRepository, during_load=None):
+    """与ChatService._get_history_window相同的缓存方式"""
+    @cached_swr(
+        history_cache,
+        key=lambda session_id, user_id, limit: history_cache_key(session_id, user_id),
+        soft_ttl=settings.HISTORY_CACHE_SOFT_TTL,
+        covers=lambda window, session_id, user_id, limit: window.covers(limit)
+    )
+    def load(session_id, user_id, limit):
+        window = HistoryWindow(limit, repository.get_chat_messages(session_id, user_id, limit))
+        if during_load is not None:
+            during_load()
+        return window
+    return load
+
+def test_rewrite_during_cold_load_is_not_overwritten(mock_db):
+    """加载读取数据库之后、写入缓存之前追加的消息不会被加载结果覆盖"""
+    repository = ChatRepository()
+    _add(repository, 1)
+    written = []
+
+    def write_during_load():
+        if not written:
+            written.extend(_add(repository, 1, 1))
+            append_history_cache("s1", "u1", written)
+
+    load = _window_loader(repository, write_during_load)
+    # 本次加载返回读取时的数据，但不写入缓存
+    assert len(load("s1", "u1", 10).messages) == 1
+    assert history_cache.peek(history_cache_key("s1", "u1")) is None
+    assert _ids(load("s1", "u1", 10).messages) == _ids(repository.get_chat_messages("s1", "u1", 10))
+    assert len(history_cache.peek(history_cache_key("s1", "u1")).value.messages) == 2
+
+def test_rewrite_during_background_refresh_keeps_appended_window(mock_db, monkeypatch):
+    """后台刷新读到旧数据后发生写穿，刷新结果不会覆盖追加后的窗口"""
+    repository = ChatRepository()
+    old = _add(repository, 1)
+    key = history_cache_key("s1", "u1")
+    loaded, release, stored = threading.Event(), threading.Event(), threading.Event()
+    writes = []
+    real_put = history_cache.put
+
+    def put(*args, **kwargs):
+        writes.append(real_put(*args, **kwargs))
+        stored.set()
+        return writes[-1]
+
+    def pause():
+        loaded.set()
+        release.wait(2)
+
+    load = _window_loader(repository, pause)
+    history_cache.put(key, CacheEntry(HistoryWindow(10, old), time.time() - settings.HISTORY_CACHE_SOFT_TTL - 1))
+    monkeypatch.setattr(history_cache, "put", put)
+    # 软过期的窗口直接返回，并在后台刷新
+    assert _ids(load("s1", "u1", 10).messages) == _ids(old)
+    assert loaded.wait(2)
+
+    new = _add(repository, 1, 1)
+    append_history_cache("s1", "u1", new)
+    release.set()
+
+    assert stored.wait(2)
+    assert writes == [False]
+    window = history_cache.peek(key).value
+    assert _ids(window.messages) == _ids(old + new)
@@ -0,0 +1,48 @@
+"""
+本地存储迁移脚本测试
+"""
+
+import os
+from app.db.db_config import db_config
+from app.scripts.migrate_local_storage import migrate_local_storage
+from app.services.storage_backends import LocalStorageBackend
+
+def _flat_upload(root: str, name: str) -> str:
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, name)
+    with open(path, "wb") as f:
+        f.write(name.encode())
+    return path
+
+def test_dry_run_counts_without_moving(tmp_path):
+    root = str(tmp_path / "uploads")
+    paths = [_flat_upload(root, name) for name in ("a.pdf", "b.png")]
+    _flat_upload(root, "upload.part")
+
+    stats = migrate_local_storage(root, dry_run=True)
+    assert stats == {"found": 2, "moved": 0, "skipped": 0, "failed": 0}
+    assert all(os.path.exists(path) for path in paths)
+
+def test_updates_records_when_root_is_spelled_differently(mock_db, tmp_path, monkeypatch):
+    """记录中的路径为uploads/a.pdf，迁移时--root使用绝对路径，按存储名仍能更新记录"""
+    monkeypatch.chdir(tmp_path)
+    _flat_upload("uploads", "a.pdf")
+    db_config.files_collection.insert_one({"id": "f1", "stored_name": "a.pdf", "storage": "local",
+                                           "file_path": os.path.join("uploads", "a.pdf")})
+    db_config.files_collection.insert_one({"id": "f2", "stored_name": "a.pdf", "is_oss": True,
+                                           "file_path": "https://bucket/a.pdf"})
+    db_config.db["blobs"].insert_one({
+        "_id": "hash", "stored_name": "a.pdf", "file_path": os.path.join("uploads", "a.pdf"),
+        "renditions": [{"stored_name": "a.pdf", "storage": "local", "file_path": os.path.join("uploads", "a.pdf")}]
+    })
+
+    root = str(tmp_path / "uploads")
+    stats = migrate_local_storage(root)
+    new_path = LocalStorageBackend(root).path_for("a.pdf")
+    assert stats["moved"] == 1
+    assert os.path.exists(new_path)
+    assert db_config.files_collection.find_one({"id": "f1"})["file_path"] == new_path
+    assert db_config.files_collection.find_one({"id": "f2"})["file_path"] == "https://bucket/a.pdf"
+    blob = db_config.db["blobs"].find_one({"_id": "hash"})
+    assert blob["file_path"] == new_path
+    assert blob["renditions"][0]["file_path"] == new_path
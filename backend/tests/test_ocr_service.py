@@ -0,0 +1,46 @@
+"""
+OCR服务测试
+"""
+
+import asyncio
+import os
+from app.services.extraction_service import local_file_copy
+from app.services.ocr_service import OCRService
+from app.services.storage_backends import InMemoryStorageBackend
+
+def test_inflight_page_keeps_temp_copy_after_caller_exits(tmp_path, monkeypatch):
+    """调用方退出后，仍在识别的页面继续读取临时副本，之后加入的调用方共用同一结果"""
+    read_paths = []
+
+    async def recognize(self, file_path, file_name, sha256, page, lang):
+        await self.gate.wait()
+        read_paths.append(file_path)
+        with open(file_path, "rb") as f:
+            return f.read().decode("utf-8")
+
+    monkeypatch.setattr(OCRService, "_recognize", recognize)
+
+    async def scenario():
+        storage = InMemoryStorageBackend()
+        storage.objects["scan.pdf"] = b"page text"
+        backends = {"memory": storage}
+        file_info = {"storage": "memory", "stored_name": "scan.pdf"}
+        service = OCRService()
+        service.gate = asyncio.Event()
+
+        async with local_file_copy(file_info, backends, str(tmp_path)) as first_path:
+            task = service._recognize_once(first_path, "scan.pdf", "hash", 0, "chi_sim")
+        # 第一个调用方已退出，识别任务仍持有临时副本
+        assert os.path.exists(first_path)
+
+        async with local_file_copy(file_info, backends, str(tmp_path)) as second_path:
+            assert service._recognize_once(second_path, "scan.pdf", "hash", 0, "chi_sim") is task
+            service.gate.set()
+            assert await asyncio.shield(task) == "page text"
+        await asyncio.sleep(0)
+        return first_path, second_path
+
+    first_path, second_path = asyncio.run(scenario())
+    assert read_paths == [first_path]
+    assert not os.path.exists(first_path)
+    assert not os.path.exists(second_path)
@@ -0,0 +1,155 @@
+"""
+OSS服务测试
+"""
+
+import asyncio
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+import pytest
+from oss2.exceptions import ServerError
+from app.core.config import settings
+from app.services.oss_service import InMemoryBucket, OSSService
+
+class _Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+class _SigningBucket(InMemoryBucket):
+    """像OSS一样在URL中写入绝对过期时间，并记录签名次数"""
+
+    def __init__(self):
+        super().__init__()
+        self.signed = []
+
+    def sign_url(self, method: str, key: str, expires: int, **kwargs) -> str:
+        self.signed.append((method, key, expires))
+        return f"{self.base_url}/{key}?Method={method}&Expires={int(time.time()) + expires}&n={len(self.signed)}"
+
+def _expires_at(url: str) -> int:
+    return int(parse_qs(urlparse(url).query)["Expires"][0])
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock(1_700_000_000.0)
+    monkeypatch.setattr(time, "time", clock)
+    return clock
+
+@pytest.fixture
+def oss(monkeypatch):
+    monkeypatch.setattr(settings, "OSS_CACHE_DIR", "")
+    monkeypatch.setattr(settings, "OSS_SIGNED_URL_EXPIRES", 3600)
+    monkeypatch.setattr(settings, "OSS_SIGNED_URL_REFRESH", 600)
+    return OSSService(bucket=_SigningBucket())
+
+def test_cached_url_is_valid_for_requested_expiry(oss, clock):
+    """时间段内复用同一个URL，且每次返回时剩余有效期都不少于请求的expires"""
+    period_start = int(clock.now) // 600 * 600
+    clock.now = period_start + 1
+    first = oss.sign_url("a.pdf")
+    for offset in (1, 300, 599):
+        clock.now = period_start + offset
+        url = oss.sign_url("a.pdf")
+        assert url == first
+        assert _expires_at(url) - clock.now >= 3600
+    assert len(oss.bucket.signed) == 1
+
+    # 进入下一个时间段后重新签名，旧URL的剩余有效期已不足
+    clock.now = period_start + 601
+    assert _expires_at(first) - clock.now < 3600
+    renewed = oss.sign_url("a.pdf")
+    assert renewed != first
+    assert _expires_at(renewed) - clock.now >= 3600
+    assert len(oss.bucket.signed) == 2
+
+def test_cache_key_includes_method_and_expiry(oss, clock):
+    get_url = oss.sign_url("a.pdf")
+    put_url = oss.sign_url("a.pdf", method="PUT")
+    short_url = oss.sign_url("a.pdf", expires=60)
+    assert len({get_url, put_url, short_url}) == 3
+    assert "Method=PUT" in put_url
+    # 较短有效期的URL不会被请求较长有效期的调用复用，反之亦然
+    assert _expires_at(short_url) < _expires_at(get_url)
+    assert oss.sign_url("a.pdf", expires=60) == short_url
+    assert oss.sign_url("a.pdf", expires=3600) == get_url
+    assert oss.sign_urls(["a.pdf", "b.pdf", "a.pdf"]) == {"a.pdf": get_url, "b.pdf": oss.sign_url("b.pdf")}
+    assert len(oss.bucket.signed) == 4
+
+class _SlowBucket(InMemoryBucket):
+    """分片上传耗时随分片号递减，可以让指定分片失败"""
+
+    def __init__(self, fail_part: int = 0):
+        super().__init__()
+        self.fail_part = fail_part
+        self.started = []
+        self.aborted = []
+        self.completed_parts = []
+        self.release = threading.Event()
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, data: bytes):
+        self.started.append(part_number)
+        if part_number == self.fail_part:
+            raise ServerError(500, {}, b"", {})
+        if self.fail_part:
+            # 失败场景中其他分片一直等到上传被中止
+            self.release.wait(5)
+        else:
+            time.sleep(0.02 * (5 - part_number))
+        return super().upload_part(key, upload_id, part_number, data)
+
+    def complete_multipart_upload(self, key: str, upload_id: str, parts):
+        self.completed_parts = [part.part_number for part in parts]
+        return super().complete_multipart_upload(key, upload_id, parts)
+
+    def abort_multipart_upload(self, key: str, upload_id: str):
+        self.aborted.append(upload_id)
+        super().abort_multipart_upload(key, upload_id)
+        self.release.set()
+
+def _multipart_service(bucket: InMemoryBucket) -> OSSService:
+    service = OSSService(bucket=bucket)
+    service.multipart_threshold = 10
+    service.multipart_parallelism = 3
+    return service
+
+async def _chunks(data: bytes, size: int, read: list):
+    for start in range(0, len(data), size):
+        read.append(start)
+        yield data[start:start + size]
+
+def test_parts_complete_in_part_number_order(monkeypatch):
+    monkeypatch.setattr(settings, "OSS_CACHE_DIR", "")
+    bucket = _SlowBucket()
+    service = _multipart_service(bucket)
+    data = bytes(range(40))
+
+    result = asyncio.run(service.upload_stream(_chunks(data, 3, []), "big.bin", part_size=10))
+    # 后面的分片先完成，提交时仍按分片号排列
+    assert bucket.completed_parts == [1, 2, 3, 4]
+    assert bucket.objects[result["stored_name"]] == data
+    assert result["file_size"] == 40
+    assert not bucket.uploads
+
+def test_failed_part_aborts_upload(monkeypatch):
+    monkeypatch.setattr(settings, "OSS_CACHE_DIR", "")
+    bucket = _SlowBucket(fail_part=2)
+    service = _multipart_service(bucket)
+    read = []
+
+    async def run():
+        upload = service.upload_stream(_chunks(bytes(200), 10, read), "big.bin", part_size=10)
+        with pytest.raises(Exception, match="文件上传到OSS失败"):
+            await upload
+        # 被取消的分片在中止之后结束，不会再提交
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+    assert len(bucket.aborted) == 1
+    assert not bucket.uploads and not bucket.objects
+    assert bucket.completed_parts == []
+    # 失败后不再读取和上传后续分片
+    assert sorted(bucket.started) == [1, 2, 3]
+    assert len(read) < 20
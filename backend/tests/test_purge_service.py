@@ -0,0 +1,76 @@
+"""
+会话删除和后台清理测试
+"""
+
+import asyncio
+import io
+import time
+from datetime import datetime, timedelta
+from starlette.datastructures import Headers, UploadFile
+from app.crud.chat_repository import PURGE_DONE, AsyncChatRepository, ChatRepository
+from app.db.db_config import db_config
+from app.services.gc_service import OrphanFileCollector
+from app.services.purge_service import SessionPurger
+
+def _upload(content: bytes, filename: str = "notes.txt") -> UploadFile:
+    return UploadFile(io.BytesIO(content), filename=filename, headers=Headers({"content-type": "text/plain"}))
+
+def test_changes_since_hides_messages_of_deleted_sessions(mock_db):
+    """增量同步不返回已删除会话中等待后台清理的消息"""
+    repository = AsyncChatRepository()
+
+    async def run():
+        since = datetime.utcnow() - timedelta(seconds=1)
+        await repository.add_chat_message("deleted", "u1", "user", "gone")
+        await repository.add_chat_message("kept", "u1", "user", "still here")
+        await repository.delete_chat_messages("deleted", "u1")
+        time.sleep(0.002)
+        await repository.add_chat_message("deleted", "u1", "user", "after delete")
+        return await repository.get_changes_since("u1", since)
+
+    page = asyncio.run(run())
+    assert [m["content"] for m in page["messages"]] == ["still here", "after delete"]
+    assert {s["session_id"] for s in page["sessions"]} == {"deleted", "kept"}
+
+    sync_page = ChatRepository().get_changes_since("u1", datetime.utcnow() - timedelta(minutes=1))
+    assert [m["content"] for m in sync_page["messages"]] == ["still here", "after delete"]
+
+def test_purge_only_deletes_files_of_the_deleting_user(file_service):
+    """两个用户共用会话ID时，清理只删除删除会话的用户上传的文件"""
+    repository = AsyncChatRepository()
+    purger = SessionPurger(OrphanFileCollector(file_service))
+
+    async def run():
+        await repository.add_chat_message("shared", "u1", "user", "hello")
+        await repository.add_chat_message("shared", "u2", "user", "hello")
+        mine = await file_service.save_file(_upload(b"mine"), "shared", "u1")
+        theirs = await file_service.save_file(_upload(b"theirs"), "shared", "u2")
+        await repository.delete_chat_messages("shared", "u1")
+
+        assert await purger.run_pending() == 1
+        assert await file_service.async_file_repository.get_file_info(mine["id"]) is None
+        assert await file_service.async_file_repository.get_file_info(theirs["id"]) is not None
+
+    asyncio.run(run())
+
+def test_tombstone_expires_only_after_purge(mock_db):
+    """墓碑在清理完成后才设置过期时间，会话恢复时取消过期"""
+    repository = AsyncChatRepository()
+
+    async def run():
+        await repository.add_chat_message("s1", "u1", "user", "hello")
+        await repository.delete_chat_messages("s1", "u1")
+        tombstone = await db_config.async_sessions_collection.find_one({"session_id": "s1"})
+        assert tombstone["expire_at"] is None
+
+        session = await repository.claim_session_purge(timedelta(minutes=5))
+        assert await repository.update_session_purge(session, timedelta(minutes=5), done=True)
+        purged = await db_config.async_sessions_collection.find_one({"session_id": "s1"})
+        assert purged["purge_status"] == PURGE_DONE
+        assert isinstance(purged["expire_at"], datetime)
+
+        await repository.add_chat_message("s1", "u1", "user", "back again")
+        restored = await db_config.async_sessions_collection.find_one({"session_id": "s1"})
+        assert restored["deleted_at"] is None and restored["expire_at"] is None
+
+    asyncio.run(run())
@@ -0,0 +1,44 @@
+"""
+预览图服务测试
+"""
+
+import asyncio
+from app.db.db_config import db_config
+from app.services.rendition_service import RENDITION_PENDING, RENDITION_READY, RenditionService
+
+def test_resume_pending_renders_each_file_once(mock_db, monkeypatch):
+    """多个工作进程同时启动时，每个等待生成预览图的文件只被一个工作进程处理"""
+    rendered = []
+
+    async def render(self, file_info):
+        rendered.append(file_info["id"])
+        await asyncio.sleep(0.01)
+        return []
+
+    monkeypatch.setattr(RenditionService, "_render", render)
+
+    async def scenario():
+        mock_db.seconds = 0.001
+        for index in range(5):
+            sha256 = f"{index:064x}"
+            await db_config.async_blobs_collection.insert_one({"_id": sha256, "ref_count": 1})
+            await db_config.async_files_collection.insert_one({
+                "id": f"image-{index}",
+                "original_name": f"image-{index}.png",
+                "stored_name": f"{sha256}.png",
+                "sha256": sha256,
+                "blob_id": sha256,
+                "rendition_status": RENDITION_PENDING
+            })
+
+        workers = [RenditionService() for _ in range(3)]
+        counts = await asyncio.gather(*(worker.resume_pending() for worker in workers))
+        for worker in workers:
+            await asyncio.gather(*list(worker._tasks))
+        return counts
+
+    counts = asyncio.run(scenario())
+    assert sum(counts) == 5
+    assert sorted(rendered) == [f"image-{index}" for index in range(5)]
+    statuses = {file["rendition_status"] for file in db_config.files_collection.find({})}
+    assert statuses == {RENDITION_READY}
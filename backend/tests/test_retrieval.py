@@ -0,0 +1,104 @@
+"""
+段落检索测试
+"""
+
+import asyncio
+from app.core.config import settings
+from app.db.db_config import db_config
+from app.services.extraction_service import EXTRACTION_READY, ExtractionService
+from app.services.retrieval_service import RetrievalService
+from app.utils.retrieval import BM25Index, chunk_text, tokenize
+
+def test_tokenize_mixes_cjk_bigrams_and_words():
+    assert tokenize("合同法Article 5.2条款") == ["合同", "同法", "article", "5.2", "条款"]
+    # 单个汉字的片段保留单字，标点不产生词项
+    assert tokenize("法，ABC 第3条") == ["法", "abc", "第", "3", "条"]
+    assert tokenize("！？ ...") == []
+
+def test_chunks_break_at_sentences_and_overlap():
+    sentences = [f"第{index}句内容比较长一些。" for index in range(10)]
+    text = "".join(sentences)
+    chunks = chunk_text(text, chunk_size=40, overlap=10)
+    assert len(chunks) > 1
+    for previous, current in zip(chunks, chunks[1:]):
+        assert len(previous) <= 40
+        # 每段在句末断开，下一段以上一段的最后10个字符开头
+        assert previous.endswith("。")
+        assert current.startswith(previous[-10:])
+    # 去掉重叠后拼接回原文
+    assert chunks[0] + "".join(chunk[10:] for chunk in chunks[1:]) == text
+
+def test_long_sentence_is_hard_split_with_overlap():
+    text = "甲" * 25 + "乙" * 25
+    chunks = chunk_text(text, chunk_size=20, overlap=5)
+    assert all(len(chunk) <= 20 for chunk in chunks)
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.startswith(previous[-5:])
+    assert chunks[0] + "".join(chunk[5:] for chunk in chunks[1:]) == text
+    # 重叠不超过段落长度的一半
+    assert chunk_text("甲" * 30, chunk_size=10, overlap=8) == chunk_text("甲" * 30, chunk_size=10, overlap=5)
+
+def _documents():
+    return {
+        "a": "合同违约应当承担违约责任。当事人可以约定违约金。",
+        "b": "劳动合同应当以书面形式订立。用人单位应当支付工资。",
+        "c": "租赁合同的租期不得超过二十年。承租人应当支付租金。"
+    }
+
+def _scores(index: BM25Index, query: str):
+    return [(r["doc_id"], r["position"], round(r["score"], 9)) for r in index.search(query, k=10)]
+
+def test_scores_after_remove_match_fresh_index():
+    """删除文档后的得分与只包含剩余文档的新索引一致"""
+    documents = _documents()
+    updated = BM25Index(chunk_size=12, overlap=2)
+    for doc_id, text in documents.items():
+        updated.add_document(doc_id, doc_id, text)
+    updated.remove_document("b")
+    # 同ID重新添加等同于替换
+    updated.add_document("c", "c", documents["c"])
+
+    fresh = BM25Index(chunk_size=12, overlap=2)
+    for doc_id in ("a", "c"):
+        fresh.add_document(doc_id, doc_id, documents[doc_id])
+
+    assert updated.document_ids == ["a", "c"]
+    assert updated.passage_count == fresh.passage_count
+    for query in ("合同违约", "支付租金", "劳动合同", "应当"):
+        assert _scores(updated, query) == _scores(fresh, query)
+    assert updated.search("劳动工资") == fresh.search("劳动工资") == []
+
+def _add_file(session_id: str, user_id: str, sha256: str, name: str, text: str):
+    db_config.db["files"].insert_one({
+        "id": sha256, "session_id": session_id, "user_id": user_id, "sha256": sha256,
+        "original_name": name, "extraction_status": EXTRACTION_READY
+    })
+    db_config.db["file_texts"].insert_one({"_id": sha256, "text": text, "extractor_version": 1})
+
+def test_passages_are_capped_by_context_budget(mock_db, monkeypatch):
+    monkeypatch.setattr(settings, "EXTRACTION_CONTEXT_MAX_CHARS", 50)
+    monkeypatch.setattr(settings, "RETRIEVAL_CHUNK_SIZE", 30)
+    monkeypatch.setattr(settings, "RETRIEVAL_CHUNK_OVERLAP", 0)
+    _add_file("s1", "u1", "h1", "合同.txt", "违约责任条款内容。" * 20)
+    service = RetrievalService(ExtractionService())
+
+    passages = asyncio.run(service.get_passages("s1", "u1", "违约责任", k=5))
+    assert len(passages) == 2
+    assert sum(len(p["text"]) for p in passages) == 50
+    # 最后一段被截断到剩余预算
+    assert len(passages[0]["text"]) == 27 and len(passages[1]["text"]) == 23
+
+def test_index_is_scoped_by_user(mock_db):
+    """不同用户使用相同的会话ID时只检索自己上传的文件"""
+    _add_file("shared", "u1", "h1", "mine.txt", "我的合同违约金约定。")
+    _add_file("shared", "u2", "h2", "theirs.txt", "他人的合同违约金约定。")
+    service = RetrievalService(ExtractionService())
+
+    async def run():
+        mine = await service.get_passages("shared", "u1", "合同违约金")
+        theirs = await service.get_passages("shared", "u2", "合同违约金")
+        return mine, theirs
+
+    mine, theirs = asyncio.run(run())
+    assert [p["name"] for p in mine] == ["mine.txt"]
+    assert [p["name"] for p in theirs] == ["theirs.txt"]
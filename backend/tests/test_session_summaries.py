@@ -0,0 +1,103 @@
+"""
+会话汇总集合测试
+验证回填脚本和消息写入、删除时的汇总维护结果一致
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+from app.crud.chat_repository import AsyncChatRepository, ChatRepository
+from app.db.db_config import db_config
+from app.scripts.backfill_sessions import backfill_sessions
+
+_FIELDS = ("last_message", "last_role", "message_count", "created_at", "updated_at")
+
+class _CountingCollection:
+    """记录find调用次数的集合代理"""
+
+    def __init__(self, collection):
+        self._collection = collection
+        self.finds = 0
+
+    def __getattr__(self, name):
+        if name == "find":
+            self.finds += 1
+        return getattr(self._collection, name)
+
+def _summaries():
+    return {
+        (doc["session_id"], doc["user_id"]): {field: doc.get(field) for field in _FIELDS}
+        for doc in db_config.db["sessions"].find()
+    }
+
+def _insert_legacy(session_id: str, user_id: str, role: str, content: str, timestamp: datetime):
+    db_config.db["chat_messages"].insert_one({
+        "session_id": session_id, "user_id": user_id, "role": role, "content": content,
+        "message_type": "text", "timestamp": timestamp, "additional_data": {}
+    })
+
+def test_backfill_is_idempotent(mock_db):
+    start = datetime(2024, 5, 1, 8, 0, 0)
+    _insert_legacy("s1", "u1", "user", "第一条", start)
+    _insert_legacy("s1", "u1", "assistant", "回复" * 200, start + timedelta(minutes=1))
+    _insert_legacy("s2", "u1", "user", "另一个会话", start + timedelta(minutes=2))
+    _insert_legacy("s1", "u2", "user", "其他用户", start + timedelta(minutes=3))
+
+    assert backfill_sessions(user_id="u1", batch_size=1) == 2
+    assert set(_summaries()) == {("s1", "u1"), ("s2", "u1")}
+    assert backfill_sessions() == 3
+    first = _summaries()
+    assert first[("s1", "u1")] == {
+        "last_message": ("回复" * 200)[:200], "last_role": "assistant", "message_count": 2,
+        "created_at": start, "updated_at": start + timedelta(minutes=1)
+    }
+    assert first[("s2", "u1")]["message_count"] == 1
+
+    # 重复回填不产生重复文档，结果不变
+    assert backfill_sessions() == 3
+    assert _summaries() == first
+    assert db_config.db["sessions"].count_documents({}) == 3
+
+def test_live_upkeep_matches_backfill(mock_db):
+    """写入消息时维护的汇总与回填计算的结果一致，会话列表只查询一次汇总集合"""
+    repository = ChatRepository()
+    repository.add_chat_message("s1", "u1", "user", "问题")
+    time.sleep(0.002)
+    asyncio.run(AsyncChatRepository().add_chat_message("s2", "u1", "user", "另一个问题"))
+    time.sleep(0.002)
+    last = repository.add_chat_message("s1", "u1", "assistant", "回答")["message"]
+
+    live = _summaries()
+    assert live[("s1", "u1")]["message_count"] == 2
+    assert live[("s1", "u1")]["last_message"] == "回答"
+    assert backfill_sessions() == 2
+    assert _summaries() == live
+
+    repository.chat_collection = _CountingCollection(repository.chat_collection)
+    repository.sessions_collection = _CountingCollection(repository.sessions_collection)
+    sessions = repository.get_user_sessions("u1")
+    assert [s["session_id"] for s in sessions] == ["s1", "s2"]
+    assert sessions[0]["message_count"] == 2
+    assert sessions[0]["timestamp"] == live[("s1", "u1")]["updated_at"]
+    assert abs(sessions[0]["timestamp"] - last["timestamp"]) < timedelta(milliseconds=1)
+    assert repository.sessions_collection.finds == 1
+    assert repository.chat_collection.finds == 0
+
+def test_delete_hides_session_and_resets_summary(mock_db):
+    repository = ChatRepository()
+    repository.add_chat_message("s1", "u1", "user", "hello")
+    repository.add_chat_message("s1", "u1", "assistant", "hi")
+    repository.add_chat_message("s2", "u1", "user", "kept")
+
+    assert repository.delete_chat_messages("s1", "u1") == 2
+    summary = db_config.db["sessions"].find_one({"session_id": "s1"})
+    assert summary["message_count"] == 0 and summary["last_message"] == ""
+    assert isinstance(summary["deleted_at"], datetime)
+    assert [s["session_id"] for s in repository.get_user_sessions("u1")] == ["s2"]
+
+    # 删除后的新消息恢复会话，计数从0重新开始
+    time.sleep(0.002)
+    repository.add_chat_message("s1", "u1", "user", "again")
+    restored = db_config.db["sessions"].find_one({"session_id": "s1"})
+    assert restored["deleted_at"] is None and restored["message_count"] == 1
+    assert [m["content"] for m in repository.get_chat_messages("s1", "u1")] == ["again"]
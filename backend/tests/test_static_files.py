@@ -0,0 +1,91 @@
+"""
+静态文件响应测试
+"""
+
+import asyncio
+import gc
+import os
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import static
+from app.services.storage_backends import LocalStorageBackend
+from app.utils.static_files import file_response
+
+def _client(tmp_path, monkeypatch) -> TestClient:
+    monkeypatch.setattr(static, "local_storage", LocalStorageBackend(str(tmp_path)))
+    app = FastAPI()
+    app.include_router(static.router)
+    return TestClient(app)
+
+def _write(tmp_path, name: str, data: bytes) -> str:
+    path = LocalStorageBackend(str(tmp_path)).path_for(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+def test_serves_ranges_and_conditional_requests(tmp_path, monkeypatch):
+    client = _client(tmp_path, monkeypatch)
+    _write(tmp_path, "report.txt", b"0123456789")
+
+    response = client.get("/uploads/report.txt")
+    assert response.status_code == 200
+    assert response.content == b"0123456789"
+    etag = response.headers["etag"]
+
+    assert client.get("/uploads/report.txt", headers={"if-none-match": etag}).status_code == 304
+    partial = client.get("/uploads/report.txt", headers={"range": "bytes=2-4"})
+    assert partial.status_code == 206
+    assert partial.content == b"234"
+    assert client.get("/uploads/report.txt", headers={"range": "bytes=20-"}).status_code == 416
+    head = client.head("/uploads/report.txt")
+    assert head.headers["content-length"] == "10" and head.content == b""
+
+def test_missing_file_is_404(tmp_path, monkeypatch):
+    client = _client(tmp_path, monkeypatch)
+    assert client.get("/uploads/missing.txt").status_code == 404
+
+def test_file_deleted_after_open_is_still_served(tmp_path, monkeypatch):
+    """文件在生成响应之后、发送之前被删除时仍发送打开时的内容，而不是返回500"""
+    path = _write(tmp_path, "report.txt", b"content")
+    real_response = static.file_response
+
+    def response_then_delete(*args, **kwargs):
+        response = real_response(*args, **kwargs)
+        os.remove(path)
+        return response
+
+    monkeypatch.setattr(static, "file_response", response_then_delete)
+    client = _client(tmp_path, monkeypatch)
+    response = client.get("/uploads/report.txt")
+    assert response.status_code == 200
+    assert response.content == b"content"
+
+def test_unsent_response_closes_file_descriptor(tmp_path):
+    """响应生成后没有发送时，文件描述符在响应回收时关闭"""
+    path = _write(tmp_path, "report.txt", b"content")
+    response = file_response(path, "GET", {})
+    fd = response.fd
+    os.fstat(fd)
+    del response
+    gc.collect()
+    with pytest.raises(OSError):
+        os.fstat(fd)
+
+def test_sent_response_closes_file_descriptor_once(tmp_path, monkeypatch):
+    path = _write(tmp_path, "report.txt", b"content")
+    closed = []
+    real_close = os.close
+    monkeypatch.setattr(os, "close", lambda fd: closed.append(fd) or real_close(fd))
+    response = file_response(path, "GET", {})
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(response(scope={"type": "http"}, receive=None, send=send))
+    assert b"".join(m.get("body", b"") for m in messages) == b"content"
+    del response
+    gc.collect()
+    assert len(closed) == 1
@@ -0,0 +1,88 @@
+"""
+法条索引测试
+"""
+
+import pytest
+from app.utils.statute_index import StatuteIndex, build_index, chinese_to_int, parse_statute_text
+
+_CIVIL_CODE = """第五百七十七条 当事人一方不履行合同义务或者履行合同义务不符合约定的，应当承担继续履行、采取补救措施或者赔偿损失等违约责任。
+第五百八十五条 当事人可以约定一方违约时应当根据违约情况向对方支付一定数额的违约金。
+约定的违约金低于造成的损失的，人民法院或者仲裁机构可以根据当事人的请求予以增加。
+第一千零一条 对自然人因婚姻家庭关系等产生的身份权利的保护，适用本法第一编、第四编和其他法律的相关规定。
+"""
+_LABOR_LAW = """第十二条 劳动者就业，不因民族、种族、性别、宗教信仰不同而受歧视。
+第一百零五条 违反本法规定的其他法律、行政法规中的劳动合同规定的，依照该法律、行政法规的规定处罚。
+"""
+
+@pytest.fixture
+def index(tmp_path):
+    articles = parse_statute_text("中华人民共和国民法典", _CIVIL_CODE) + parse_statute_text("劳动法", _LABOR_LAW)
+    path = str(tmp_path / "statutes.idx")
+    build_index(articles, path)
+    statutes = StatuteIndex(path)
+    yield statutes
+    statutes.close()
+
+@pytest.mark.parametrize("numeral, expected", [
+    ("十二", 12), ("一百零五", 105), ("五百七十七", 577), ("一万零一", 10001),
+    ("一千零一", 1001), ("两百", 200), ("577", 577)
+])
+def test_chinese_to_int(numeral, expected):
+    assert chinese_to_int(numeral) == expected
+
+def test_chinese_to_int_rejects_unknown_characters():
+    with pytest.raises(ValueError):
+        chinese_to_int("五百x")
+
+def test_round_trip(index):
+    articles = parse_statute_text("中华人民共和国民法典", _CIVIL_CODE) + parse_statute_text("劳动法", _LABOR_LAW)
+    assert len(index) == len(articles) == 5
+    for article_id, article in enumerate(articles):
+        assert index.article(article_id) == article
+    # 多行条文合并为一条
+    assert index.article(1)["text"].endswith("可以根据当事人的请求予以增加。")
+
+def test_empty_corpus_round_trip(tmp_path):
+    path = str(tmp_path / "empty.idx")
+    meta = build_index([], path)
+    assert meta["articles"] == meta["keys"] == meta["terms"] == 0
+    statutes = StatuteIndex(path)
+    try:
+        assert len(statutes) == 0
+        assert statutes.lookup("民法典", 577) is None
+        assert statutes.find_citations("民法典第五百七十七条") == []
+        assert statutes.search("违约责任") == []
+    finally:
+        statutes.close()
+
+def test_rejects_invalid_file(tmp_path):
+    path = tmp_path / "bad.idx"
+    path.write_bytes(b"not an index")
+    with pytest.raises(ValueError):
+        StatuteIndex(str(path))
+
+@pytest.mark.parametrize("law", ["民法典", "中华人民共和国民法典", "《民法典》", "《中华人民共和国民法典》"])
+def test_lookup_normalizes_law_name(index, law):
+    for number in (577, "五百七十七", "第五百七十七条", "577"):
+        article = index.lookup(law, number)
+        assert article["law"] == "中华人民共和国民法典"
+        assert article["label"] == "第五百七十七条"
+    assert index.lookup(law, 578) is None
+
+def test_lookup_other_laws(index):
+    assert index.lookup("《劳动法》", "十二")["number"] == 12
+    assert index.lookup("中华人民共和国劳动法", 105)["label"] == "第一百零五条"
+    assert index.lookup("民法典", 1001)["label"] == "第一千零一条"
+    assert index.lookup("刑法", 12) is None
+
+def test_find_citations_strips_leading_text(index):
+    text = "根据民法典第五百七十七条和《劳动法》第12条，另见中华人民共和国民法典第577条、刑法第十二条"
+    found = index.find_citations(text)
+    assert [(a["law"], a["number"]) for a in found] == [("中华人民共和国民法典", 577), ("劳动法", 12)]
+
+def test_search_orders_by_bm25(index):
+    results = index.search("违约金", k=3)
+    assert results[0]["number"] == 585
+    assert [r["score"] for r in results] == sorted((r["score"] for r in results), reverse=True)
+    assert {r["number"] for r in index.search("劳动者歧视", k=1)} == {12}
+    assert index.search("与任何条文都无关的查询qwerty") == []
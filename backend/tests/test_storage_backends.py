@@ -0,0 +1,75 @@
+"""
+存储后端测试
+"""
+
+import asyncio
+import os
+import pytest
+from app.services.storage_backends import InMemoryStorageBackend, LocalStorageBackend, StorageBackend
+
+@pytest.fixture(params=["local", "memory"])
+def storage(request, tmp_path):
+    if request.param == "local":
+        return LocalStorageBackend(str(tmp_path / "uploads"))
+    return InMemoryStorageBackend()
+
+def _source(tmp_path, name: str, data: bytes) -> str:
+    path = str(tmp_path / name)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+def test_put_get_delete(storage, tmp_path):
+    async def run():
+        location = await storage.put_file(_source(tmp_path, "a.src", b"alpha"), "a.txt")
+        assert location["stored_name"] == "a.txt"
+        assert location["storage"] == storage.name
+        assert location["file_url"] == storage.url("a.txt")
+
+        dest = str(tmp_path / "a.out")
+        await storage.get_to_file("a.txt", dest)
+        with open(dest, "rb") as f:
+            assert f.read() == b"alpha"
+        assert b"".join([chunk async for chunk in storage.iter_chunks("a.txt", chunk_size=2)]) == b"alpha"
+
+        assert await storage.delete("a.txt")
+        assert not await storage.delete("a.txt")
+        with pytest.raises(FileNotFoundError):
+            await storage.get_to_file("a.txt", dest)
+
+    asyncio.run(run())
+
+def test_delete_many_returns_deleted_keys(storage, tmp_path):
+    async def run():
+        for name in ("a.txt", "b.txt"):
+            await storage.put_file(_source(tmp_path, f"{name}.src", name.encode()), name)
+        assert await storage.delete_many(["a.txt", "missing.txt", "b.txt"]) == ["a.txt", "b.txt"]
+        assert await storage.delete_many(["a.txt"]) == []
+
+    asyncio.run(run())
+
+def test_local_backend_shards_and_reads_legacy_paths(tmp_path):
+    storage = LocalStorageBackend(str(tmp_path / "uploads"))
+    legacy = storage.legacy_path("old.txt")
+    with open(legacy, "wb") as f:
+        f.write(b"legacy")
+    assert storage.local_path("old.txt") == legacy
+
+    async def run():
+        location = await storage.put_file(_source(tmp_path, "new.src", b"new"), "new.txt")
+        assert location["file_path"] == storage.path_for("new.txt")
+        assert os.path.dirname(storage.path_for("new.txt")) != storage.root
+        assert await storage.delete("old.txt")
+
+    asyncio.run(run())
+    assert not os.path.exists(legacy)
+
+def test_backend_interface_is_abstract():
+    class Incomplete(StorageBackend):
+        name = "incomplete"
+
+        async def put_file(self, source_path, key):
+            return {}
+
+    with pytest.raises(TypeError):
+        Incomplete()
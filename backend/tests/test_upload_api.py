@@ -0,0 +1,71 @@
+"""
+文件上传接口测试
+"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.services.file_service import FileTooLargeError
+
+@pytest.fixture
+def client(file_service, monkeypatch):
+    # 上传接口在导入时创建FileService，需要在数据库替换之后导入
+    from app.api import upload
+
+    real_save = file_service.save_file
+
+    async def save_file(file, session_id, user_id):
+        if file.filename.startswith("broken"):
+            raise RuntimeError("存储不可用")
+        if file.filename.startswith("huge"):
+            raise FileTooLargeError(f"文件 {file.filename} 超过大小限制")
+        return await real_save(file, session_id, user_id)
+
+    monkeypatch.setattr(file_service, "save_file", save_file)
+    monkeypatch.setattr(upload, "file_service", file_service)
+    app = FastAPI()
+    app.include_router(upload.router)
+    return TestClient(app)
+
+def _files(*names):
+    return [("files", (name, name.encode(), "text/plain")) for name in names]
+
+def test_partial_success_keeps_order_and_reports_errors(client, file_service):
+    response = client.post("/api/upload", files=_files("good.txt", "broken.txt"), data={"session_id": "s1"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "partial"
+    assert [f["original_name"] for f in body["files"]] == ["good.txt"]
+    assert body["errors"] == [{
+        "index": 1, "filename": "broken.txt", "status_code": 500, "detail": "文件上传失败: 存储不可用"
+    }]
+    assert len(file_service.storage.objects) == 1
+
+def test_single_failed_file_keeps_its_status_code(client):
+    response = client.post("/api/upload", files=_files("huge.txt"), data={"session_id": "s1"})
+    assert response.status_code == 413
+    assert response.json()["detail"] == "文件 huge.txt 超过大小限制"
+
+def test_all_failed_files_return_500_with_every_error(client, file_service):
+    response = client.post("/api/upload", files=_files("huge.txt", "broken.txt"), data={"session_id": "s1"})
+    assert response.status_code == 500
+    detail = response.json()["detail"]
+    assert [(e["index"], e["filename"], e["status_code"]) for e in detail] == [
+        (0, "huge.txt", 413), (1, "broken.txt", 500)
+    ]
+    assert not file_service.storage.objects
+
+def test_invalid_file_rejects_whole_request(client, file_service):
+    response = client.post("/api/upload", files=_files("good.txt", "script.exe"), data={"session_id": "s1"})
+    assert response.status_code == 415
+    assert not file_service.storage.objects
+
+@pytest.mark.parametrize("lang", ["fra", "chi_sim+../../tmp", "eng+", "chi_sim eng"])
+def test_pages_reject_unlisted_ocr_lang(client, lang):
+    response = client.get("/api/files/missing/pages", params={"lang": lang})
+    assert response.status_code == 400
+
+@pytest.mark.parametrize("lang", ["chi_sim+eng", "eng", ""])
+def test_pages_accept_listed_ocr_lang(client, lang):
+    # 语言校验通过后才查找文件
+    assert client.get("/api/files/missing/pages", params={"lang": lang}).status_code == 404